@@ -0,0 +1,115 @@
+"""Serializer benchmark over typical Message payloads.
+
+Compare the codec registry of `mape.remote.de_serializer` with the previous `issubclass`/`isinstance`
+chain (reproduced below), for each value type used by Knowledge collections, pub/sub and REST, and
+the compact wire format (`mape.remote.wire`) with the pickled `Message`/`CallMethod`.
+
+Usage:
+    python benchmarks/de_serializer.py [--number 20000]
+"""
+from __future__ import annotations
+
+import json
+import pickle
+import timeit
+import argparse
+
+from pydantic import BaseModel
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from mape.typing import Message, CallMethod
+from mape.remote.wire import WireEncoder
+from mape.remote.de_serializer import obj_to_raw, obj_from_raw, get_codec, Pickled, orjson
+
+
+class Position(BaseModel):
+    lat: float
+    lon: float
+    speed: float
+
+
+def legacy_obj_from_raw(value_type, raw_item):
+    if issubclass(value_type, BaseModel):
+        return value_type.parse_raw(raw_item)
+    elif issubclass(value_type, Pickled):
+        return pickle.loads(raw_item)
+    elif issubclass(value_type, dict):
+        return json.loads(raw_item)
+    elif issubclass(value_type, str):
+        return raw_item.decode() if isinstance(raw_item, bytes) else raw_item
+    else:
+        return raw_item.encode() if isinstance(raw_item, str) else raw_item
+
+
+def legacy_obj_to_raw(value_type, value):
+    if issubclass(value_type, BaseModel) and isinstance(value, value_type):
+        return value.json()
+    elif issubclass(value_type, Pickled):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    elif isinstance(value, dict):
+        return json.dumps(value)
+    elif isinstance(value, (str, bytes)):
+        return value
+    raise ValueError
+
+
+PAYLOADS = {
+    'Message(float)': (Pickled, Message.create(87.5, src='car_1.monitor.speed', dst='car_1.plan.limit')),
+    'Message(dict)': (Pickled, Message.create({'speed': 87.5, 'lane': 2, 'emergency': False},
+                                              src='car_1.monitor.speed')),
+    'CallMethod': (Pickled, CallMethod.create('set_target', 90, unit='kmh')),
+    'dict': (dict, {'speed': 87.5, 'lane': 2, 'ids': list(range(16)), 'name': 'car_1'}),
+    'str': (str, 'car_1.monitor.speed'),
+    'BaseModel': (Position, Position(lat=44.49, lon=11.34, speed=87.5)),
+}
+
+if np is not None:
+    # eg. a lidar frame (out-of-band buffer)
+    PAYLOADS['Message(ndarray)'] = (Pickled, Message.create(np.random.rand(360, 64), src='car_1.monitor.lidar'))
+
+
+def bench(number: int) -> None:
+    print(f"json codec: {'orjson' if orjson else 'stdlib'}, {number} round trips each\n")
+    print(f"{'payload':<20}{'legacy (us)':>14}{'registry (us)':>16}{'codec (us)':>14}")
+
+    for name, (value_type, value) in PAYLOADS.items():
+        codec = get_codec(value_type)
+
+        legacy = timeit.timeit(lambda: legacy_obj_from_raw(value_type, legacy_obj_to_raw(value_type, value)),
+                               number=number)
+        registry = timeit.timeit(lambda: obj_from_raw(value_type, obj_to_raw(value_type, value)), number=number)
+        direct = timeit.timeit(lambda: codec.decode(codec.encode(value)), number=number)
+
+        print(f"{name:<20}{legacy / number * 1e6:>14.2f}{registry / number * 1e6:>16.2f}{direct / number * 1e6:>14.2f}")
+
+
+def bench_wire(number: int) -> None:
+    print(f"\n{'payload':<20}{'pickled (B)':>14}{'wire (B)':>12}{'pickled (us)':>15}{'wire (us)':>12}")
+    codec = get_codec(Pickled)
+
+    for name, (value_type, value) in PAYLOADS.items():
+        if not isinstance(value, (Message, CallMethod)):
+            continue
+
+        encoder = WireEncoder()
+        # Interned paths already sent
+        codec.decode(encoder.encode(value))
+
+        pickled = timeit.timeit(lambda: codec.decode(codec.encode(value)), number=number)
+        wire = timeit.timeit(lambda: codec.decode(encoder.encode(value)), number=number)
+
+        print(f"{name:<20}{len(codec.encode(value)):>14}{len(encoder.encode(value)):>12}"
+              f"{pickled / number * 1e6:>15.2f}{wire / number * 1e6:>12.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    bench(args.number)
+    bench_wire(args.number)
@@ -0,0 +1,71 @@
+"""Line protocol benchmark of `InfluxObserver` items (single core, points per second).
+
+Compare the compiled `LineEncoder` of `mape.remote.influxdb.line_protocol` with the previous
+`Point` building (reproduced below), with tags from the item attributes and explicit ones.
+
+Usage:
+    python benchmarks/line_protocol.py [--number 100000]
+"""
+from __future__ import annotations
+
+import timeit
+import argparse
+
+from influxdb_client import Point
+
+from mape.typing import Message
+from mape.remote.influxdb.rx_utils import _fields_mapper
+from mape.remote.influxdb.line_protocol import LineEncoder, attributes_tags
+
+
+def legacy_line(item, measurement=None, tags=None, fields_mapper=_fields_mapper):
+    point = Point(measurement or type(item).__name__)
+
+    if not tags and hasattr(item, '__dict__'):
+        value_as_dict = item.__dict__
+        tags = [(k, value_as_dict[k]) for k in value_as_dict if k not in ('value', 'timestamp')]
+
+    for tag, value in tags or ():
+        point.tag(tag, value)
+
+    fields = fields_mapper(item)
+    if not isinstance(fields[0], (tuple, list)):
+        fields = (fields,)
+
+    for field, value in fields:
+        point.field(field, value)
+
+    return point.to_line_protocol()
+
+
+def speed_fields(item):
+    return [('speed', item.value), ('lane', 2), ('emergency', False)]
+
+
+CASES = {
+    'Message (auto tags)': (Message.create(87.5, src='car_1.monitor', dst='car_1.plan'), None, None, _fields_mapper),
+    'float (const tags)': (87.5, 'car', (('car', 'car_1'), ('sensor', 'speed')), _fields_mapper),
+    'Message (3 fields)': (Message.create(87.5, src='car_1.monitor'), 'car', (('car', 'car_1'),), speed_fields),
+}
+
+
+def bench(number: int) -> None:
+    print(f"{'item':<24}{'Point (pts/s)':>16}{'encoder (pts/s)':>18}{'speedup':>10}")
+
+    for name, (item, measurement, tags, fields_mapper) in CASES.items():
+        encoder = LineEncoder(measurement or type(item).__name__, fields_mapper, tags=tags or (),
+                              tag_attributes=attributes_tags(item) if not tags else ())
+        assert encoder.encode(item) == legacy_line(item, measurement, tags, fields_mapper)
+
+        legacy = timeit.timeit(lambda: legacy_line(item, measurement, tags, fields_mapper), number=number)
+        compiled = timeit.timeit(lambda: encoder.encode(item), number=number)
+
+        print(f"{name:<24}{number / legacy:>16,.0f}{number / compiled:>18,.0f}{legacy / compiled:>9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    bench(args.number)
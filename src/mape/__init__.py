@@ -14,9 +14,11 @@ from . import config as mape_config
 from .application import App
 from .base_elements import *
 from .loop import Loop
+from .knowledge import RedisBackend, MemoryBackend
 # from .operators import *
 from .remote.rest import UvicornDaemon, setup as rest_setup
 from .remote.influxdb import set_config as set_influxdb
+from .remote.de_serializer import set_compression
 from .utils import init_logger, task_exception
 
 # Please make sure the version here remains the same as in pyproject.toml
@@ -52,6 +54,7 @@ def setup_logger():
 def stop():
     aio_loop.stop()
     uvicorn_webserver and uvicorn_webserver.stop()
+    app and app.k_backend.close()
 
     # Let's also cancel all running tasks:
     pending = asyncio.Task.all_tasks()
@@ -66,13 +69,14 @@ def _start_web_server(host_port: str, loop):
 
     init_len_routes: Final = 4
 
-    # Start Uvicorn webserver (forking a process) with the created routes by FastAPI
+    # Start Uvicorn webserver (on the MAPE loop, or in its own thread) with the created routes by FastAPI
     if fastapi and (len_routes := len(fastapi.routes)) > init_len_routes:
         # The first 4 routes are instanced by default (ie swagger)
         from mape.remote.rest import UvicornDaemon
 
         host, port = host_port.split(':')
-        uvicorn_webserver = UvicornDaemon(app=fastapi, loop=loop, host=host, port=port)
+        uvicorn_webserver = UvicornDaemon(app=fastapi, loop=loop, host=host, port=port,
+                                          threaded=mape_config.get('rest.threaded', False))
 
         system_path = fastapi.routes[:init_len_routes]
         mape_path = fastapi.routes[init_len_routes:]
@@ -160,14 +164,28 @@ def init(debug: bool = False,
     rx_scheduler = rx_scheduler or AsyncIOScheduler(aio_loop)
 
     if mape_config.get('redis.url'):
-        redis = aioredis.from_url(redis_url, db=0)
+        redis = aioredis.from_url(mape_config.get('redis.url'), db=0)
+
+    # Without Redis the Knowledge is kept in memory (ie. local to the node)
+    k_backend_name = mape_config.get('knowledge.backend', 'redis' if redis else 'memory')
+    if k_backend_name == 'memory':
+        k_backend = MemoryBackend(path=mape_config.get('knowledge.path'))
+    elif k_backend_name == 'redis':
+        if redis is None:
+            raise ValueError("Knowledge backend 'redis' needs a Redis url (ie. `redis_url` or `redis.url` config)")
+        k_backend = RedisBackend(redis)
+    else:
+        raise ValueError(f"Unknown Knowledge backend '{k_backend_name}' (available 'redis', 'memory')")
 
-    app = App(redis)
+    app = App(redis, k_backend=k_backend)
 
     if mape_config.get('rest.host_port'):
         fastapi = rest_setup(app, __version__)
         _start_web_server(rest_host_port, aio_loop)
 
+    if compression := mape_config.get('compression'):
+        set_compression(**compression)
+
     set_influxdb(mape_config.get('influxdb'))
     set_debug(mape_config.get('debug'))
 
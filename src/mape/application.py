@@ -6,7 +6,8 @@ from typing import Any, Dict, Type, Union, Tuple, Iterable, List, TypeVar
 from mape.loop import Loop
 from mape.base_elements import Element
 from mape.level import Level
-from mape.knowledge import Knowledge
+from mape.routing import RoutingTable
+from mape.knowledge import Knowledge, KnowledgeBackend, RedisBackend
 from mape.utils import generate_uid
 from mape.constants import RESERVED_PREPEND, RESERVED_SEPARATOR
 
@@ -14,11 +15,13 @@ from mape.constants import RESERVED_PREPEND, RESERVED_SEPARATOR
 class App:
     uid: str = 'app'
 
-    def __init__(self, redis: Redis) -> None:
+    def __init__(self, redis: Redis, k_backend: KnowledgeBackend | None = None) -> None:
         self._redis: Redis = redis
+        self._k_backend: KnowledgeBackend = k_backend or RedisBackend(redis)
         self._loops: Dict[str, Loop] = dict()
         self._levels: Dict[str, Level] = dict()
-        self._k = Knowledge(self._redis, f"k{RESERVED_SEPARATOR}{self.uid}")
+        self._k = Knowledge(self._k_backend, f"k{RESERVED_SEPARATOR}{self.uid}")
+        self._routes = RoutingTable()
 
     def add_loop(self, loop):
         uid = loop.uid or generate_uid(self._loops, prefix=loop.prefix)
@@ -26,9 +29,17 @@ class App:
         if self.has_loop(uid) or hasattr(self, uid):
             return False
 
+        # Moved loop (ie. from another App or uid), its old paths are not routed anymore
+        previous = loop.app
+        if previous is not None and loop.uid and previous.loops.get(loop.uid) is loop:
+            del previous.loops[loop.uid]
+            previous.routes.remove_loop(loop)
+
         loop._uid = uid
         loop._app = self
         self._loops[uid] = loop
+        # Elements of a moved loop
+        self._routes.add_loop(loop)
 
         return uid
 
@@ -86,14 +97,30 @@ class App:
 
         return self._levels[level_uid]
 
+    async def snapshot_knowledge(self, path: str) -> int:
+        """ Save all the Knowledge namespaces (App, Levels and Loops) in a snapshot file """
+        return await self._k_backend.snapshot(path, f"k{RESERVED_SEPARATOR}*")
+
+    async def restore_knowledge(self, path: str, lazy: bool = True) -> int:
+        """ Restore all the Knowledge namespaces (App, Levels and Loops) from a snapshot file """
+        return await self._k_backend.restore(path, f"k{RESERVED_SEPARATOR}*", lazy)
+
     @property
     def redis(self):
         return self._redis
 
+    @property
+    def k_backend(self) -> KnowledgeBackend:
+        return self._k_backend
+
     @property
     def loops(self):
         return self._loops
 
+    @property
+    def routes(self) -> RoutingTable:
+        return self._routes
+
     @property
     def levels(self):
         return self._levels
@@ -0,0 +1,219 @@
+"""In-process time series (eg. the last N seconds of speed for each car) for the analyzers, see `Loop.history`.
+
+Each series is a NumPy ring buffer of (timestamp, value): append is O(1), and a window is always a
+contiguous view of the buffer (each item is written twice, at `i` and `i + capacity`), so the window
+statistics are vectorized without copies. The memory is bounded by the retention: items older than
+`retention` seconds are overwritten, and a buffer grows only up to `max_capacity` items.
+"""
+from __future__ import annotations
+
+import time
+from typing import Dict, Hashable, Iterator, Tuple
+
+import numpy as np
+
+
+class Series:
+    """Ring buffer of a time series (timestamps in seconds, not decreasing).
+
+    Examples:
+        ```python
+        speed = Series(retention=60)
+        speed.append(87.5)
+
+        speed.mean(10), speed.percentile(95, 10), speed.slope(30)
+        ```
+
+    Args:
+        retention: Seconds of history kept.
+        capacity: Initial items (doubled when full, without expired items).
+        max_capacity: Max items, the oldest are overwritten when exceeded.
+    """
+
+    def __init__(self, retention: float = 60, capacity: int = 64, max_capacity: int = 2**16) -> None:
+        self.retention = retention
+        self._max_capacity = max_capacity
+        self._capacity = min(capacity, max_capacity)
+
+        self._timestamps = np.zeros(2 * self._capacity)
+        self._values = np.zeros(2 * self._capacity)
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, value: float, timestamp: float | None = None) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+
+        if self._len == self._capacity:
+            self._make_room(timestamp)
+
+        pos = (self._start + self._len) % self._capacity
+        self._timestamps[pos] = self._timestamps[pos + self._capacity] = timestamp
+        self._values[pos] = self._values[pos + self._capacity] = value
+
+        if self._len < self._capacity:
+            self._len += 1
+        else:
+            # Oldest overwritten
+            self._start = (self._start + 1) % self._capacity
+
+    def extend(self, values, timestamps=None) -> None:
+        """ Append many items (eg. a batch), `timestamps` default now """
+        values = np.asarray(values, dtype=float)
+        timestamps = np.full(len(values), time.time()) if timestamps is None else np.asarray(timestamps, dtype=float)
+
+        for value, timestamp in zip(values.tolist(), timestamps.tolist()):
+            self.append(value, timestamp)
+
+    def _make_room(self, timestamp: float) -> None:
+        # Expired items (vectorized)
+        timestamps = self._timestamps[self._start:self._start + self._len]
+        expired = int(np.searchsorted(timestamps, timestamp - self.retention, side='left'))
+
+        if expired:
+            self._start = (self._start + expired) % self._capacity
+            self._len -= expired
+        elif self._capacity < self._max_capacity:
+            self._grow(min(self._capacity * 2, self._max_capacity))
+
+    def _grow(self, capacity: int) -> None:
+        end = self._start + self._len
+        timestamps, values = self._timestamps[self._start:end], self._values[self._start:end]
+        self._timestamps, self._values = np.zeros(2 * capacity), np.zeros(2 * capacity)
+
+        for array, live in ((self._timestamps, timestamps), (self._values, values)):
+            array[:self._len] = live
+            array[capacity:capacity + self._len] = live
+
+        self._capacity, self._start = capacity, 0
+
+    def window(self, seconds: float | None = None, now: float | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """ Timestamps and values (read-only views) of the last `seconds` (default the retention) """
+        end = self._start + self._len
+        timestamps = self._timestamps[self._start:end]
+
+        seconds = self.retention if seconds is None else min(seconds, self.retention)
+        since = (time.time() if now is None else now) - seconds
+        start = self._start + int(np.searchsorted(timestamps, since, side='left'))
+
+        timestamps, values = self._timestamps[start:end], self._values[start:end]
+        timestamps.flags.writeable = values.flags.writeable = False
+        return timestamps, values
+
+    def values(self, seconds: float | None = None, now: float | None = None) -> np.ndarray:
+        return self.window(seconds, now)[1]
+
+    @property
+    def last(self) -> float | None:
+        return float(self._values[self._start + self._len - 1]) if self._len else None
+
+    @property
+    def last_timestamp(self) -> float | None:
+        return float(self._timestamps[self._start + self._len - 1]) if self._len else None
+
+    def count(self, seconds: float | None = None, now: float | None = None) -> int:
+        return len(self.values(seconds, now))
+
+    def mean(self, seconds: float | None = None, now: float | None = None) -> float | None:
+        values = self.values(seconds, now)
+        return float(values.mean()) if len(values) else None
+
+    def std(self, seconds: float | None = None, now: float | None = None) -> float | None:
+        values = self.values(seconds, now)
+        return float(values.std()) if len(values) else None
+
+    def min(self, seconds: float | None = None, now: float | None = None) -> float | None:
+        values = self.values(seconds, now)
+        return float(values.min()) if len(values) else None
+
+    def max(self, seconds: float | None = None, now: float | None = None) -> float | None:
+        values = self.values(seconds, now)
+        return float(values.max()) if len(values) else None
+
+    def percentile(self, q: float, seconds: float | None = None, now: float | None = None) -> float | None:
+        values = self.values(seconds, now)
+        return float(np.percentile(values, q)) if len(values) else None
+
+    def slope(self, seconds: float | None = None, now: float | None = None) -> float | None:
+        """ Trend (value change per second), by least squares """
+        timestamps, values = self.window(seconds, now)
+        if len(values) < 2:
+            return None
+
+        # Centered, also for precision (ie. epoch timestamps)
+        t = timestamps - timestamps.mean()
+        variance = float(t @ t)
+        return float(t @ (values - values.mean()) / variance) if variance else None
+
+
+class History:
+    """Time series by key (created on first append), eg. `loop.history`.
+
+    Examples:
+        ```python
+        @loop.analyze
+        def detect(item, on_next, self):
+            self.loop.history.append(item.src, item.value, item.timestamp)
+
+            if self.loop.history[item.src].mean(10) > 90:
+                on_next(item)
+        ```
+
+    Args:
+        retention: Seconds of history kept for each series.
+        capacity: Initial items of a series.
+        max_capacity: Max items of a series.
+    """
+
+    def __init__(self, retention: float = 60, capacity: int = 64, max_capacity: int = 2**16) -> None:
+        self.retention = retention
+        self._capacity = capacity
+        self._max_capacity = max_capacity
+        self._series: Dict[Hashable, Series] = dict()
+        # Series count of the next `evict()` (ie. amortized on the new series)
+        self._evict_at = 64
+
+    def series(self, key: Hashable) -> Series:
+        """ The series of `key` (created if not exist) """
+        try:
+            return self._series[key]
+        except KeyError:
+            pass
+
+        if len(self._series) >= self._evict_at:
+            self.evict()
+            self._evict_at = max(2 * len(self._series), 64)
+
+        series = self._series[key] = Series(self.retention, self._capacity, self._max_capacity)
+        return series
+
+    def append(self, key: Hashable, value: float, timestamp: float | None = None) -> None:
+        self.series(key).append(value, timestamp)
+
+    def __getitem__(self, key: Hashable) -> Series:
+        return self._series[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._series
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._series)
+
+    def __len__(self):
+        return len(self._series)
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._series[key]
+
+    def evict(self, now: float | None = None) -> int:
+        """ Remove the series without items in the retention (eg. cars gone), return how many """
+        since = (time.time() if now is None else now) - self.retention
+        idle = [key for key, series in self._series.items()
+                if not len(series) or series.last_timestamp < since]
+
+        for key in idle:
+            del self._series[key]
+
+        return len(idle)
@@ -1,62 +1,479 @@
+from __future__ import annotations
+
+import time
+import asyncio
+from abc import ABC, abstractmethod
 from aioredis import Redis
 from typing import Any, Dict, Type, Union, Tuple, Iterable, List, TypeVar, Callable
 from functools import partial
+from fnmatch import fnmatchcase
+
+import rx
+from rx.core import Observable
+from rx.disposable import Disposable
+
+import mape
 
 from mape.remote.redis import (
     RedisKeySpace,
     RedisHash,
     RedisSet,
     RedisList,
-    RedisKey,
     RedisSortedSet,
     RedisPriorityQueue,
     RedisQueue,
     RedisLifoQueue,
     Redlock,
-    notifications_handler
+    RedisVersioned,
+    notifications_handler,
+    keyspace_events_handler,
+    redis_aggregate,
+    register_lua_aggregate
 )
-from mape.remote.de_serializer import Pickled, obj_from_raw
+from mape import memory
+from mape.snapshot import SnapshotWriter, SnapshotReader, Encoding
+from mape.remote.de_serializer import Pickled
 from mape.constants import RESERVED_PREPEND, RESERVED_SEPARATOR
+from mape.typing import KnowledgeEvent
+from mape.utils import aio_call, task_exception
 
 T = TypeVar('T')
 
 
-class Knowledge:
-    def __init__(self, redis: Redis, prefix: str) -> None:
+class KnowledgeBackend(ABC):
+    """Storage behind the `Knowledge`, acting as factory of its collections.
+
+    Each backend provides the same collections interface (the redis-purse one) and the keyspace notifications.
+    """
+
+    @abstractmethod
+    def keyspace(self, prefix: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def hash(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sortedset(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def priorityqueue(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def queue(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def lifoqueue(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def versioned(self, rkey: str, value_type: Type[T]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def lock(self, key: str, *args, **kwargs):
+        raise NotImplementedError
+
+    @abstractmethod
+    def notifications(self, handler: Callable, key_pattern: str, *args, **kwargs):
+        raise NotImplementedError
+
+    @abstractmethod
+    def watch(self, callback: Callable[[str, str], Any], key_pattern: str, events: Iterable[str] = ()) -> Callable:
+        """ Call `callback(key, event)` on change of keys matching `key_pattern` (filtered by `events`),
+        return the function to stop watching """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def aggregate(self, name: str, pattern: str | None = None, sortedset: str | None = None, arg: Any = None):
+        """ Aggregate (see `Knowledge.aggregate()`) over keys matching `pattern` or `sortedset` scores """
+        raise NotImplementedError
+
+    async def snapshot(self, path: str, pattern: str) -> int:
+        """ Write keys matching `pattern` in a snapshot file (see `mape.snapshot`) """
+        raise NotImplementedError
+
+    async def restore(self, path: str, pattern: str, lazy: bool = True) -> int:
+        """ Restore keys matching `pattern` from a snapshot file """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """ Release the backend resources (eg. on `mape.stop()`) """
+        pass
+
+
+class RedisBackend(KnowledgeBackend):
+    """ Knowledge stored in Redis (through redis-purse), shared among distributed nodes """
+
+    def __init__(self, redis: Redis) -> None:
         self._redis: Redis = redis
+
+    def keyspace(self, prefix: str, value_type: Type[T]) -> RedisKeySpace[T]:
+        return RedisKeySpace(self._redis, prefix, value_type=value_type)
+
+    def hash(self, rkey: str, value_type: Type[T]) -> RedisHash[T]:
+        return RedisHash(self._redis, rkey, value_type=value_type)
+
+    def set(self, rkey: str, value_type: Type[T]) -> RedisSet[T]:
+        return RedisSet(self._redis, rkey, value_type=value_type)
+
+    def list(self, rkey: str, value_type: Type[T]) -> RedisList[T]:
+        return RedisList(self._redis, rkey, value_type=value_type)
+
+    def sortedset(self, rkey: str, value_type: Type[T]) -> RedisSortedSet[T]:
+        return RedisSortedSet(self._redis, rkey, value_type=value_type)
+
+    def priorityqueue(self, rkey: str, value_type: Type[T]) -> RedisPriorityQueue[T]:
+        return RedisPriorityQueue(self._redis, rkey, value_type=value_type)
+
+    def queue(self, rkey: str, value_type: Type[T]) -> RedisQueue[T]:
+        return RedisQueue(self._redis, rkey, value_type=value_type)
+
+    def lifoqueue(self, rkey: str, value_type: Type[T]) -> RedisLifoQueue[T]:
+        return RedisLifoQueue(self._redis, rkey, value_type=value_type)
+
+    def versioned(self, rkey: str, value_type: Type[T]) -> RedisVersioned[T]:
+        return RedisVersioned(self._redis, rkey, value_type=value_type)
+
+    def lock(self, key: str, masters: List[Redis] | None = None, *args, **kwargs) -> Redlock:
+        return Redlock(key, masters or [self._redis], *args, **kwargs)
+
+    def notifications(self, handler: Callable, key_pattern: str, *args, **kwargs):
+        kwargs.setdefault('redis', self._redis)
+        return notifications_handler(handler, f"__keyspace@*__:{key_pattern}", *args, **kwargs)
+
+    def watch(self, callback: Callable[[str, str], Any], key_pattern: str, events: Iterable[str] = ()) -> Callable:
+        return keyspace_events_handler(callback, key_pattern, events, redis=self._redis)
+
+    async def aggregate(self, name: str, pattern: str | None = None, sortedset: str | None = None, arg: Any = None):
+        return await redis_aggregate(self._redis, name, pattern, sortedset, arg)
+
+    async def snapshot(self, path: str, pattern: str, batch_size: int = 500) -> int:
+        # Values are stored in the Redis serialization format (ie. DUMP), a pipeline each batch of keys
+        with SnapshotWriter(path, Encoding.REDIS_DUMP) as writer:
+            keys = [key async for key in self._redis.scan_iter(match=pattern, count=batch_size)]
+
+            for i in range(0, len(keys), batch_size):
+                batch = keys[i:i + batch_size]
+
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for key in batch:
+                        pipe.dump(key)
+                        pipe.pttl(key)
+                    results = await pipe.execute()
+
+                now = time.time()
+                for key, payload, pttl in zip(batch, results[::2], results[1::2]):
+                    # Key deleted in the meanwhile
+                    if payload is None:
+                        continue
+
+                    key = key.decode() if isinstance(key, bytes) else key
+                    writer.write(key, payload, now + pttl / 1000 if pttl > 0 else 0)
+
+            return len(writer)
+
+    async def restore(self, path: str, pattern: str, lazy: bool = True, batch_size: int = 500) -> int:
+        # Restore happens server side (ie. RESTORE), lazy loading is meaningless
+        reader = SnapshotReader(path)
+
+        try:
+            if reader.encoding is not Encoding.REDIS_DUMP:
+                raise ValueError(f"Snapshot '{path}' has not been created by Redis ({reader.encoding.name})")
+
+            now = time.time()
+            entries = [(key, entry) for key, entry in reader.items()
+                       if fnmatchcase(key, pattern) and (not entry.expire_at or entry.expire_at > now)]
+
+            for i in range(0, len(entries), batch_size):
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for key, entry in entries[i:i + batch_size]:
+                        ttl = max(1, int((entry.expire_at - now) * 1000)) if entry.expire_at else 0
+                        pipe.restore(key, ttl, reader.read(entry), replace=True)
+                    await pipe.execute()
+
+            return len(entries)
+        finally:
+            reader.close()
+
+    @property
+    def redis(self) -> Redis:
+        return self._redis
+
+
+class MemoryBackend(KnowledgeBackend):
+    """Knowledge stored in the process memory (no Redis needed), local to the node.
+
+    Values are held by reference, not serialized as with Redis: mutating a value read from the
+    Knowledge (eg. a list or a `Message`) changes the stored one. Set a copy to keep them apart.
+
+    Args:
+        path: Optional file to persist the Knowledge (loaded on init, saved on `close()`).
+        store: Share an existing `MemoryStore` instead of creating a new one.
+    """
+
+    def __init__(self, path: str | None = None, store: memory.MemoryStore | None = None) -> None:
+        self._store = store if store is not None else memory.MemoryStore(path)
+
+    def keyspace(self, prefix: str, value_type: Type[T]) -> memory.MemoryKeySpace[T]:
+        return memory.MemoryKeySpace(self._store, prefix, value_type=value_type)
+
+    def hash(self, rkey: str, value_type: Type[T]) -> memory.MemoryHash[T]:
+        return memory.MemoryHash(self._store, rkey, value_type=value_type)
+
+    def set(self, rkey: str, value_type: Type[T]) -> memory.MemorySet[T]:
+        return memory.MemorySet(self._store, rkey, value_type=value_type)
+
+    def list(self, rkey: str, value_type: Type[T]) -> memory.MemoryList[T]:
+        return memory.MemoryList(self._store, rkey, value_type=value_type)
+
+    def sortedset(self, rkey: str, value_type: Type[T]) -> memory.MemorySortedSet[T]:
+        return memory.MemorySortedSet(self._store, rkey, value_type=value_type)
+
+    def priorityqueue(self, rkey: str, value_type: Type[T]) -> memory.MemoryPriorityQueue[T]:
+        return memory.MemoryPriorityQueue(self._store, rkey, value_type=value_type)
+
+    def queue(self, rkey: str, value_type: Type[T]) -> memory.MemoryQueue[T]:
+        return memory.MemoryQueue(self._store, rkey, value_type=value_type)
+
+    def lifoqueue(self, rkey: str, value_type: Type[T]) -> memory.MemoryLifoQueue[T]:
+        return memory.MemoryLifoQueue(self._store, rkey, value_type=value_type)
+
+    def versioned(self, rkey: str, value_type: Type[T]) -> memory.MemoryVersioned[T]:
+        return memory.MemoryVersioned(self._store, rkey, value_type=value_type)
+
+    def lock(self, key: str, *args, **kwargs) -> memory.MemoryLock:
+        # masters (and the other Redlock args) are meaningless in a single process
+        return memory.MemoryLock(key, self._store)
+
+    def notifications(self, handler: Callable, key_pattern: str, *args, **kwargs):
+        return memory.notifications_handler(self._store, handler, key_pattern, *args, **kwargs)
+
+    def watch(self, callback: Callable[[str, str], Any], key_pattern: str, events: Iterable[str] = ()) -> Callable:
+        return memory.keyspace_events_handler(self._store, callback, key_pattern, events)
+
+    async def aggregate(self, name: str, pattern: str | None = None, sortedset: str | None = None, arg: Any = None):
+        return memory.memory_aggregate(self._store, name, pattern, sortedset, arg)
+
+    async def snapshot(self, path: str, pattern: str) -> int:
+        return self._store.snapshot(path, pattern)
+
+    async def restore(self, path: str, pattern: str, lazy: bool = True) -> int:
+        return self._store.restore(path, pattern, lazy)
+
+    def close(self) -> None:
+        self._store.close()
+
+    @property
+    def store(self) -> memory.MemoryStore:
+        return self._store
+
+
+def register_aggregate(name: str, lua: str, func: Callable[[List[Tuple[str, float]], Any], Any]) -> None:
+    """Register a custom aggregate usable by `Knowledge.aggregate()`, on each backend.
+
+    Args:
+        name: Aggregate name.
+        lua: Redis script body reducing the `items` table of `{key, number}` (`ARGV[3]` is the argument),
+            returning a number as string or a flat `{key, value, ...}` list.
+        func: Python function `func(items, arg)` doing the same for the memory backend.
+    """
+    register_lua_aggregate(name, lua)
+    memory.register_aggregate(name, func)
+
+
+class Knowledge:
+    def __init__(self, backend: KnowledgeBackend | Redis, prefix: str) -> None:
+        # Keep working passing directly the Redis client
+        self._backend: KnowledgeBackend = backend if isinstance(backend, KnowledgeBackend) else RedisBackend(backend)
         self._prefix: str = prefix + RESERVED_SEPARATOR
 
         self._keyspace = self.create_keyspace(RESERVED_PREPEND + 'default_keyspace', value_type=Pickled)
 
     def create_keyspace(self, key: str, value_type: Type[T]):
-        return RedisKeySpace(self._redis, self._prefix + key + RESERVED_SEPARATOR, value_type=value_type)
+        return self._backend.keyspace(self._prefix + key + RESERVED_SEPARATOR, value_type=value_type)
 
     def create_hash(self, key: str, value_type: Type[T]) -> RedisHash[T]:
-        return RedisHash(self._redis, self._prefix + key, value_type=value_type)
+        return self._backend.hash(self._prefix + key, value_type=value_type)
 
     def create_set(self, key: str, value_type: Type[T]) -> RedisSet[T]:
-        return RedisSet(self._redis, self._prefix + key, value_type=value_type)
+        return self._backend.set(self._prefix + key, value_type=value_type)
 
     def create_list(self, key: str, value_type: Type[T]) -> RedisList[T]:
-        return RedisList(self._redis, self._prefix + key, value_type=value_type)
+        return self._backend.list(self._prefix + key, value_type=value_type)
 
     def create_sortedset(self, key: str, value_type: Type[T]) -> RedisSortedSet[T]:
-        return RedisSortedSet(self._redis, self._prefix + key, value_type=value_type)
+        return self._backend.sortedset(self._prefix + key, value_type=value_type)
 
     def create_priorityqueue(self, key: str, value_type: Type[T]) -> RedisPriorityQueue[T]:
-        return RedisPriorityQueue(self._redis, self._prefix + key, value_type=value_type)
+        return self._backend.priorityqueue(self._prefix + key, value_type=value_type)
 
     def create_queue(self, key: str, value_type: Type[T]) -> RedisQueue[T]:
-        return RedisQueue(self._redis, self._prefix + key, value_type=value_type)
+        return self._backend.queue(self._prefix + key, value_type=value_type)
 
     def create_lifoqueue(self, key: str, value_type: Type[T]) -> RedisLifoQueue[T]:
-        return RedisLifoQueue(self._redis, self._prefix + key, value_type=value_type)
+        return self._backend.lifoqueue(self._prefix + key, value_type=value_type)
 
-    def create_lock(self, key, masters: List[Redis], *args, **kwargs):
-        return Redlock(key, masters, *args, **kwargs)
+    def create_versioned(self, key: str, value_type: Type[T]) -> RedisVersioned[T]:
+        """ Versioned value with atomic compare-and-set and increment (lock free alternative to `create_lock()`) """
+        return self._backend.versioned(self._prefix + key, value_type=value_type)
+
+    def create_lock(self, key, masters: List[Redis] | None = None, *args, **kwargs):
+        return self._backend.lock(key, masters, *args, **kwargs)
 
     def notifications(self, handler: Callable, key: str, *args, **kwargs):
-        return notifications_handler(handler, f"__keyspace@*__:{self._prefix}{key}", *args, **kwargs)
+        return self._backend.notifications(handler, f"{self._prefix}{key}", *args, **kwargs)
+
+    def watch(self,
+              key_pattern: str,
+              events: Iterable[str] = (),
+              debounce: float = 0.05,
+              fetch: Callable[[str], Any] | None = None
+              ) -> Observable:
+        """Observable of the changes (`KnowledgeEvent`) on keys matching `key_pattern`.
+
+        Changes of the same key are debounced and coalesced in one event, avoiding a storm of
+        handlers (and reads) on churny keys.
+
+        Examples:
+            ```python
+            k_cars = loop.app.k.create_set("cars", str)
+
+            loop.app.k.watch("cars", events=('sadd', 'srem'), fetch=lambda key: k_cars.len()).pipe(
+                ops.map(lambda event: event.value)
+            ).subscribe(planner)
+            ```
+
+        Args:
+            key_pattern: Glob-style pattern of keys (relative to the Knowledge prefix).
+            events: Redis commands to watch (eg. `('sadd', 'srem')`), filtered server side. Empty for all.
+            debounce: Seconds without changes on a key before emitting its event (0 emit each change).
+            fetch: Function (or coroutine) reading the key value, called with the key before emitting.
+                The value is cached per key, and an event is not emitted if the value is unchanged.
+        """
+        prefix_len = len(self._prefix)
+
+        def on_subscribe(observer, scheduler):
+            aio_loop = mape.aio_loop or asyncio.get_event_loop()
+            pending: Dict[str, KnowledgeEvent] = dict()
+            timers: Dict[str, asyncio.TimerHandle] = dict()
+            cache: Dict[str, Any] = dict()
+
+            async def fetch_and_emit(item: KnowledgeEvent):
+                item.value = await aio_call(fetch(item.key))
+
+                if item.key in cache and cache[item.key] == item.value:
+                    return
+
+                cache[item.key] = item.value
+                observer.on_next(item)
+
+            def emit(key):
+                timers.pop(key, None)
+                item = pending.pop(key)
+
+                if fetch is None:
+                    observer.on_next(item)
+                else:
+                    aio_loop.create_task(task_exception(fetch_and_emit(item)))
+
+            def on_change(key, event):
+                key = key[prefix_len:]
+
+                if item := pending.get(key):
+                    item.event = event
+                    item.coalesced += 1
+                else:
+                    pending[key] = KnowledgeEvent(key, event)
+
+                if not debounce:
+                    return emit(key)
+
+                if timer := timers.get(key):
+                    timer.cancel()
+                timers[key] = aio_loop.call_later(debounce, emit, key)
+
+            cancel = self._backend.watch(on_change, f"{self._prefix}{key_pattern}", events)
+
+            def dispose():
+                cancel()
+                for timer in timers.values():
+                    timer.cancel()
+
+            return Disposable(dispose)
+
+        return rx.create(on_subscribe)
+
+    async def aggregate(self,
+                        name: str,
+                        pattern: str | None = None,
+                        sortedset: str | None = None,
+                        arg: Any = None) -> float | int | List[Tuple[str, float]] | None:
+        """Aggregate numeric values in one call, server side with Redis (ie. Lua script).
+
+        Built-in aggregates: `count`, `sum`, `min`, `max`, `mean` (`None` if no values) and `topk`
+        (list of `(key, value)`, `arg` is k). Add your own with `register_aggregate()`.
+
+        Examples:
+            ```python
+            # Each child loop: await loop.level.k.create_versioned(f"speed_{loop.uid}", float).set(speed)
+            mean_speed = await loop.level.k.aggregate('mean', 'speed_*')
+            fastest = await loop.level.k.aggregate('topk', 'speed_*', arg=3)
+            ```
+
+        Args:
+            name: Aggregate name.
+            pattern: Glob-style pattern (relative to the Knowledge prefix) of keys holding a number
+                (string keys, or versioned values).
+            sortedset: Aggregate the scores of this sorted set (instead of `pattern`).
+            arg: Optional aggregate argument.
+        """
+        if sortedset is not None:
+            return await self._backend.aggregate(name, sortedset=self._prefix + sortedset, arg=arg)
+
+        result = await self._backend.aggregate(name, pattern=self._prefix + pattern, arg=arg)
+
+        # Keys relative to the Knowledge prefix
+        if isinstance(result, list):
+            prefix_len = len(self._prefix)
+            result = [(key[prefix_len:], value) for key, value in result]
+
+        return result
+
+    async def snapshot(self, path: str) -> int:
+        """Save all the Knowledge (of this namespace) in a compact binary file.
+
+        Args:
+            path: Snapshot file, replaced if exists.
+
+        Returns:
+            Number of saved keys.
+        """
+        return await self._backend.snapshot(path, f"{self._prefix}*")
+
+    async def restore(self, path: str, lazy: bool = True) -> int:
+        """Restore the Knowledge (of this namespace) from a snapshot, replacing the existing keys.
+
+        Args:
+            path: Snapshot file created by `snapshot()` (even of a wider namespace, eg. `App.snapshot_knowledge()`).
+            lazy: Decode each key on its first access (only the memory backend support it).
+
+        Returns:
+            Number of restored keys.
+        """
+        return await self._backend.restore(path, f"{self._prefix}*", lazy)
 
     @property
     def keyspace(self) -> RedisKeySpace[Pickled]:
@@ -65,3 +482,7 @@ class Knowledge:
     @property
     def prefix(self):
         return self._prefix
+
+    @property
+    def backend(self) -> KnowledgeBackend:
+        return self._backend
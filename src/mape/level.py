@@ -17,7 +17,7 @@ class Level:
         self._app = app or mape.app
         self._loops = dict()
 
-        self._k = Knowledge(self.app.redis, f"k{RESERVED_SEPARATOR}level{RESERVED_SEPARATOR}{self.uid}")
+        self._k = Knowledge(self.app.k_backend, f"k{RESERVED_SEPARATOR}level{RESERVED_SEPARATOR}{self.uid}")
 
     def add_loop(self, loop):
         uid = loop.uid
@@ -9,8 +9,10 @@ import types
 
 import mape
 
+from mape import config as mape_config
 from mape.base_elements import Element, Monitor, Analyze, Plan, Execute, UID, to_element_cls, make_func_class
 from mape.knowledge import Knowledge
+from mape.history import History
 from mape.utils import generate_uid
 from mape.typing import MapeLoop, OpsChain
 from mape.constants import RESERVED_PREPEND, RESERVED_SEPARATOR
@@ -39,7 +41,8 @@ class Loop(MapeLoop):
         if not self.add_to_level(self._level):
             raise ValueError(f"'{uid}' name is protected")
 
-        self._k: Knowledge = Knowledge(self.app.redis, f"k{RESERVED_SEPARATOR}loop{RESERVED_SEPARATOR}{self.uid}")
+        self._k: Knowledge = Knowledge(self.app.k_backend, f"k{RESERVED_SEPARATOR}loop{RESERVED_SEPARATOR}{self.uid}")
+        self._history: History | None = None
 
     def add_to_app(self, app):
         return app.add_loop(self)
@@ -57,12 +60,15 @@ class Loop(MapeLoop):
         if self.has_element(uid) or hasattr(self, uid):
             return False
 
-        if element in element._loop:
+        # Moved element (ie. from another loop or uid), the old path is not routed anymore
+        if element.loop is not None and element.loop.elements.get(element.uid) is element:
             del element.loop.elements[element.uid]
+            element.loop.app.routes.remove_element(element)
 
         element._uid = uid
         element._loop = self
         self._elements[uid] = element
+        self._app.routes.add_element(element)
 
         return uid
 
@@ -109,6 +115,14 @@ class Loop(MapeLoop):
     def k(self) -> Knowledge:
         return self._k
 
+    @property
+    def history(self) -> History:
+        """ In-process time series of the loop (created on first use, options from config `history`) """
+        if self._history is None:
+            self._history = History(**mape_config.get('history', {}))
+
+        return self._history
+
     @property
     def elements(self):
         return self._elements
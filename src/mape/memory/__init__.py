@@ -0,0 +1,19 @@
+"""In-process Knowledge storage: the Redis data model (and the redis-purse collections interface)
+on plain Python structures, without any server.
+"""
+from .store import MemoryStore, WrongTypeError
+from .collections import (
+    MemoryKeySpace,
+    MemoryHash,
+    MemorySet,
+    MemoryList,
+    MemoryKey,
+    MemorySortedSet,
+    MemoryPriorityQueue,
+    MemoryQueue,
+    MemoryLifoQueue,
+    MemoryVersioned,
+    MemoryLock
+)
+from .notifications import notifications_handler, keyspace_events_handler
+from .aggregate import memory_aggregate, register_aggregate
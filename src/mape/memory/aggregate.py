@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import math
+import heapq
+from typing import Any, Callable, Dict, List, Tuple
+
+from .store import MemoryStore, SortedSet
+
+
+def _mean(items, arg):
+    return sum(value for _, value in items) / len(items) if items else None
+
+
+def _topk(items, arg):
+    return heapq.nlargest(int(arg or 10), items, key=lambda item: item[1])
+
+
+# Python counterpart of mape.remote.redis.aggregate.LUA_AGGREGATES, func(items, arg)
+AGGREGATES: Dict[str, Callable[[List[Tuple[str, float]], Any], Any]] = {
+    'count': lambda items, arg: len(items),
+    'sum': lambda items, arg: float(sum(value for _, value in items)),
+    'min': lambda items, arg: float(min(value for _, value in items)) if items else None,
+    'max': lambda items, arg: float(max(value for _, value in items)) if items else None,
+    'mean': _mean,
+    'topk': _topk
+}
+
+
+def register_aggregate(name: str, func: Callable[[List[Tuple[str, float]], Any], Any]) -> None:
+    AGGREGATES[name] = func
+
+
+def _number(raw) -> float | None:
+    """ Number of a value stored as string (ie. as Lua `tonumber()` of the Redis aggregates) """
+    if isinstance(raw, bytes):
+        try:
+            raw = raw.decode()
+        except UnicodeDecodeError:
+            return None
+
+    if not isinstance(raw, str) or '_' in raw:
+        return None
+
+    try:
+        number = float(raw)
+    except ValueError:
+        try:
+            # Hexadecimal (eg. 0x1f)
+            return float(int(raw, 16)) if raw.strip().lower().lstrip('+-').startswith('0x') else None
+        except ValueError:
+            return None
+
+    # Lua doesn't parse inf and nan
+    return number if math.isfinite(number) else None
+
+
+def _value_number(value) -> float | None:
+    """ Same value types counted by Redis: numeric strings (not pickled or JSON values), or versioned values """
+    if isinstance(value, dict):
+        # Versioned value (see MemoryVersioned), numbers are stored as string in Redis
+        value = value.get('d')
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value) if math.isfinite(value) else None
+
+    return _number(value)
+
+
+def memory_aggregate(store: MemoryStore,
+                     name: str,
+                     pattern: str | None = None,
+                     sortedset: str | None = None,
+                     arg: Any = None) -> Any:
+    if name not in AGGREGATES:
+        raise ValueError(f"Aggregate '{name}' not registered")
+
+    if sortedset is not None:
+        zset = store.get(sortedset)
+        items = [(member, score) for score, member in zset.ordered] if isinstance(zset, SortedSet) else []
+    else:
+        items = []
+        for key in store.keys(pattern):
+            if (number := _value_number(store.get(key))) is not None:
+                items.append((key, number))
+
+    return AGGREGATES[name](items, arg)
@@ -0,0 +1,749 @@
+""" In-memory counterpart of the redis-purse collections (same methods and semantics).
+Values are stored as Python objects, so value_type is only kept for interface compatibility.
+Unlike Redis, the values read are the stored objects (not copies): don't mutate them in place. """
+from __future__ import annotations
+
+import heapq
+import asyncio
+from datetime import timedelta
+from collections import deque
+from collections.abc import Mapping, AsyncIterator
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Type, Union, Tuple, Iterable, List, TypeVar, Generic, Callable
+
+from mape.utils import aio_call
+from mape.remote.redis.versioned import VersionConflict, check_increment
+from .store import MemoryStore, SortedSet, PriorityHeap
+
+T = TypeVar('T')
+
+
+def _seconds(value: int | float | timedelta) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else value
+
+
+class MemoryKeySpace(Generic[T]):
+    __slots__ = ('store', 'prefix', '_value_type')
+
+    def __init__(self, store: MemoryStore, prefix: str, value_type: Type[T]):
+        self.store = store
+        self.prefix = prefix
+        self._value_type: Type[T] = value_type
+
+    async def set(self, key: str, value: T, ex: int | timedelta | None = None,
+                  px: int | timedelta | None = None,
+                  nx=False, xx=False, keepttl=False):
+        if value is None:
+            raise ValueError(f"Incorrect type. Expected type: {self._value_type} while give Value type None")
+
+        key = self.prefix + key
+        exists = self.store.exists(key)
+
+        if (nx and exists) or (xx and not exists):
+            return False
+
+        self.store.set(key, value, keepttl=keepttl)
+
+        if ex is not None:
+            self.store.expire(key, _seconds(ex))
+        elif px is not None:
+            self.store.expire(key, _seconds(px) / 1000)
+
+        return True
+
+    async def setdefault(self, key: str, value: T, ex: int | timedelta | None = None,
+                         px: int | timedelta | None = None,
+                         nx=False, xx=False, keepttl=False) -> T:
+        item = await self.get(key)
+
+        if item is not None:
+            return item
+
+        await self.set(key, value, ex, px, nx, xx, keepttl)
+        return value
+
+    async def update(self, mapping: Mapping[str, T], if_none_exist=False) -> bool:
+        if if_none_exist and any(self.store.exists(self.prefix + k) for k in mapping):
+            return False
+
+        for key, value in mapping.items():
+            self.store.set(self.prefix + key, value)
+
+        return True
+
+    async def get(self, key: str) -> T | None:
+        return self.store.get(self.prefix + key)
+
+    async def pop(self, key: str) -> T | None:
+        item = await self.get(key)
+
+        if item is None:
+            return None
+
+        await self.delete(key)
+        return item
+
+    async def delete(self, key: str):
+        self.store.delete(self.prefix + key)
+
+    async def clear(self) -> int:
+        return self.store.delete(*self.store.keys(f"{self.prefix}*"))
+
+    async def ttl(self, key: str) -> int:
+        ttl = self.store.ttl(self.prefix + key)
+        return ttl if ttl < 0 else round(ttl)
+
+    async def pttl(self, key: str) -> int:
+        ttl = self.store.ttl(self.prefix + key)
+        return ttl if ttl < 0 else round(ttl * 1000)
+
+    async def expire(self, key, seconds: int | timedelta):
+        return self.store.expire(self.prefix + key, _seconds(seconds))
+
+    async def pexpire(self, key, millis: int | timedelta):
+        return self.store.expire(self.prefix + key, _seconds(millis) / 1000)
+
+    async def persist(self, key):
+        return self.store.persist(self.prefix + key)
+
+    async def contains(self, key: str) -> bool:
+        return self.store.exists(self.prefix + key)
+
+    async def len(self) -> int:
+        return sum(1 for _ in self.store.keys(f"{self.prefix}*"))
+
+    def keys(self, batch_hint=None, with_prefix=False) -> AsyncIterator[str]:
+        prefix_len = 0 if with_prefix else len(self.prefix)
+
+        async def _key_iter() -> AsyncIterator[str]:
+            for key in self.store.keys(f"{self.prefix}*"):
+                yield key[prefix_len:]
+
+        return _key_iter()
+
+    def items(self, batch_hint=None) -> AsyncIterator[Tuple[str, T]]:
+        async def _pair_iter():
+            async for k in self.keys():
+                yield k, await self.get(k)
+
+        return _pair_iter()
+
+    def values(self, batch_hint=None) -> AsyncIterator[T]:
+        async def _val_iter():
+            async for k, v in self.items():
+                yield v
+
+        return _val_iter()
+
+    def __aiter__(self) -> AsyncIterator[Tuple[str, T]]:
+        return self.items()
+
+
+class MemoryKey:
+    """
+    Base class for MemoryHash, MemorySet, MemorySortedSet, MemoryList and all MemoryQueue Classes
+    """
+    __slots__ = ('rkey', 'store')
+
+    def __init__(self, store: MemoryStore, rkey: str):
+        self.store: MemoryStore = store
+        self.rkey: str = rkey
+
+    async def expire(self, seconds: int | timedelta):
+        return self.store.expire(self.rkey, _seconds(seconds))
+
+    async def ttl(self):
+        ttl = self.store.ttl(self.rkey)
+        return ttl if ttl < 0 else round(ttl)
+
+    async def pttl(self):
+        ttl = self.store.ttl(self.rkey)
+        return ttl if ttl < 0 else round(ttl * 1000)
+
+    async def persist(self):
+        return self.store.persist(self.rkey)
+
+    async def key_type(self):
+        return self.store.key_type(self.rkey)
+
+    async def exists(self):
+        return int(self.store.exists(self.rkey))
+
+    async def delete_redis_key(self):
+        self.store.delete(self.rkey)
+
+    async def clear(self):
+        return self.store.delete(self.rkey)
+
+    def _get(self, factory) -> Any:
+        """ Read only access (None if key not exist) """
+        return self.store.container(self.rkey, factory, create=False)
+
+    def _changed(self, event: str):
+        self.store.drop_if_empty(self.rkey)
+        self.store.notify(event, self.rkey)
+
+
+class MemoryHash(Generic[T], MemoryKey):
+    __slots__ = ('_value_type',)
+
+    def __init__(self, store: MemoryStore, rkey: str, value_type: Type[T]):
+        super().__init__(store, rkey)
+        self._value_type: Type[T] = value_type
+
+    async def set(self, key: str, value: T):
+        mapping = self.store.container(self.rkey, dict)
+        is_new = key not in mapping
+        mapping[key] = value
+        self._changed('hset')
+        return int(is_new)
+
+    async def get(self, key: str) -> T | None:
+        mapping = self._get(dict)
+        return None if mapping is None else mapping.get(key)
+
+    async def setdefault(self, key: str, value: T) -> T:
+        item = await self.get(key)
+
+        if item is not None:
+            return item
+
+        await self.set(key, value)
+        return value
+
+    async def pop(self, key: str) -> T | None:
+        mapping = self._get(dict)
+
+        if not mapping or key not in mapping:
+            return None
+
+        item = mapping.pop(key)
+        self._changed('hdel')
+        return item
+
+    async def update(self, mapping: Mapping[Any, T]):
+        current = self.store.container(self.rkey, dict)
+        added = len(mapping.keys() - current.keys())
+        current.update(mapping)
+        self._changed('hset')
+        return added
+
+    async def delete(self, key: str):
+        return int(await self.pop(key) is not None)
+
+    async def contains(self, key: str) -> bool:
+        mapping = self._get(dict)
+        return bool(mapping) and key in mapping
+
+    async def len(self) -> int:
+        return len(self._get(dict) or ())
+
+    async def dict(self) -> Dict[str, T]:
+        return dict(self._get(dict) or {})
+
+    def keys(self, match=None, batch_hint=None) -> AsyncIterator[str]:
+        async def _key_iter() -> AsyncIterator[str]:
+            async for k, _ in self.items(match, batch_hint):
+                yield k
+
+        return _key_iter()
+
+    def values(self, match=None, batch_hint=None) -> AsyncIterator[T]:
+        async def _val_iter() -> AsyncIterator[T]:
+            async for _, val in self.items(match, batch_hint):
+                yield val
+
+        return _val_iter()
+
+    def items(self, match=None, batch_hint=None) -> AsyncIterator[Tuple[str, T]]:
+        async def _item_iter():
+            for k, v in list((self._get(dict) or {}).items()):
+                if match is None or fnmatchcase(k, match):
+                    yield k, v
+
+        return _item_iter()
+
+    def __aiter__(self) -> AsyncIterator[Tuple[str, T]]:
+        return self.items()
+
+
+class MemorySet(Generic[T], MemoryKey):
+    __slots__ = ('_value_type',)
+
+    def __init__(self, store: MemoryStore, rkey: str, value_type: Type[T]):
+        super().__init__(store, rkey)
+        self._value_type: Type[T] = value_type
+
+    async def add(self, member: T):
+        return await self.update(member)
+
+    async def update(self, *members: T):
+        current = self.store.container(self.rkey, set)
+        size = len(current)
+        current.update(members)
+        added = len(current) - size
+
+        # As Redis, notified only on change
+        if added:
+            self._changed('sadd')
+        else:
+            self.store.drop_if_empty(self.rkey)
+        return added
+
+    async def remove(self, *members: T):
+        current = self._get(set)
+
+        if not current:
+            return 0
+
+        size = len(current)
+        current.difference_update(members)
+        removed = size - len(current)
+
+        if removed:
+            self._changed('srem')
+        return removed
+
+    async def contains(self, member: T) -> bool:
+        current = self._get(set)
+        return bool(current) and member in current
+
+    async def len(self):
+        return len(self._get(set) or ())
+
+    def values(self, match: Union[str, None] = None, batch_hint=None) -> AsyncIterator[T]:
+        async def _typed_iter():
+            for member in list(self._get(set) or ()):
+                if match is None or fnmatchcase(str(member), match):
+                    yield member
+
+        return _typed_iter()
+
+    def __aiter__(self) -> AsyncIterator[T]:
+        return self.values()
+
+
+class MemorySortedSet(Generic[T], MemoryKey):
+    __slots__ = ('_value_type',)
+
+    def __init__(self, store: MemoryStore, rkey: str, value_type: Type[T]):
+        super().__init__(store, rkey)
+        self._value_type: Type[T] = value_type
+
+    async def add_multi(self, members: List[Tuple[T, float]], nx=False, xx=False, ch=False):
+        zset = self.store.container(self.rkey, SortedSet)
+        added = changed = 0
+
+        for member, score in members:
+            exists = member in zset.scores
+
+            if (nx and exists) or (xx and not exists):
+                continue
+
+            changed += exists and zset.scores[member] != score
+            added += zset.add(member, score)
+
+        self._changed('zadd')
+        return added + changed if ch else added
+
+    async def add(self, member: Tuple[T, float], nx=False, xx=False, ch=False):
+        return await self.add_multi([member], nx=nx, xx=xx, ch=ch)
+
+    async def increment_multi(self, members: List[Tuple[T, float]]) -> List[Tuple[T, float]]:
+        if not members:
+            raise ValueError("bad members argument")
+
+        return [await self.increment(member) for member in members]
+
+    async def increment(self, member: Tuple[T, float]) -> Tuple[T, float]:
+        k, v = member
+        zset = self.store.container(self.rkey, SortedSet)
+        new_score = zset.scores.get(k, 0) + v
+        zset.add(k, new_score)
+        self._changed('zincr')
+        return k, new_score
+
+    async def remove(self, *members: T):
+        zset = self._get(SortedSet)
+
+        if not zset:
+            return 0
+
+        removed = sum(zset.remove(member) for member in members)
+        if removed:
+            self._changed('zrem')
+        return removed
+
+    async def score_multi(self, members: List[T]) -> List[Tuple[T, float]]:
+        if not members:
+            raise ValueError("invalid empty members list")
+
+        return [(member, await self.score(member)) for member in members]
+
+    async def score(self, member: T) -> float:
+        zset = self._get(SortedSet)
+        return None if zset is None else zset.scores.get(member)
+
+    async def rank(self, member: T, descending=False) -> int:
+        zset = self._get(SortedSet)
+        rank = None if zset is None else zset.rank(member)
+        return rank if rank is None or not descending else len(zset) - rank - 1
+
+    async def slice_by_rank(self, min_rank: int, max_rank: int,
+                            descending=False) -> List[Tuple[T, float]]:
+        zset = self._get(SortedSet)
+
+        if not zset:
+            return []
+
+        ordered = zset.ordered[::-1] if descending else zset.ordered
+        # Redis ranges are inclusive and accept negative indexes
+        max_rank = len(ordered) + max_rank if max_rank < 0 else max_rank
+        return [(member, score) for score, member in ordered[min_rank:max_rank + 1]]
+
+    async def slice_by_score(self, min_score: float,
+                             max_score: float, offset=None, count=None,
+                             descending=False) -> List[Tuple[T, float]]:
+        zset = self._get(SortedSet)
+
+        if not zset:
+            return []
+
+        result = [(member, score) for score, member in zset.ordered if min_score <= score <= max_score]
+        result = result[::-1] if descending else result
+
+        if offset is not None:
+            result = result[offset:offset + count if count is not None and count >= 0 else None]
+
+        return result
+
+    async def len(self):
+        return len(self._get(SortedSet) or ())
+
+    async def _pop(self, index: int, count: int, event: str) -> List[Tuple[T, float]]:
+        zset = self._get(SortedSet)
+
+        if not zset:
+            return []
+
+        result = [zset.pop(index) for _ in range(min(count, len(zset)))]
+        self._changed(event)
+        return result
+
+    async def pop_max(self, count=1) -> List[Tuple[T, float]]:
+        return await self._pop(-1, count, 'zpopmax')
+
+    async def pop_min(self, count=1) -> List[Tuple[T, float]]:
+        return await self._pop(0, count, 'zpopmin')
+
+    async def peak_max(self) -> Tuple[T, float]:
+        return (await self.slice_by_rank(min_rank=0, max_rank=0, descending=True))[0]
+
+    async def peak_min(self) -> Tuple[T, float]:
+        return (await self.slice_by_rank(min_rank=0, max_rank=0, descending=False))[0]
+
+    async def _blocking_pop(self, index: int, timeout: float, event: str) -> Tuple[T, float] | None:
+        while True:
+            if result := await self._pop(index, 1, event):
+                return result[0]
+
+            if not await self.store.wait(self.rkey, timeout):
+                return None
+
+    async def blocking_pop_min(self, timeout=0) -> Tuple[T, float]:
+        return await self._blocking_pop(0, timeout, 'zpopmin')
+
+    async def blocking_pop_max(self, timeout=0) -> Tuple[T, float]:
+        return await self._blocking_pop(-1, timeout, 'zpopmax')
+
+    def _changed(self, event: str):
+        super()._changed(event)
+        event in ('zadd', 'zincr') and self.store.wake(self.rkey)
+
+    def values(self, match=None, batch_hint=None) -> AsyncIterator[Tuple[T, float]]:
+        async def _typed_iter():
+            zset = self._get(SortedSet)
+            for score, member in list(zset.ordered if zset else ()):
+                if match is None or fnmatchcase(str(member), match):
+                    yield member, score
+
+        return _typed_iter()
+
+    def __aiter__(self) -> AsyncIterator[Tuple[T, float]]:
+        return self.values()
+
+
+class MemoryList(Generic[T], MemoryKey):
+    __slots__ = ('_value_type',)
+
+    def __init__(self, store: MemoryStore, rkey: str, value_type: Type[T]):
+        super().__init__(store, rkey)
+        self._value_type: Type[T] = value_type
+
+    async def append(self, item: T):
+        return await self.extend((item,))
+
+    async def appendleft(self, item: T):
+        return await self.extendleft((item,))
+
+    async def extend(self, items: Iterable[T]):
+        items_list = self.store.container(self.rkey, deque)
+        items_list.extend(items)
+        self._changed('rpush')
+        return len(items_list)
+
+    async def extendleft(self, items: Iterable[T]):
+        items_list = self.store.container(self.rkey, deque)
+        items_list.extendleft(items)
+        self._changed('lpush')
+        return len(items_list)
+
+    async def insert(self, index: int, item: T):
+        items_list = self.store.container(self.rkey, deque)
+        items_list.insert(index, item)
+        self._changed('linsert')
+
+    async def setitem(self, index: int, value: T):
+        items_list = self._get(deque)
+
+        if not items_list:
+            raise IndexError("MemoryList index out of range")
+
+        items_list[index] = value
+        self._changed('lset')
+        return True
+
+    async def getitem(self, index: int) -> T:
+        try:
+            return (self._get(deque) or ())[index]
+        except IndexError:
+            raise IndexError("MemoryList index out of range")
+
+    async def _pop(self, left: bool) -> T | None:
+        items_list = self._get(deque)
+
+        if not items_list:
+            return None
+
+        item = items_list.popleft() if left else items_list.pop()
+        self._changed('lpop' if left else 'rpop')
+        return item
+
+    async def pop(self) -> T:
+        return await self._pop(left=False)
+
+    async def popleft(self) -> T:
+        return await self._pop(left=True)
+
+    async def remove(self, value: T, count: int = 0):
+        items_list = self._get(deque)
+
+        if not items_list:
+            return 0
+
+        # As LREM: count > 0 from head, count < 0 from tail, count = 0 all
+        indexes = [i for i, item in enumerate(items_list) if item == value]
+        indexes = indexes[-count:] if count < 0 else indexes[:count or None]
+
+        for i in reversed(indexes):
+            del items_list[i]
+
+        self._changed('lrem')
+        return len(indexes)
+
+    async def len(self):
+        return len(self._get(deque) or ())
+
+    async def contains(self, value: T) -> bool:
+        return value in (self._get(deque) or ())
+
+    async def index(self, value: T) -> int | None:
+        try:
+            return (self._get(deque) or deque()).index(value)
+        except ValueError:
+            return None
+
+    async def slice(self, start: int, stop: int) -> List[T]:
+        return list(self._get(deque) or ())[start:stop]
+
+    def values(self, batch_size: Union[int, None] = 10) -> AsyncIterator[T]:
+        async def _typed_iter():
+            for item in list(self._get(deque) or ()):
+                yield item
+
+        return _typed_iter()
+
+    def __aiter__(self) -> AsyncIterator[T]:
+        return self.values()
+
+
+class MemoryQueue(Generic[T], MemoryKey):
+    """
+    acts as a Python SimpleQueue
+    """
+    __slots__ = ('_value_type',)
+
+    _put_event = 'lpush'
+
+    def __init__(self, store: MemoryStore, rkey: str, value_type: Type[T]):
+        super().__init__(store, rkey)
+        self._value_type: Type[T] = value_type
+
+    def _put(self, items: deque, item: T):
+        items.appendleft(item)
+
+    async def put(self, item: T):
+        items = self.store.container(self.rkey, deque)
+        self._put(items, item)
+        self.store.notify(self._put_event, self.rkey)
+        self.store.wake(self.rkey)
+        return len(items)
+
+    async def get(self, timeout: float = 0) -> T:
+        while True:
+            try:
+                return await self.get_nowait()
+            except asyncio.QueueEmpty:
+                if not await self.store.wait(self.rkey, timeout):
+                    raise asyncio.QueueEmpty("MemoryQueue Empty")
+
+    async def get_nowait(self) -> T:
+        items = self._get(deque)
+
+        if not items:
+            raise asyncio.QueueEmpty("MemoryQueue Empty")
+
+        item = items.pop()
+        self._changed('rpop')
+        return item
+
+    async def qsize(self):
+        return len(self._get(deque) or ())
+
+
+class MemoryLifoQueue(MemoryQueue[T]):
+    """
+    acts as a Python LifoQueue
+    """
+    __slots__ = ()
+
+    _put_event = 'rpush'
+
+    def _put(self, items: deque, item: T):
+        items.append(item)
+
+
+class MemoryPriorityQueue(Generic[T], MemoryKey):
+    """
+    acts as a Python PriorityQueue
+    """
+    __slots__ = ('_value_type',)
+
+    def __init__(self, store: MemoryStore, rkey: str, value_type: Type[T]):
+        super().__init__(store, rkey)
+        self._value_type: Type[T] = value_type
+
+    async def put(self, item: Tuple[T, int]):
+        heap = self.store.container(self.rkey, PriorityHeap)
+        heap.sequence += 1
+        heapq.heappush(heap, (item[1], heap.sequence, item[0]))
+        self.store.notify('zadd', self.rkey)
+        self.store.wake(self.rkey)
+        return 1
+
+    async def get(self, timeout: float = 0) -> Tuple[T, int]:
+        while True:
+            try:
+                return await self.get_nowait()
+            except asyncio.QueueEmpty:
+                if not await self.store.wait(self.rkey, timeout):
+                    raise asyncio.QueueEmpty("MemoryQueue Empty")
+
+    async def get_nowait(self) -> Tuple[T, int]:
+        heap = self._get(PriorityHeap)
+
+        if not heap:
+            raise asyncio.QueueEmpty("MemoryQueue Empty")
+
+        priority, _, item = heapq.heappop(heap)
+        self._changed('zpopmin')
+        return item, int(priority)
+
+    async def qsize(self):
+        return len(self._get(PriorityHeap) or ())
+
+
+class MemoryVersioned(Generic[T], MemoryKey):
+    """
+    acts as a mape.remote.redis.RedisVersioned (value in 'd' and version in 'v' of a hash)
+    """
+    __slots__ = ('_value_type',)
+
+    def __init__(self, store: MemoryStore, rkey: str, value_type: Type[T]):
+        super().__init__(store, rkey)
+        self._value_type: Type[T] = value_type
+
+    def _write(self, value: T, event: str) -> int:
+        entry = self.store.container(self.rkey, dict)
+        entry['d'] = value
+        entry['v'] = entry.get('v', 0) + 1
+        self.store.notify(event, self.rkey)
+        return entry['v']
+
+    async def get(self) -> Tuple[T | None, int]:
+        entry = self._get(dict)
+        return (None, 0) if not entry else (entry.get('d'), entry.get('v', 0))
+
+    async def version(self) -> int:
+        return (await self.get())[1]
+
+    async def set(self, value: T) -> int:
+        return self._write(value, 'hset')
+
+    async def compare_and_set(self, value: T, version: int) -> int | None:
+        if (await self.get())[1] != version:
+            return None
+
+        return self._write(value, 'hset')
+
+    async def increment(self, amount: int | float = 1) -> Tuple[T, int]:
+        check_increment(self._value_type, amount)
+        value = self._value_type((await self.get())[0] or 0) + amount
+        return value, self._write(value, 'hincrby')
+
+    async def update(self, func: Callable[[T | None], Any], retries: int = 10) -> Tuple[T, int]:
+        for _ in range(retries):
+            value, version = await self.get()
+            new_value = await aio_call(func(value))
+
+            if (new_version := await self.compare_and_set(new_value, version)) is not None:
+                return new_value, new_version
+
+        raise VersionConflict(f"'{self.rkey}' update failed after {retries} retries")
+
+
+class MemoryLock:
+    """ Same interface of `purse.Redlock`, backed by an `asyncio.Lock` shared by key in the store """
+
+    def __init__(self, key: str, store: MemoryStore, *args, **kwargs) -> None:
+        self.key = key
+        self._lock = store.lock(key)
+
+    async def acquire(self, *args, **kwargs) -> None:
+        await self._lock.acquire()
+
+    async def locked(self, *args, **kwargs) -> int:
+        return int(self._lock.locked())
+
+    async def extend(self, *args, **kwargs) -> None:
+        pass
+
+    async def release(self, *args, **kwargs) -> None:
+        self._lock.release()
+
+    async def __aenter__(self) -> MemoryLock:
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.release()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Tuple, List, Callable
+
+import mape
+from mape.utils import auto_task
+from .store import MemoryStore
+
+KEYSPACE_CHANNEL = '__keyspace@0__:'
+
+
+def notifications_handler(store: MemoryStore, handler: Callable, key: str, cmd_filter=(), full_message=False):
+    """ Same behaviour of `mape.remote.redis.notifications_handler()` (ie. Redis keyspace notifications),
+    where `key` is a glob-style pattern. Return the function to stop the notifications. """
+    cmd_filter = cmd_filter if isinstance(cmd_filter, (Tuple, List)) else [cmd_filter]
+    # Loop of the handler, for the keys set outside of it (eg. before `mape.run()`, or from a thread)
+    try:
+        aio_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        aio_loop = mape.aio_loop
+
+    def _on_notify(rkey, redis_cmd):
+        if not cmd_filter or redis_cmd in cmd_filter:
+            message = {
+                'type': 'pmessage',
+                'pattern': KEYSPACE_CHANNEL + key,
+                'channel': KEYSPACE_CHANNEL + rkey,
+                'data': redis_cmd
+            } if full_message else redis_cmd
+
+            # Deferred call, as happen with a Redis subscription
+            try:
+                asyncio.get_running_loop().call_soon(auto_task, handler, message)
+            except RuntimeError:
+                if aio_loop is None or aio_loop.is_closed():
+                    # No loop at all: synchronous dispatch
+                    auto_task(handler, message)
+                else:
+                    aio_loop.call_soon_threadsafe(auto_task, handler, message)
+
+    return store.subscribe(key, _on_notify)
+
+
+def keyspace_events_handler(store: MemoryStore, callback: Callable[[str, str], Any], key_pattern: str, events=()):
+    """ Same behaviour of `mape.remote.redis.keyspace_events_handler()`, `callback` is called synchronously """
+    if not events:
+        return store.subscribe(key_pattern, callback)
+
+    def _on_notify(key, event):
+        event in events and callback(key, event)
+
+    return store.subscribe(key_pattern, _on_notify)
@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import os
+import time
+import pickle
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import count
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Set, Tuple, Callable, Iterator
+
+from mape.snapshot import SnapshotWriter, SnapshotReader, Encoding, Entry
+
+logger = logging.getLogger(__name__)
+
+
+class WrongTypeError(TypeError):
+    """ Operation against a key holding the wrong kind of value (as Redis WRONGTYPE) """
+    pass
+
+
+def _member_key(member) -> bytes:
+    """ Tie-break of equal scores, as Redis by the stored bytes (any member orderable, eg. dicts) """
+    if isinstance(member, bytes):
+        return member
+    elif isinstance(member, str):
+        return member.encode()
+
+    return pickle.dumps(member, pickle.HIGHEST_PROTOCOL)
+
+
+class SortedSet:
+    """ Members ordered by (score, encoded member), with O(1) score lookup """
+    __slots__ = ('scores', 'ordered', '_keys')
+
+    def __init__(self) -> None:
+        self.scores: Dict[Any, float] = dict()
+        self.ordered: List[Tuple[float, Any]] = list()
+        # Sort keys of `ordered`, (score, encoded member)
+        self._keys: List[Tuple[float, bytes]] = list()
+
+    def __setstate__(self, state) -> None:
+        _, slots = state
+        self.scores, self.ordered = slots['scores'], slots['ordered']
+
+        if '_keys' in slots:
+            self._keys = slots['_keys']
+        else:
+            # Saved by a previous version (ie. ordered by member)
+            self.ordered.sort(key=lambda pair: (pair[0], _member_key(pair[1])))
+            self._keys = [(score, _member_key(member)) for score, member in self.ordered]
+
+    def _index(self, score: float, member) -> int:
+        return bisect_left(self._keys, (score, _member_key(member)))
+
+    def add(self, member, score: float) -> bool:
+        """ Return True if member is new """
+        old_score = self.scores.get(member)
+
+        if old_score is not None:
+            if old_score == score:
+                return False
+            index = self._index(old_score, member)
+            del self.ordered[index], self._keys[index]
+
+        key = (score, _member_key(member))
+        index = bisect_right(self._keys, key)
+        self._keys.insert(index, key)
+        self.ordered.insert(index, (score, member))
+
+        self.scores[member] = score
+        return old_score is None
+
+    def remove(self, member) -> bool:
+        score = self.scores.pop(member, None)
+
+        if score is None:
+            return False
+
+        index = self._index(score, member)
+        del self.ordered[index], self._keys[index]
+        return True
+
+    def pop(self, index: int) -> Tuple[Any, float]:
+        score, member = self.ordered.pop(index)
+        del self._keys[index]
+        del self.scores[member]
+        return member, score
+
+    def rank(self, member) -> int | None:
+        score = self.scores.get(member)
+        return None if score is None else self._index(score, member)
+
+    def __len__(self):
+        return len(self.scores)
+
+
+class PriorityHeap(list):
+    """ Heap of (priority, sequence, item), sequence keeps FIFO order on same priority """
+    __slots__ = ('sequence',)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sequence = 0
+
+
+_key_types = {
+    dict: 'hash',
+    set: 'set',
+    deque: 'list',
+    SortedSet: 'zset',
+    PriorityHeap: 'zset'
+}
+
+
+class MemoryStore:
+    """In-process key-value store with the Redis data model (strings, hashes, sets, lists, sorted sets),
+    key expiration and keyspace notifications, built on plain Python structures.
+
+    Values are held by reference (no serialization), and can be optionally persisted on a local file.
+
+    Args:
+        path: File where the store is loaded from (if exists) and saved to (ie. `save()`, `close()`).
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self._path = path
+        self._data: Dict[str, Any] = dict()
+        self._expires: Dict[str, float] = dict()
+        self._subscriptions: Dict[int, Tuple[str, Callable]] = dict()
+        self._subscription_ids = count()
+        self._waiters: Dict[str, deque] = dict()
+        self._locks: Dict[str, asyncio.Lock] = dict()
+        # Restored (not yet accessed) keys, paged in from snapshot on first access
+        self._lazy: Dict[str, Tuple[SnapshotReader, Entry]] = dict()
+        self._snapshots: Set[SnapshotReader] = set()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    """ Keys """
+
+    def _alive(self, key: str) -> bool:
+        if self._lazy and key in self._lazy:
+            self._page_in(key)
+
+        expire_at = self._expires.get(key)
+
+        if expire_at is not None and expire_at <= time.time():
+            del self._expires[key]
+            del self._data[key]
+            self.notify('expired', key)
+            return False
+
+        return key in self._data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data[key] if self._alive(key) else default
+
+    def set(self, key: str, value: Any, event: str | None = 'set', keepttl: bool = False) -> None:
+        if self._lazy and self._lazy.pop(key, None) and not self._lazy:
+            # Last restored key replaced: release the snapshot mappings
+            self._close_snapshots()
+        self._data[key] = value
+        keepttl or self._expires.pop(key, None)
+        event and self.notify(event, key)
+
+    def container(self, key: str, factory: Callable, create: bool = True) -> Any:
+        """ Get (or create with `factory`) the data structure stored at key """
+        value = self.get(key)
+
+        if value is None:
+            if not create:
+                return None
+            value = self._data[key] = factory()
+        elif type(value) is not factory:
+            raise WrongTypeError(f"Operation against key '{key}' holding the wrong kind of value")
+
+        return value
+
+    def drop_if_empty(self, key: str) -> None:
+        """ As Redis, an aggregate data type is removed when it becomes empty """
+        if key in self._data and not len(self._data[key]):
+            del self._data[key]
+            self._expires.pop(key, None)
+
+    def delete(self, *keys: str) -> int:
+        deleted = 0
+
+        for key in keys:
+            if self._alive(key):
+                del self._data[key]
+                self._expires.pop(key, None)
+                self.notify('del', key)
+                deleted += 1
+
+        return deleted
+
+    def exists(self, key: str) -> bool:
+        return self._alive(key)
+
+    def key_type(self, key: str) -> str:
+        if not self._alive(key):
+            return 'none'
+
+        return _key_types.get(type(self._data[key]), 'string')
+
+    def keys(self, pattern: str = '*') -> Iterator[str]:
+        # Snapshot keys, allowing changes during the iteration
+        for key in [*self._data, *self._lazy]:
+            if fnmatchcase(key, pattern) and self._listed(key):
+                yield key
+
+    def _listed(self, key: str) -> bool:
+        """ As `_alive`, without paging in a restored key """
+        if key not in self._lazy:
+            return self._alive(key)
+
+        expire_at = self._expires.get(key)
+
+        if expire_at is not None and expire_at <= time.time():
+            del self._expires[key]
+            del self._lazy[key]
+            self._lazy or self._close_snapshots()
+            self.notify('expired', key)
+            return False
+
+        return True
+
+    def expire(self, key: str, seconds: float) -> bool:
+        if not self._alive(key):
+            return False
+
+        self._expires[key] = time.time() + seconds
+        self.notify('expire', key)
+        return True
+
+    def ttl(self, key: str) -> float:
+        """ Remaining time to live in seconds, -1 without expiration and -2 if key not exist """
+        if not self._alive(key):
+            return -2
+
+        expire_at = self._expires.get(key)
+        return -1 if expire_at is None else expire_at - time.time()
+
+    def persist(self, key: str) -> bool:
+        return self._alive(key) and self._expires.pop(key, None) is not None
+
+    """ Keyspace notifications """
+
+    def subscribe(self, pattern: str, callback: Callable[[str, str], Any]) -> Callable[[], None]:
+        """ Call `callback(key, event)` on change of keys matching the glob-style `pattern`.
+        Return the function to unsubscribe. """
+        handle = next(self._subscription_ids)
+        self._subscriptions[handle] = (pattern, callback)
+
+        return lambda: self._subscriptions.pop(handle, None)
+
+    def notify(self, event: str, key: str) -> None:
+        for pattern, callback in list(self._subscriptions.values()):
+            if fnmatchcase(key, pattern):
+                callback(key, event)
+
+    """ Blocking operations """
+
+    async def wait(self, key: str, timeout: float = 0) -> bool:
+        """ Wait for a push on key, `timeout=0` means forever (as Redis blocking commands) """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+
+        try:
+            await asyncio.wait_for(future, timeout or None)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                future in waiters and waiters.remove(future)
+                waiters or self._waiters.pop(key)
+
+    def wake(self, key: str) -> None:
+        """ Wake up the first waiter on key """
+        waiters = self._waiters.get(key)
+
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(True)
+                break
+
+    def lock(self, key: str) -> asyncio.Lock:
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    """ Persistence """
+
+    def save(self, path: str | None = None) -> None:
+        path = path or self._path
+
+        if not path:
+            return
+
+        self._page_in_all()
+
+        # Purge expired keys before dump
+        for key in list(self._expires):
+            self._alive(key)
+
+        # Atomic write (ie. never leave a truncated file)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            pickle.dump((self._data, self._expires), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        logger.debug(f"Memory store saved on '{path}' ({len(self._data)} keys)")
+
+    def load(self, path: str | None = None) -> None:
+        path = path or self._path
+
+        with open(path, 'rb') as file:
+            self._data, self._expires = pickle.load(file)
+
+        self._close_snapshots()
+
+        logger.debug(f"Memory store loaded from '{path}' ({len(self._data)} keys)")
+
+    def close(self) -> None:
+        self.save()
+        self._close_snapshots()
+
+    """ Snapshot """
+
+    def snapshot(self, path: str, pattern: str = '*') -> int:
+        """ Write keys matching `pattern` in a snapshot file, return the number of keys written """
+        with SnapshotWriter(path, Encoding.PICKLE) as writer:
+            for key in self.keys(pattern):
+                payload = pickle.dumps(self._data[key], pickle.HIGHEST_PROTOCOL)
+                writer.write(key, payload, self._expires.get(key, 0))
+
+            return len(writer)
+
+    def restore(self, path: str, pattern: str = '*', lazy: bool = True) -> int:
+        """ Restore (replacing) keys matching `pattern` from a snapshot file, return the number of keys restored.
+        With `lazy` only the index is read, and each value is decoded on its first access. """
+        reader = SnapshotReader(path)
+
+        if reader.encoding is not Encoding.PICKLE:
+            reader.close()
+            raise ValueError(f"Snapshot '{path}' has not been created by a memory store ({reader.encoding.name})")
+
+        now = time.time()
+        count = 0
+
+        for key, entry in reader.items():
+            if not fnmatchcase(key, pattern) or (entry.expire_at and entry.expire_at <= now):
+                continue
+
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            if entry.expire_at:
+                self._expires[key] = entry.expire_at
+
+            self._lazy[key] = (reader, entry)
+            count += 1
+
+        if count:
+            self._snapshots.add(reader)
+            lazy or self._page_in_all()
+        else:
+            reader.close()
+
+        logger.debug(f"Memory store restored {count} keys from '{path}'")
+        return count
+
+    def _page_in(self, key: str) -> None:
+        reader, entry = self._lazy.pop(key)
+
+        with reader.payload(entry) as payload:
+            self._data[key] = pickle.loads(payload)
+
+        if not self._lazy:
+            self._close_snapshots()
+
+    def _page_in_all(self) -> None:
+        for key in list(self._lazy):
+            self._page_in(key)
+
+    def _close_snapshots(self) -> None:
+        self._lazy.clear()
+
+        for reader in self._snapshots:
+            reader.close()
+
+        self._snapshots.clear()
+
+    def __len__(self):
+        return len(self._data) + len(self._lazy)
+
+    @property
+    def path(self):
+        return self._path
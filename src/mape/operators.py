@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-from typing import Any, Callable, Optional, Union, Awaitable, Coroutine, NamedTuple, Tuple
-
+import copy
+import math
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional, Union, Awaitable, Coroutine, NamedTuple, Tuple
+
+import numpy as np
 import rx
 from rx.subject import Subject
-from rx.core import Observer, Observable
+from rx.core import Observable
 from rx.disposable import Disposable, CompositeDisposable
 from rx.operators import *
 
 import mape
 from .base_elements import Element
+from .utils import log_task_exception
+from .rolling import RollingWindow, Ewma, RateOfChange
+from .routing import ContentRouter, Rule
 from .typing import Mapper, OpsChain, DestMapper, Message
 
 MapeElement = Union[Subject, Element]
@@ -33,50 +42,386 @@ def through(subject: MapeElement):
 sitm = through
 
 
-def group_and_pipe(operators: OpsChain, key_mapper: Mapper = None):
+def through_shared(subject: MapeElement):
+    """Item pass through the subject once, the result multicast to all the subscribers.
+
+    `through()` subscribes the source to the subject for each subscription, so with more subscribers
+    each item traverses the element more times. Here the first subscription connects the source to
+    the subject, the next ones share it, and the last one disposed disconnects (ie. reference counted).
+
+    Examples:
+        ```python
+        executed = detect.pipe(through_shared(policy), through_shared(exec))
+        executed.subscribe(logger)
+        executed.subscribe(influx)  # exec runs once for each item
+        ```
+    """
+
+    def _through_shared(source):
+        return source.pipe(through(subject), share())
+
+    return _through_shared
+
+
+sitm_shared = through_shared
+
+
+@dataclass
+class GroupStats:
+    """ Groups of a `group_and_pipe` operator (all its subscriptions) """
+    active: int = 0
+    created: int = 0
+    evicted: int = 0
+
+
+def group_and_pipe(operators: OpsChain,
+                   key_mapper: Mapper = None,
+                   max_groups: int | None = None,
+                   idle_timeout: float | None = None,
+                   on_evict: Callable[[Any], Any] | None = None):
+    """Run the `operators` pipe for each group of items (by `key_mapper`, default `item.src`).
+
+    Groups are released (ie. their pipe completed and disposed) when idle for `idle_timeout` seconds,
+    or the least recently used when exceeding `max_groups`, so high cardinality keys don't leak memory.
+    A released group is created again by its next item. The counters are in `.stats` of the operator.
+
+    Examples:
+        ```python
+        avg_by_car = group_and_pipe((buffer_with_count(8), map(mean)), max_groups=10_000, idle_timeout=60)
+        avg_by_car.stats.active
+        ```
+
+    Args:
+        on_evict: Called with the key of each released group.
+    """
     key_mapper = key_mapper or (lambda item: item.src)
-    ops_in = list(pipe) if isinstance(pipe, Tuple) else [pipe]
+    operators = tuple(operators) if isinstance(operators, (Tuple, list)) else (operators,)
+    stats = GroupStats()
 
     def _group_and_pipe(source):
         def subscribe(observer, scheduler=None):
-            return source.pipe(
-                group_by(key_mapper),
-                flat_map(
-                    lambda grp: grp.pipe(*operators)
-                )).subscribe(
-                observer.on_next,
-                observer.on_error,
-                observer.on_completed,
-                scheduler)
+            # Least recently used first
+            groups: OrderedDict[Any, Tuple[Subject, Disposable, float]] = OrderedDict()
+            aio_loop = asyncio.get_event_loop()
+
+            def evict(key):
+                subject, disposable, _ = groups.pop(key)
+                # Let the pipe flush (eg. buffers), then release it
+                subject.on_completed()
+                disposable.dispose()
+
+                stats.active -= 1
+                stats.evicted += 1
+                if on_evict is not None:
+                    on_evict(key)
+
+            def on_next(item):
+                key = key_mapper(item)
+
+                if key in groups:
+                    subject, disposable, _ = groups[key]
+                    groups.move_to_end(key)
+                else:
+                    if max_groups is not None and len(groups) >= max_groups:
+                        evict(next(iter(groups)))
+
+                    subject = Subject()
+                    disposable = subject.pipe(*operators).subscribe(observer.on_next, observer.on_error,
+                                                                    scheduler=scheduler)
+                    stats.active += 1
+                    stats.created += 1
+
+                groups[key] = (subject, disposable, aio_loop.time())
+                subject.on_next(item)
+
+            def on_completed():
+                for subject, _, _ in list(groups.values()):
+                    subject.on_completed()
+                observer.on_completed()
+
+            @log_task_exception
+            async def evict_idle():
+                while True:
+                    await asyncio.sleep(idle_timeout / 2)
+                    deadline = aio_loop.time() - idle_timeout
+
+                    while groups:
+                        key = next(iter(groups))
+                        if groups[key][2] >= deadline:
+                            break
+
+                        evict(key)
+
+            def dispose():
+                if task is not None:
+                    task.cancel()
+
+                for _, disposable, _ in groups.values():
+                    disposable.dispose()
+                stats.active -= len(groups)
+                groups.clear()
+
+            task = aio_loop.create_task(evict_idle()) if idle_timeout else None
+            return CompositeDisposable(source.subscribe(on_next, observer.on_error, on_completed, scheduler=scheduler),
+                                       Disposable(dispose))
 
         return rx.create(subscribe)
 
+    _group_and_pipe.stats = stats
     return _group_and_pipe
 
 
 reverse_proxy = group_and_pipe
 
 
+def _item_value(item):
+    return getattr(item, 'value', item)
+
+
+def _item_timestamp(item):
+    return getattr(item, 'timestamp', None)
+
+
+def _with_value(item, value):
+    """ Copy of the item with the statistic as value (the statistic itself for items without value) """
+    if not hasattr(item, 'value'):
+        return value
+
+    item = copy.copy(item)
+    item.value = value
+    return item
+
+
+def _statistic(make_state, update, update_batch, value_mapper: Mapper = None, result_mapper=None):
+    """Operator of a rolling statistic, for single items and batches.
+
+    A list (or tuple) of items (eg. from `buffer_with_count`) is a batch: `update_batch` computes the
+    statistic at each position at once (vectorized), and a list of results is emitted. A NumPy array
+    is a batch of values, and an array of the statistics is emitted.
+    """
+    value_mapper = value_mapper or _item_value
+    result_mapper = result_mapper or _with_value
+
+    def _op(source):
+        def subscribe(observer, scheduler=None):
+            # Each subscription its own state
+            state = make_state()
+
+            def on_next(item):
+                if isinstance(item, np.ndarray):
+                    if len(item):
+                        observer.on_next(update_batch(state, item.astype(float, copy=False), None))
+                elif isinstance(item, (list, tuple)):
+                    if item:
+                        values = np.fromiter((value_mapper(i) for i in item), float, len(item))
+                        results = update_batch(state, values, item).tolist()
+                        # (`zip` is the rx operator here)
+                        observer.on_next([result_mapper(i, results[n]) for n, i in enumerate(item)])
+                else:
+                    observer.on_next(result_mapper(item, update(state, float(value_mapper(item)), item)))
+
+            return source.subscribe(on_next, observer.on_error, observer.on_completed, scheduler=scheduler)
+
+        return rx.create(subscribe)
+
+    return _op
+
+
+def rolling_mean(window: int, value_mapper: Mapper = None, result_mapper: Callable[[Any, float], Any] = None):
+    """Mean of the last `window` values, O(1) for each item.
+
+    All the rolling statistic operators emit a copy of the item with the statistic as `value` (the
+    statistic, for items without `value`), or `result_mapper(item, statistic)`. They also accept
+    batches: a list of items (eg. after `buffer_with_count`) is updated at once with vectorized math,
+    and emitted as a list; a NumPy array of values is emitted as an array of the statistics.
+
+    Examples:
+        ```python
+        speed.pipe(rolling_mean(10))
+        speed.pipe(buffer_with_count(256), rolling_mean(10))  # vectorized
+        ```
+
+    Args:
+        window: Values in the window (items, not seconds: see `Loop.history` for time windows).
+        value_mapper: Value of an item (default `item.value`, or the item itself).
+    """
+
+    def update(state, value, _):
+        state.push(value)
+        return state.mean
+
+    def update_batch(state, values, _):
+        return state.batch_mean_var(values)[0]
+
+    return _statistic(lambda: RollingWindow(window), update, update_batch, value_mapper, result_mapper)
+
+
+def rolling_var(window: int, value_mapper: Mapper = None, result_mapper: Callable[[Any, float], Any] = None):
+    """ Variance (population) of the last `window` values, O(1) for each item, as `rolling_mean` """
+
+    def update(state, value, _):
+        state.push(value)
+        return state.var
+
+    def update_batch(state, values, _):
+        return state.batch_mean_var(values)[1]
+
+    return _statistic(lambda: RollingWindow(window), update, update_batch, value_mapper, result_mapper)
+
+
+def rolling_std(window: int, value_mapper: Mapper = None, result_mapper: Callable[[Any, float], Any] = None):
+    """ Standard deviation of the last `window` values, as `rolling_var` """
+
+    def update(state, value, _):
+        state.push(value)
+        return math.sqrt(state.var)
+
+    def update_batch(state, values, _):
+        return np.sqrt(state.batch_mean_var(values)[1])
+
+    return _statistic(lambda: RollingWindow(window), update, update_batch, value_mapper, result_mapper)
+
+
+def ewma(alpha: float, value_mapper: Mapper = None, result_mapper: Callable[[Any, float], Any] = None):
+    """Exponentially weighted moving average (`alpha` the weight of the new value), as `rolling_mean`.
+
+    A batch is computed by the closed form of the average (cumulative sums), not item by item.
+    """
+    return _statistic(lambda: Ewma(alpha),
+                      lambda state, value, _: state.update(value),
+                      lambda state, values, _: state.update_batch(values),
+                      value_mapper, result_mapper)
+
+
+def rolling_quantile(window: int,
+                     q: float,
+                     value_mapper: Mapper = None,
+                     result_mapper: Callable[[Any, float], Any] = None):
+    """Quantile `q` (in [0, 1], eg. 0.95) of the last `window` values, as `rolling_mean`.
+
+    Not O(1): each item is a `np.quantile` of the window (a selection, without sorting), and a batch
+    one over the sliding windows of all its values.
+    """
+    if not 0 <= q <= 1:
+        raise ValueError(f"Quantile must be in [0, 1], given {q}")
+
+    def update(state, value, _):
+        state.push(value)
+        return state.quantile(q)
+
+    def update_batch(state, values, _):
+        return state.batch_quantile(values, q)
+
+    return _statistic(lambda: RollingWindow(window), update, update_batch, value_mapper, result_mapper)
+
+
+def zscore(window: int,
+           threshold: float | None = None,
+           value_mapper: Mapper = None,
+           result_mapper: Callable[[Any, float | bool], Any] = None):
+    """Z-score of each value against the previous `window` values (NaN with less than 2), as `rolling_mean`.
+
+    With a `threshold`, the anomaly flag (`abs(z) > threshold`) instead of the z-score.
+
+    Examples:
+        ```python
+        # Speed readings flagged as anomalies
+        speed.pipe(zscore(60, threshold=3), filter(lambda item: item.value))
+        ```
+    """
+
+    def score(values, means, variances, counts):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where((counts >= 2) & (variances > 0), (values - means) / np.sqrt(variances), math.nan)
+
+        return np.abs(z) > threshold if threshold is not None else z
+
+    def update(state, value, _):
+        count, mean, var = len(state), state.mean, state.var
+        state.push(value)
+
+        if count < 2 or not var:
+            return False if threshold is not None else math.nan
+
+        z = (value - mean) / math.sqrt(var)
+        return abs(z) > threshold if threshold is not None else z
+
+    def update_batch(state, values, _):
+        # Statistics before each value: the current ones, then the ones after each value but the last
+        count, mean, var = len(state), state.mean, state.var
+        means, variances = state.batch_mean_var(values)
+
+        means = np.concatenate(([mean], means[:-1]))
+        variances = np.concatenate(([var], variances[:-1]))
+        counts = np.minimum(np.arange(count, count + len(values)), window)
+        return score(values, means, variances, counts)
+
+    return _statistic(lambda: RollingWindow(window), update, update_batch, value_mapper, result_mapper)
+
+
+def rate_of_change(value_mapper: Mapper = None,
+                   timestamp_mapper: Mapper = None,
+                   result_mapper: Callable[[Any, float], Any] = None):
+    """Change per second from the previous value (NaN for the first), as `rolling_mean`.
+
+    Per item (ie. the difference) for items without timestamp and for NumPy arrays of values.
+
+    Args:
+        timestamp_mapper: Timestamp (seconds) of an item, default `item.timestamp`.
+    """
+    timestamp_mapper = timestamp_mapper or _item_timestamp
+
+    def update(state, value, item):
+        return state.update(value, timestamp_mapper(item))
+
+    def update_batch(state, values, items):
+        timestamps = None
+        if items is not None:
+            timestamps = [timestamp_mapper(item) for item in items]
+            timestamps = None if None in timestamps else np.asarray(timestamps, dtype=float)
+
+        return state.update_batch(values, timestamps)
+
+    return _statistic(RateOfChange, update, update_batch, value_mapper, result_mapper)
+
+
 def _gateway_dest_mapper(item: Message):
     return mape.app[item.dst]
 
 
 def gateway(dest_mapper: DestMapper = None):
-    dest_mapper = dest_mapper or _gateway_dest_mapper
+    """Send each item also to its destination(s).
+
+    By default the destination is `item.dst`, resolved by the routing table of the App (`mape.app.routes`,
+    see `mape.routing`), with a fallback to `mape.app[item.dst]` for paths not routed. A `dest_mapper`
+    (ie. dynamic routing) returns an observer or a list of them for each item.
+    """
 
     def _gateway(source):
         def subscribe(observer, scheduler=None):
             from collections.abc import Iterable
 
-            def on_next(item):
-                dests = dest_mapper(item)
-                if not isinstance(dests, Iterable):
-                    # Convert dest in a tuple
-                    dests = (dests,)
+            if dest_mapper is None:
+                resolve = mape.app.routes.resolve
 
-                for dest in dests:
-                    dest.on_next(item)
-                observer.on_next(item)
+                def on_next(item):
+                    dests = resolve(item.dst)
+                    if dests is None:
+                        dests = (_gateway_dest_mapper(item),)
+
+                    for dest in dests:
+                        dest.on_next(item)
+                    observer.on_next(item)
+            else:
+                def on_next(item):
+                    dests = dest_mapper(item)
+                    if not isinstance(dests, Iterable):
+                        # Convert dest in a tuple
+                        dests = (dests,)
+
+                    for dest in dests:
+                        dest.on_next(item)
+                    observer.on_next(item)
 
             def on_error(error):
                 observer.on_error(error)
@@ -97,3 +442,58 @@ def gateway(dest_mapper: DestMapper = None):
 
 router = gateway
 
+
+def _resolve_dest(dest) -> Tuple:
+    if not isinstance(dest, str):
+        return dest,
+
+    return mape.app.routes.resolve(dest) or (mape.app[dest],)
+
+
+def content_router(rules: ContentRouter | Iterable[Rule], default=None, first_match: bool = False):
+    """Send each item also to the destinations of the matching rules (see `mape.routing.ContentRouter`).
+
+    The rules are compiled into indexes (hash for equality, sorted intervals for ranges), so matching
+    doesn't evaluate each predicate. Swap the rules at runtime with `.router.update(rules)`, the match
+    counters are in `.router.stats`.
+
+    Examples:
+        ```python
+        from mape.routing import Rule, Range
+
+        dispatch = content_router([
+            Rule('north.exec', region='north'),
+            Rule('fleet.trucks', vehicle={'truck', 'van'}, value=Range(90)),
+        ], default='fleet.log')
+        plan.pipe(dispatch).subscribe()
+
+        dispatch.router.update(new_rules)
+        ```
+
+    Args:
+        rules: List of `Rule` or a `ContentRouter` (eg. shared by more operators).
+        default: Destination of the items not matched.
+        first_match: Only the first matching rule (ignored for a `ContentRouter`).
+    """
+    content = rules if isinstance(rules, ContentRouter) else ContentRouter(rules, first_match)
+
+    def _content_router(source):
+        def subscribe(observer, scheduler=None):
+            def on_next(item):
+                dests = [dest for rule in content.match(item) for dest in rule.dest]
+                if not dests and default is not None:
+                    dests = [default]
+
+                # Each destination once (ie. more rules matching)
+                for dest in dict.fromkeys(dests):
+                    for target in _resolve_dest(dest):
+                        target.on_next(item)
+                observer.on_next(item)
+
+            return source.subscribe(on_next, observer.on_error, observer.on_completed, scheduler=scheduler)
+
+        return rx.create(subscribe)
+
+    _content_router.router = content
+    return _content_router
+
@@ -1,2 +1,4 @@
 """One important point of PyMAPE is the capability of decentralize (functionalities and data) and distribute loops on more devices. These features are reached by the remote package.
-"""
\ No newline at end of file
+"""
+# Compact Message format, decoded by the Pickled codec (ie. registered on import)
+from . import wire
@@ -1,81 +1,383 @@
 from __future__ import annotations
 
 import json
+import zlib
 import pickle
-from typing import Type, Any, List
+import struct
+from functools import partial
+from typing import Type, Any, List, Dict, Tuple, Callable, NamedTuple
 
 from purse.collections import T
 from pydantic import BaseModel
 
+# Optional fast codecs
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Optional fast compressors
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
 
 class Pickled:
+    """ Pickle serialized, buffers of large objects (eg. NumPy arrays) are framed out-of-band (zero copy) """
     pass
 
 
-def obj_from_raw(value_type: Type[T], raw_item: str | bytes) -> T | Any:
-    if issubclass(value_type, BaseModel):
-        return value_type.parse_raw(raw_item)
-    elif issubclass(value_type, Pickled):
-        return pickle.loads(raw_item)
-    elif issubclass(value_type, dict):
-        return json.loads(raw_item)
-    elif issubclass(value_type, str):
-        if isinstance(raw_item, bytes):
-            return raw_item.decode()
-        else:
-            return raw_item
-    else:
-        if isinstance(raw_item, str):
-            return raw_item.encode()
-        else:
-            return raw_item
+class MsgPacked:
+    """ As Pickled, but serialized by msgpack (must be installed on each node) """
+    pass
 
 
-def list_from_raw(value_type: Type[T], raw_list: List[Any]) -> List[T]:
-    obj_list: List[T] = []
-    if issubclass(value_type, BaseModel):
-        for raw_item in raw_list:
-            obj: Any = value_type.parse_raw(raw_item)
-            obj_list.append(obj)
-        return obj_list
-    elif issubclass(value_type, Pickled):
-        for raw_item in raw_list:
-            obj: Any = pickle.loads(raw_item)
-            obj_list.append(obj)
-    elif issubclass(value_type, dict):
-        for raw_item in raw_list:
-            obj = json.loads(raw_item)
-            obj_list.append(obj)
-        return obj_list
-    elif issubclass(value_type, str):
-        for raw_item in raw_list:
-            if isinstance(raw_item, bytes):
-                obj = raw_item.decode()
-                obj_list.append(obj)
-            else:
-                obj_list.append(raw_item)
-        return obj_list
-    else:
-        for raw_item in raw_list:
-            if isinstance(raw_item, str):
-                obj = raw_item.encode()
-                obj_list.append(obj)
-            else:
-                obj_list.append(raw_item)
-        return obj_list
+class Codec(NamedTuple):
+    encode: Callable[[Any], str | bytes]
+    decode: Callable[[str | bytes], Any]
+    # Payloads compressed (see set_compression()), only serialized formats: raw str/bytes values are kept as is
+    compressed: bool = False
 
 
-def obj_to_raw(value_type: Type[T], value: T) -> str | bytes:
-    if isinstance(value, BaseModel) and isinstance(value, value_type):
-        assert isinstance(value, BaseModel)
-        return value.json()
-    elif value_type is Pickled:
-        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
-    elif isinstance(value, dict):
-        return json.dumps(value)
+CodecFactory = Callable[[Type[T]], Codec]
+
+
+def _generic_encode(value: Any) -> str | bytes:
+    if isinstance(value, dict):
+        return _json_dumps(value)
     elif isinstance(value, (str, bytes)):
         return value
     else:
+        raise ValueError(f"Incorrect type. Given Value type {type(value)}")
+
+
+if orjson:
+    def _json_dumps(value: dict) -> str:
+        try:
+            # str as json.dumps (ie. callers writing it as text)
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+        except (orjson.JSONEncodeError, TypeError):
+            # Not supported by orjson (eg. big int), stdlib output is compatible
+            return json.dumps(value)
+
+    _json_loads = orjson.loads
+else:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+
+def _to_str(raw_item: str | bytes) -> str:
+    return raw_item.decode() if isinstance(raw_item, bytes) else raw_item
+
+
+def _to_bytes(raw_item: str | bytes) -> bytes:
+    return raw_item.encode() if isinstance(raw_item, str) else raw_item
+
+
+# Out-of-band frame (pickle protocol 5): | magic (4 bytes) | count (u32) | count * length (u64) | buffers | pickle |
+# Buffers are padded to 8 bytes (ie. aligned arrays). The magic can't be the start of a pickle (ie. opcode PROTO)
+_OOB_MAGIC = b'\x00PB5'
+_oob_header = struct.Struct('<4sI')
+_oob_length = struct.Struct('<Q')
+_OOB_ALIGN = 8
+
+
+def _pickle_dumps(value: Any) -> bytes:
+    buffers: List[pickle.PickleBuffer] = []
+    data = pickle.dumps(value, 5, buffer_callback=buffers.append)
+
+    if not buffers:
+        return data
+
+    views = [buffer.raw() for buffer in buffers]
+    chunks = [_oob_header.pack(_OOB_MAGIC, len(views))]
+    chunks.extend(_oob_length.pack(view.nbytes) for view in views)
+
+    for view in views:
+        chunks.append(view)
+        chunks.append(b'\x00' * (-view.nbytes % _OOB_ALIGN))
+
+    chunks.append(data)
+    # The only copy of the buffers
+    return b''.join(chunks)
+
+
+def _oob_loads(raw_item: bytes | memoryview) -> Any:
+    raw_view = memoryview(raw_item)
+    # Buffers are memoryview of the payload: an immutable one (eg. bytes) is copied once, so the
+    # NumPy arrays are writable as with in-band pickle (zero copy for a bytearray)
+    if raw_view.readonly:
+        raw_view = memoryview(bytearray(raw_view))
+    _, count = _oob_header.unpack_from(raw_view)
+    pos = _oob_header.size + count * _oob_length.size
+    buffers = []
+
+    for i in range(count):
+        length, = _oob_length.unpack_from(raw_view, _oob_header.size + i * _oob_length.size)
+        buffers.append(raw_view[pos:pos + length])
+        pos += length + (-length % _OOB_ALIGN)
+
+    return pickle.loads(raw_view[pos:], buffers=buffers)
+
+
+# Frame magic => decoder, of Pickled payloads (see register_frame())
+_frames: Dict[bytes, Callable[[bytes | memoryview], Any]] = {_OOB_MAGIC: _oob_loads}
+
+
+def register_frame(magic: bytes, decode: Callable[[bytes | memoryview], Any]) -> None:
+    """Decode by `decode` the Pickled payloads starting with `magic`, allowing alternative wire formats
+    to be received transparently.
+
+    Args:
+        magic: 4 bytes, starting with `b'\\x00'` (ie. can't be the start of a pickle).
+        decode: Function called with the whole payload.
+    """
+    if len(magic) != 4 or magic[:1] != b'\x00':
+        raise ValueError(f"Frame magic must be 4 bytes starting with b'\\x00', given {magic!r}")
+
+    _frames[magic] = decode
+
+
+def _pickle_loads(raw_item: bytes | memoryview) -> Any:
+    if raw_item[:1] != b'\x00':
+        return pickle.loads(raw_item)
+
+    if (decode := _frames.get(bytes(raw_item[:4]))) is None:
+        raise ValueError(f"Unknown frame {bytes(raw_item[:4])!r} (not registered by register_frame())")
+
+    return decode(raw_item)
+
+
+def _base_model_codec(value_type: Type[BaseModel]) -> Codec:
+    def encode(value):
+        if isinstance(value, value_type):
+            return value.json()
+        return _generic_encode(value)
+
+    return Codec(encode, value_type.parse_raw, True)
+
+
+def _msgpack_codec(value_type: Type[MsgPacked]) -> Codec:
+    if msgpack is None:
+        raise ImportError("MsgPacked value type needs msgpack installed (ie. pip install msgpack)")
+
+    return Codec(msgpack.packb, msgpack.unpackb, True)
+
+
+# Base type => codec factory, resolved walking the MRO of value_type (see get_codec())
+_codec_factories: Dict[type, CodecFactory] = {
+    BaseModel: _base_model_codec,
+    Pickled: lambda value_type: Codec(_pickle_dumps, _pickle_loads, True),
+    MsgPacked: _msgpack_codec,
+    dict: lambda value_type: Codec(_generic_encode, _json_loads, True),
+    str: lambda value_type: Codec(_generic_encode, _to_str),
+    object: lambda value_type: Codec(_generic_encode, _to_bytes)
+}
+
+# value_type => resolved codec
+_codecs: Dict[type, Codec] = dict()
+
+
+def register_codec(base_type: type, factory: CodecFactory | Codec) -> None:
+    """Use a custom codec for `base_type` (and its subclasses) value types.
+
+    Args:
+        base_type: Value type (eg. the `value_type` of Knowledge collections).
+        factory: `Codec(encode, decode)` or a function returning it given the value_type.
+    """
+    _codec_factories[base_type] = (lambda value_type: factory) if isinstance(factory, Codec) else factory
+    _codecs.clear()
+
+
+def get_codec(value_type: Type[T]) -> Codec:
+    """ Resolved once per value_type, then cached (until `register_codec()`) """
+    try:
+        return _codecs[value_type]
+    except KeyError:
+        base_type = next(base for base in value_type.__mro__ if base in _codec_factories)
+        codec = _codecs[value_type] = _codec_factories[base_type](value_type)
+        return codec
+
+
+def encoder(value_type: Type[T]) -> Callable[[Any], str | bytes]:
+    """ Encode function of `value_type`, resolving the codec on each call (ie. following `register_codec()`) """
+    return lambda value: get_codec(value_type).encode(value)
+
+
+def decoder(value_type: Type[T]) -> Callable[[str | bytes], Any]:
+    """ Decode function of `value_type`, resolving the codec on each call (ie. following `register_codec()`) """
+    return lambda raw_item: get_codec(value_type).decode(raw_item)
+
+
+""" Compression """
+
+# Compression frame: | MAGIC (3 bytes) | algorithm id (1 byte) | compressed payload |
+_COMPRESSED_MAGIC = b'\x00CP'
+# Not compressed payload starting with the MAGIC (ie. escaped, not to be taken for a frame)
+_STORED_MAGIC = _COMPRESSED_MAGIC + b'0'
+
+
+class Compressor(NamedTuple):
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes | memoryview], bytes]
+
+
+def _zlib_compressor(level: int | None) -> Compressor:
+    return Compressor(partial(zlib.compress, level=1 if level is None else level), zlib.decompress)
+
+
+def _zstd_compressor(level: int | None) -> Compressor:
+    if zstandard is None:
+        raise ImportError("zstd compression needs zstandard installed (ie. pip install zstandard)")
+
+    compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+    decompressor = zstandard.ZstdDecompressor()
+    # Frame content size is always written by compress()
+    return Compressor(compressor.compress, decompressor.decompress)
+
+
+def _lz4_compressor(level: int | None) -> Compressor:
+    if lz4_frame is None:
+        raise ImportError("lz4 compression needs lz4 installed (ie. pip install lz4)")
+
+    return Compressor(partial(lz4_frame.compress, compression_level=level or 0), lz4_frame.decompress)
+
+
+# Algorithm name => (id, compressor factory)
+_compressor_factories: Dict[str, Tuple[bytes, Callable[[int | None], Compressor]]] = {
+    'zlib': (b'z', _zlib_compressor),
+    'zstd': (b's', _zstd_compressor),
+    'lz4': (b'4', _lz4_compressor)
+}
+
+# Algorithm id => compressor (ie. receivers decompress each known algorithm)
+_compressors: Dict[bytes, Compressor] = {b'z': _zlib_compressor(None)}
+
+# Disabled by default
+_compress_threshold: int | None = None
+_compress_magic: bytes = _COMPRESSED_MAGIC + b'z'
+_compress: Callable[[bytes], bytes] = _compressors[b'z'].compress
+
+
+def _default_algorithm() -> str:
+    if zstandard is not None:
+        return 'zstd'
+    elif lz4_frame is not None:
+        return 'lz4'
+
+    return 'zlib'
+
+
+def set_compression(threshold: int | None = 4096, algorithm: str | None = None, level: int | None = None) -> None:
+    """Transparent compression of the payloads bigger than `threshold` bytes (remote streams and Knowledge values).
+
+    Receivers detect compressed payloads by their frame header, so each node can have its own settings.
+
+    Args:
+        threshold: Minimum payload size (bytes) to compress, `None` disables the compression.
+        algorithm: `zstd`, `lz4` or `zlib` (default the fastest installed).
+        level: Compression level of the algorithm (default fast levels).
+    """
+    global _compress_threshold, _compress_magic, _compress
+
+    algorithm = algorithm or _default_algorithm()
+
+    try:
+        algorithm_id, factory = _compressor_factories[algorithm]
+    except KeyError:
+        raise ValueError(f"Unknown compression algorithm '{algorithm}' (available {list(_compressor_factories)})")
+
+    compressor = _compressors[algorithm_id] = factory(level)
+
+    _compress_threshold = threshold
+    _compress_magic = _COMPRESSED_MAGIC + algorithm_id
+    _compress = compressor.compress
+
+
+def _stored(raw_item: str | bytes) -> str | bytes:
+    # Escape a payload that `decompress()` would take for a frame
+    return _STORED_MAGIC + raw_item if isinstance(raw_item, bytes) and raw_item[:3] == _COMPRESSED_MAGIC else raw_item
+
+
+def compress(raw_item: str | bytes) -> str | bytes:
+    """ Compress (and frame) `raw_item` if bigger than the threshold (see `set_compression()`) """
+    if _compress_threshold is None or len(raw_item) < _compress_threshold:
+        return _stored(raw_item)
+
+    if isinstance(raw_item, str):
+        raw_item = raw_item.encode()
+
+    compressed = _compress_magic + _compress(raw_item)
+    # Not compressible (eg. already compressed image)
+    return compressed if len(compressed) < len(raw_item) else _stored(raw_item)
+
+
+def _compressor(algorithm_id: bytes) -> Compressor:
+    try:
+        return _compressors[algorithm_id]
+    except KeyError:
+        for factory_id, factory in _compressor_factories.values():
+            if factory_id == algorithm_id:
+                compressor = _compressors[algorithm_id] = factory(None)
+                return compressor
+
+        raise ValueError(f"Unknown compression algorithm id {algorithm_id!r}")
+
+
+def decompress(raw_item: str | bytes | memoryview) -> str | bytes | memoryview:
+    """ Payload uncompressed, if compressed by `compress()` (any algorithm), else `raw_item` as is """
+    if raw_item[:3] != _COMPRESSED_MAGIC:
+        return raw_item
+
+    if raw_item[3:4] == _STORED_MAGIC[3:]:
+        return raw_item[4:]
+
+    return _compressor(bytes(raw_item[3:4])).decompress(memoryview(raw_item)[4:])
+
+
+def _compressed_pickle_loads(raw_item: bytes | memoryview) -> Any:
+    return _pickle_loads(decompress(raw_item))
+
+
+for _algorithm_id, _ in _compressor_factories.values():
+    register_frame(_COMPRESSED_MAGIC + _algorithm_id, _compressed_pickle_loads)
+
+
+""" Raw <=> object """
+
+
+def obj_from_raw(value_type: Type[T], raw_item: str | bytes) -> T | Any:
+    codec = get_codec(value_type)
+    return codec.decode(decompress(raw_item) if codec.compressed else raw_item)
+
+
+def list_from_raw(value_type: Type[T], raw_list: List[Any]) -> List[T]:
+    codec = get_codec(value_type)
+
+    if not codec.compressed:
+        return [codec.decode(raw_item) for raw_item in raw_list]
+
+    return [codec.decode(decompress(raw_item)) for raw_item in raw_list]
+
+
+def obj_to_raw(value_type: Type[T], value: T) -> str | bytes:
+    codec = get_codec(value_type)
+
+    try:
+        raw_item = codec.encode(value)
+        return compress(raw_item) if codec.compressed else raw_item
+    except ValueError:
         raise ValueError(
             f"Incorrect type. Expected type: {value_type} "
             f"while give Value type {type(value)}")
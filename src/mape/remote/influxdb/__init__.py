@@ -1,9 +1,9 @@
-from .rx_utils import (
-    InfluxObserver,
-    SYNCHRONOUS,
-    ASYNCHRONOUS,
-    Point
-)
+from influxdb_client import Point
+from influxdb_client.client.write_api import SYNCHRONOUS, ASYNCHRONOUS
+
+from .rx_utils import InfluxObserver
+from .writer import InfluxWriter, get_writer, set_writer
+from .downsample import downsample, Downsampled
 
 _config = {}
 
@@ -11,9 +11,5 @@ _config = {}
 def set_config(config: dict):
     global _config
     _config = config
-
-
-
-
-
-
+    # Recreated (lazily) from the new config
+    set_writer(None)
@@ -0,0 +1,262 @@
+"""Streaming downsampling of the points, before `InfluxObserver` (ie. a point per window instead of each item).
+
+Each numeric field is aggregated (min, max, mean, count, last) for each tag set, over tumbling
+(`every == window`) or sliding (`every < window`) windows. A window is split in `window / every`
+panes, and the state is kept in arrays (a row for each tag set and field, a column for each pane):
+emitting a window is a vectorized reduction of the panes, and only the oldest pane is reset.
+"""
+from __future__ import annotations
+
+import math
+import time
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import rx
+from rx.disposable import CompositeDisposable, Disposable
+
+from mape.utils import log_task_exception
+
+AGGREGATES = ('min', 'max', 'mean', 'count', 'last')
+
+# Attributes never used as tags (as `InfluxObserver`)
+_NOT_TAGS = ('value', 'timestamp')
+
+
+class Downsampled:
+    """Aggregates of a window (tags as attributes, as the item ones), written by `InfluxObserver`.
+
+    Fields are named `<field>_<aggregate>`, eg. `value_mean`.
+    """
+
+    def __init__(self, measurement: str, tags: Dict[str, Any], fields: Dict[str, float], timestamp: float) -> None:
+        self.__dict__.update(tags)
+        self.measurement = measurement
+        self.fields = fields
+        self.timestamp = timestamp
+
+    @property
+    def tag_keys(self) -> Tuple[str, ...]:
+        return tuple(key for key in self.__dict__ if key not in ('measurement', 'fields', 'timestamp'))
+
+    def fields_mapper(self) -> List[Tuple[str, float]]:
+        return list(self.fields.items())
+
+    def __repr__(self):
+        tags = {key: self.__dict__[key] for key in self.tag_keys}
+        return f"{self.__class__.__name__}({self.measurement}, {tags}, {self.fields}, {self.timestamp})"
+
+
+def _item_fields(item) -> Iterable[Tuple[str, Any]]:
+    # Default fields of InfluxObserver (imported late, circular import)
+    from .rx_utils import _fields_mapper
+    return (_fields_mapper(item),)
+
+
+class WindowState:
+    """Panes of the aggregates, a row for each (tags, field) series.
+
+    Args:
+        panes: Panes in a window (1 for tumbling windows).
+        capacity: Initial rows (doubled when full).
+    """
+
+    def __init__(self, panes: int = 1, capacity: int = 64) -> None:
+        self._panes = panes
+        self._pane = 0
+        self._rows: Dict[Tuple, int] = dict()
+        self._series: List[Tuple | None] = []
+        self._free: List[int] = []
+
+        self._min = np.full((capacity, panes), np.inf)
+        self._max = np.full((capacity, panes), -np.inf)
+        self._sum = np.zeros((capacity, panes))
+        self._count = np.zeros((capacity, panes), dtype=np.int64)
+        self._last = np.zeros(capacity)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def series(self) -> Iterable[Tuple]:
+        return self._rows.keys()
+
+    def _row(self, series: Tuple) -> int:
+        try:
+            return self._rows[series]
+        except KeyError:
+            pass
+
+        if self._free:
+            row = self._free.pop()
+            self._series[row] = series
+        else:
+            row = len(self._series)
+            self._series.append(series)
+
+            if row >= len(self._last):
+                self._grow()
+
+        self._rows[series] = row
+        return row
+
+    def _grow(self) -> None:
+        capacity = len(self._last)
+
+        self._min = np.concatenate((self._min, np.full((capacity, self._panes), np.inf)))
+        self._max = np.concatenate((self._max, np.full((capacity, self._panes), -np.inf)))
+        self._sum = np.concatenate((self._sum, np.zeros((capacity, self._panes))))
+        self._count = np.concatenate((self._count, np.zeros((capacity, self._panes), dtype=np.int64)))
+        self._last = np.concatenate((self._last, np.zeros(capacity)))
+
+    def add(self, series: Tuple, value: float) -> None:
+        row, pane = self._row(series), self._pane
+
+        if value < self._min[row, pane]:
+            self._min[row, pane] = value
+        if value > self._max[row, pane]:
+            self._max[row, pane] = value
+        self._sum[row, pane] += value
+        self._count[row, pane] += 1
+        self._last[row] = value
+
+    def rotate(self) -> Dict[Tuple, Dict[str, float]]:
+        """ Aggregates of the window (series with items only), then start a new pane """
+        used = len(self._series)
+        count = self._count[:used].sum(axis=1)
+        active = np.flatnonzero(count)
+
+        aggregates = {}
+        if len(active):
+            minimum = self._min[active].min(axis=1)
+            maximum = self._max[active].max(axis=1)
+            mean = self._sum[active].sum(axis=1) / count[active]
+
+            for i, row in enumerate(active.tolist()):
+                aggregates[self._series[row]] = {
+                    'min': float(minimum[i]), 'max': float(maximum[i]), 'mean': float(mean[i]),
+                    'count': int(count[row]), 'last': float(self._last[row])
+                }
+
+        # Series idle for the whole window are released (ie. memory bounded by the active ones)
+        for row in np.flatnonzero(count[:used] == 0).tolist():
+            if (series := self._series[row]) is not None:
+                del self._rows[series]
+                self._series[row] = None
+                self._free.append(row)
+
+        self._pane = (self._pane + 1) % self._panes
+        self._min[:, self._pane] = np.inf
+        self._max[:, self._pane] = -np.inf
+        self._sum[:, self._pane] = 0
+        self._count[:, self._pane] = 0
+
+        return aggregates
+
+
+def downsample(window: float,
+               every: float | None = None,
+               tags: Iterable[str] | None = None,
+               fields_mapper: Callable | None = None,
+               aggregates: Iterable[str] = AGGREGATES,
+               measurement: str | None = None):
+    """Aggregate the items over windows, for each tag set, emitting `Downsampled` items.
+
+    Examples:
+        ```python
+        # A point each 10 seconds for each car, instead of each speed reading
+        detect.pipe(downsample(10, tags=('src',))).subscribe(InfluxObserver(measurement="car"))
+        ```
+
+    Args:
+        window: Window length (seconds).
+        every: Seconds between windows (default `window`, ie. tumbling), `window` must be a multiple.
+        tags: Attribute names of the tags (default all but value and timestamp, as `InfluxObserver`).
+        fields_mapper: As `InfluxObserver`, not numeric fields are ignored.
+        aggregates: Computed among `min`, `max`, `mean`, `count`, `last`.
+        measurement: Of the `Downsampled` items (default the item type name).
+    """
+    every = every or window
+    panes = round(window / every)
+    if panes < 1 or not math.isclose(panes * every, window):
+        raise ValueError(f"Window ({window}s) must be a multiple of every ({every}s)")
+
+    aggregates = tuple(aggregates)
+    if unknown := set(aggregates) - set(AGGREGATES):
+        raise ValueError(f"Unknown aggregates {unknown}, available {AGGREGATES}")
+
+    fields_mapper = fields_mapper or _item_fields
+    tags = tuple(tags) if tags is not None else None
+
+    def _downsample(source):
+        def subscribe(observer, scheduler=None):
+            state = WindowState(panes)
+            # Tags and measurement of the series keys
+            series_tags: Dict[Tuple, Tuple[str, Dict[str, Any]]] = dict()
+            loop = asyncio.get_event_loop()
+
+            def series_key(item) -> Tuple:
+                attributes = item.__dict__ if hasattr(item, '__dict__') else {}
+                keys = tags if tags is not None else [key for key in attributes if key not in _NOT_TAGS]
+                item_tags = tuple((key, attributes.get(key)) for key in keys)
+
+                key = (measurement or type(item).__name__, item_tags)
+                if key not in series_tags:
+                    series_tags[key] = (key[0], dict(item_tags))
+
+                return key
+
+            def on_next(item):
+                fields = fields_mapper(item)
+                if fields and not isinstance(fields[0], (Tuple, List)):
+                    fields = (fields,)
+
+                key = series_key(item)
+                for field, value in fields:
+                    # Numeric only (bool as 0/1)
+                    if isinstance(value, (int, float)) or (hasattr(value, 'dtype') and value.dtype.kind in 'biuf'):
+                        state.add((key, field), float(value))
+
+            def emit():
+                timestamp = time.time()
+                windows: Dict[Tuple, Dict[str, float]] = dict()
+
+                for (key, field), values in state.rotate().items():
+                    fields = windows.setdefault(key, dict())
+                    for aggregate in aggregates:
+                        fields[f"{field}_{aggregate}"] = values[aggregate]
+
+                for key, fields in windows.items():
+                    name, item_tags = series_tags[key]
+                    observer.on_next(Downsampled(name, item_tags, fields, timestamp))
+
+                # Tag sets of the released series
+                live = {key for key, _ in state.series()}
+                for key in [key for key in series_tags if key not in live]:
+                    del series_tags[key]
+
+            @log_task_exception
+            async def timer():
+                deadline = loop.time()
+                while True:
+                    # Not drifting with the emit time
+                    deadline += every
+                    await asyncio.sleep(max(deadline - loop.time(), 0))
+                    emit()
+
+            def on_completed():
+                task.cancel()
+                emit()
+                observer.on_completed()
+
+            def on_error(error):
+                task.cancel()
+                observer.on_error(error)
+
+            task = loop.create_task(timer())
+            return CompositeDisposable(source.subscribe(on_next, on_error, on_completed, scheduler=scheduler),
+                                       Disposable(task.cancel))
+
+        return rx.create(subscribe)
+
+    return _downsample
@@ -0,0 +1,181 @@
+"""Line protocol encoder compiled for a measurement and an item type (ie. without building `Point`s).
+
+Produces the same lines of `influxdb_client.Point.to_line_protocol()`: tags and fields sorted by key,
+`None` values skipped, integers with the `i` suffix and whole floats without the trailing `.0`.
+Measurement, tag keys and constant tags are escaped once, and the escaped tags are cached by
+their values (they are usually few and stable, eg. element paths).
+"""
+from __future__ import annotations
+
+import math
+import time
+from operator import attrgetter
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from influxdb_client.client.write.point import _ESCAPE_MEASUREMENT, _ESCAPE_KEY, _ESCAPE_STRING
+
+# Max cached escaped tag values (by encoder), cleared when exceeded
+MAX_CACHED_TAG_VALUES = 4096
+
+# Attributes never used as tags
+_NOT_TAGS = ('value', 'timestamp')
+
+# Nanoseconds in a unit of the write precision
+_PRECISION_NS = {'ns': 1, 'us': 10**3, 'ms': 10**6, 's': 10**9}
+
+
+def escape_tag_value(value: Any) -> str:
+    escaped = str(value).translate(_ESCAPE_KEY)
+    # A trailing backslash would escape the separator
+    return escaped + ' ' if escaped.endswith('\\') else escaped
+
+
+def format_field(key: str, value: Any) -> str | None:
+    """ `key=value` of a field (with escaped key), `None` if the value is skipped """
+    value_type = type(value)
+
+    if value_type is float or value_type is Decimal:
+        if not math.isfinite(value):
+            return None
+
+        formatted = str(value)
+        return f"{key}={formatted[:-2] if formatted.endswith('.0') else formatted}"
+    elif value_type is int:
+        return f"{key}={value}i"
+    elif value_type is bool:
+        return f"{key}={'true' if value else 'false'}"
+    elif value_type is str:
+        return f'{key}="{value.translate(_ESCAPE_STRING)}"'
+    elif value is None:
+        return None
+
+    # Subclasses and numpy scalars
+    if isinstance(value, bool):
+        return f"{key}={'true' if value else 'false'}"
+    elif isinstance(value, int) or (hasattr(value, 'dtype') and value.dtype.kind in 'iu'):
+        return f"{key}={int(value)}i"
+    elif isinstance(value, (float, Decimal)) or (hasattr(value, 'dtype') and value.dtype.kind == 'f'):
+        return format_field(key, float(value))
+    elif isinstance(value, str):
+        return format_field(key, str(value))
+
+    raise ValueError(f'Type: "{type(value)}" of field: "{key}" is not supported.')
+
+
+class LineEncoder:
+    """Encoder of the items of a type into lines (`str`, without the trailing newline).
+
+    Args:
+        measurement: The name of the measurement.
+        fields_mapper: Function that return a field `(key, value)`, or a `Tuple` or `List` of them, given an item.
+        tags: Constant `(key, value)` tags.
+        tag_attributes: Attribute names read from each item as tags (`None` values are skipped).
+        precision: Append the timestamp (`item.timestamp` in seconds, or the current time) with the precision
+            (`ns`, `us`, `ms` or `s`), instead of the write time set by the server.
+    """
+
+    def __init__(self,
+                 measurement: str,
+                 fields_mapper: Callable[[Any], Tuple | Iterable[Tuple]],
+                 tags: Iterable[Tuple[str, Any]] = (),
+                 tag_attributes: Iterable[str] = (),
+                 precision: str | None = None) -> None:
+        self._fields_mapper = fields_mapper
+        self._precision_ns = _PRECISION_NS[precision] if precision else None
+        self._measurement = measurement.translate(_ESCAPE_MEASUREMENT)
+
+        tags = {key: value for key, value in tags if value is not None}
+        self._tag_attributes = tuple(sorted(key for key in tag_attributes if key not in tags))
+
+        # Constant tags merged with the attributes ones, in key order (ie. as `Point`)
+        self._tag_keys: Dict[str, str] = {key: str(key).translate(_ESCAPE_KEY)
+                                          for key in sorted((*tags, *self._tag_attributes))}
+        self._static_tags = {key: escape_tag_value(value) for key, value in tags.items()}
+        self._prefix = self._measurement + ''.join(f",{self._tag_keys[key]}={value}"
+                                                   for key, value in sorted(self._static_tags.items()) if value)
+
+        self._tag_values: Dict[Any, str] = dict()
+        self._heads: Dict[Tuple, str] = dict()
+        # Always a tuple (ie. also for a single attribute)
+        self._get_tag_values = attrgetter(*self._tag_attributes, *self._tag_attributes[:1]) \
+            if self._tag_attributes else None
+        self._field_keys: Dict[str, str] = dict()
+
+    def _tag_value(self, value: Any) -> str:
+        try:
+            return self._tag_values[value]
+        except KeyError:
+            if len(self._tag_values) >= MAX_CACHED_TAG_VALUES:
+                self._tag_values.clear()
+
+            escaped = self._tag_values[value] = escape_tag_value(value)
+            return escaped
+        except TypeError:
+            # Not hashable
+            return escape_tag_value(value)
+
+    def _field_key(self, key: str) -> str:
+        try:
+            return self._field_keys[key]
+        except KeyError:
+            escaped = self._field_keys[key] = str(key).translate(_ESCAPE_KEY)
+            return escaped
+
+    def _build_head(self, item: Any) -> str:
+        # Attributes interleaved with the constant tags
+        tags = []
+        for key, escaped_key in self._tag_keys.items():
+            if key in self._static_tags:
+                escaped = self._static_tags[key]
+            elif (value := getattr(item, key, None)) is not None:
+                escaped = self._tag_value(value)
+            else:
+                continue
+
+            if escaped:
+                tags.append(f",{escaped_key}={escaped}")
+
+        return self._measurement + ''.join(tags)
+
+    def _head(self, item: Any) -> str:
+        """ Measurement and tags, cached by the tuple of the tag attribute values """
+        try:
+            values = self._get_tag_values(item)
+            return self._heads[values]
+        except KeyError:
+            if len(self._heads) >= MAX_CACHED_TAG_VALUES:
+                self._heads.clear()
+
+            head = self._heads[values] = self._build_head(item)
+            return head
+        except (AttributeError, TypeError):
+            # Missing attribute or not hashable value
+            return self._build_head(item)
+
+    def encode(self, item: Any) -> str:
+        """ The line of `item`, empty if it has no fields """
+        fields = self._fields_mapper(item)
+
+        if not isinstance(fields[0], (tuple, list)):
+            formatted = format_field(self._field_key(fields[0]), fields[1])
+        else:
+            formatted = ','.join(field for key, value in sorted(fields, key=lambda kv: kv[0])
+                                 if (field := format_field(self._field_key(key), value)) is not None)
+
+        if not formatted:
+            return ''
+
+        head = self._head(item) if self._tag_attributes else self._prefix
+
+        if self._precision_ns is None:
+            return f"{head} {formatted}"
+
+        timestamp = getattr(item, 'timestamp', None)
+        timestamp = int(timestamp * 1e9) if isinstance(timestamp, (int, float)) else time.time_ns()
+        return f"{head} {formatted} {timestamp // self._precision_ns}"
+
+
+def attributes_tags(item: Any) -> Tuple[str, ...]:
+    """ Attributes used as tags for an item without explicit tags (ie. all but value and timestamp) """
+    return tuple(key for key in getattr(item, '__dict__', ()) if key not in _NOT_TAGS)
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import warnings
 from typing import Callable, Dict, Any, Mapping, Tuple, List, Iterable
 
 from rx.core import Observer
-from influxdb_client import InfluxDBClient, Point, WriteOptions
-from influxdb_client.client.write_api import SYNCHRONOUS, ASYNCHRONOUS
+from rx.subject import Subject
+from influxdb_client import InfluxDBClient, WriteOptions
+from influxdb_client.client.write_api import WriteType
 
-from mape.typing import Message
+from mape.utils import task_exception
+
+from .writer import InfluxWriter, get_writer
+from .line_protocol import LineEncoder, attributes_tags
+from .downsample import Downsampled, downsample as downsample_op
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +29,34 @@ def _fields_mapper(item, key='value'):
 
     return key, value
 
-# TODO: Implement the asyncio version
-#  https://influxdb-client.readthedocs.io/en/stable/usage.html#how-to-use-asyncio
+
+def _legacy_writer(write_options: WriteOptions | None, client: InfluxDBClient | None) -> InfluxWriter:
+    """ Writer of an observer given the former `write_options` and `client` arguments """
+    from . import _config
+
+    options = dict()
+    if write_options is not None:
+        if write_options.write_type == WriteType.synchronous:
+            # Each point in its own request
+            options['batch_size'] = 1
+        else:
+            options.update(batch_size=write_options.batch_size,
+                           flush_interval=write_options.flush_interval / 1000,
+                           retries=write_options.max_retries,
+                           backoff=write_options.retry_interval / 1000)
+
+    if client is not None:
+        return InfluxWriter(client.url, token=client.token, org=client.org, **options)
+
+    return InfluxWriter(_config['url'], token=_config.get('token'), org=_config.get('org'), **options)
 
 
 class InfluxObserver(Observer):
     """An Observer (Sink) where sent stream is stored in an InfluxDB instance.
 
+    Points are written by a single process-wide asyncio writer (see `get_writer`), batched
+    with the points of the other observers.
+
     More info on [InfluxDB data elements](https://docs.influxdata.com/influxdb/v2.5/reference/key-concepts/data-elements/).
 
     Examples:
@@ -52,9 +80,15 @@ class InfluxObserver(Observer):
         fields_mapper: Function that return a `Tuple` or `List` of the field `(key, value)` given a stream item.
              The default mapper works with `Message`, `dict` with a "value" key, and simple base type.
         bucket: Taken from config when provided
-        is_raw: If `True` stream item must be an `influxdb_client.Point`.
-        write_options: Configure which type of writes client use (refer to [https://influxdb-client.readthedocs.io/]()).
-        client: Leaving `None` the `InfluxDBClient` is instantiated for you.
+        is_raw: If `True` stream item must be an `influxdb_client.Point` (or a line protocol `str`).
+        writer: Leaving `None` the shared `InfluxWriter` is used.
+        write_options: Deprecated, an own `InfluxWriter` is created with the batching options
+            (`SYNCHRONOUS` writes each point in a request).
+        client: Deprecated, an own `InfluxWriter` is created with the url, token and org of the client.
+        downsample: Write the window aggregates instead of each item, options of `downsample()`
+            (eg. `{'window': 10}`), taken from config (`influxdb.downsample.<measurement>`) when provided.
+        timestamp: Write the item timestamp (`item.timestamp`, or the current time) with each point, instead
+            of the time the server receives it. Taken from config (`influxdb.timestamp`), default `False`.
     """
     def __init__(self,
                  measurement: str | None = None,
@@ -62,57 +96,118 @@ class InfluxObserver(Observer):
                  fields_mapper: Callable | None = None,
                  bucket: str | None = None,
                  is_raw: bool = False,
-                 write_options: WriteOptions = ASYNCHRONOUS,
-                 client: InfluxDBClient | None = None
+                 writer: InfluxWriter | None = None,
+                 downsample: Dict[str, Any] | None = None,
+                 write_options: WriteOptions | None = None,
+                 client: InfluxDBClient | None = None,
+                 timestamp: bool | None = None
                  ) -> None:
         from . import _config
 
+        self._own_writer = None
+        if write_options is not None or client is not None:
+            warnings.warn("InfluxObserver 'write_options' and 'client' are deprecated, use 'writer' "
+                          "(ie. an InfluxWriter)", DeprecationWarning, stacklevel=2)
+            if writer is None:
+                writer = self._own_writer = _legacy_writer(write_options, client)
+
         self._measurement = measurement
         self._tags = tags
         self._fields_mapper = fields_mapper or _fields_mapper
         self._bucket = bucket or _config['bucket']
         self._is_raw = is_raw
-        self._write_options = write_options
-        self._org = _config['org']
-        self._client = client or InfluxDBClient(
-            **{k: _config[k] for k in ('url', 'token', 'org', 'debug') if k in _config}
-        )
-        self._write_api = self._client.write_api(write_options=write_options)
+        self._writer = writer or get_writer()
+        self._encoders: Dict[Any, LineEncoder] = dict()
+        if timestamp is None:
+            timestamp = _config.get('timestamp', False)
+        # Server time when `None`
+        self._precision = self._writer.precision if timestamp else None
 
         if self._tags and not isinstance(self._tags[0], (Tuple, List)):
             self._tags = (self._tags,)
 
+        downsample = downsample or (_config.get('downsample') or {}).get(measurement)
+        self._downsample = None
+        self._downsample_disposable = None
+
+        if downsample and not is_raw:
+            self._downsample = Subject()
+            self._downsample_disposable = self._downsample.pipe(downsample_op(
+                # Grouped as the lines (ie. by the item attributes without explicit tags)
+                tags=() if self._tags else None,
+                fields_mapper=self._fields_mapper,
+                measurement=measurement,
+                **downsample
+            )).subscribe(self._write)
+
         super().__init__()
 
     def _on_next_core(self, item: Any) -> None:
-        if self._is_raw:
-            self._write_api.write(self._bucket, self._org, record=item)
+        if self._downsample is not None:
+            self._downsample.on_next(item)
         else:
-            measurement = self._measurement or type(item).__name__
-            point = Point(measurement)
+            self._write(item)
 
-            if not self._tags and hasattr(item, '__dict__'):
-                value_as_dict = item.__dict__
-                tags = [(k, value_as_dict[k]) for k in value_as_dict if k not in ('value', 'timestamp')]
-            else:
-                tags = self._tags or list()
+    def _on_completed_core(self) -> None:
+        if self._downsample is not None:
+            # Last (partial) window
+            self._downsample.on_completed()
 
-            for tag, value in tags:
-                point.tag(tag, value)
-
-            fields = self._fields_mapper(item)
-            if not isinstance(fields[0], (Tuple, List)):
-                fields = (fields,)
+    def _write(self, item: Any) -> None:
+        if self._is_raw:
+            self._writer.write(self._bucket, item)
+        else:
+            line = self._encoder(item).encode(item)
+
+            if line:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"InfluxDB write: {line}")
+                self._writer.write(self._bucket, line)
+
+    def _encoder(self, item: Any) -> LineEncoder:
+        """ Encoder compiled for the item type (tags resolved once) """
+        item_type = type(item)
+
+        try:
+            return self._encoders[item_type]
+        except KeyError:
+            if item_type is Downsampled:
+                return self._downsampled_encoder(item)
+
+            encoder = self._encoders[item_type] = LineEncoder(
+                self._measurement or item_type.__name__,
+                self._fields_mapper,
+                tags=self._tags or (),
+                tag_attributes=attributes_tags(item) if not self._tags else (),
+                precision=self._precision
+            )
+            return encoder
+
+    def _downsampled_encoder(self, item: Downsampled) -> LineEncoder:
+        # By measurement (ie. items of different types aggregated by the same operator)
+        key = (Downsampled, item.measurement)
+
+        if key not in self._encoders:
+            self._encoders[key] = LineEncoder(
+                self._measurement or item.measurement,
+                Downsampled.fields_mapper,
+                tags=self._tags or (),
+                tag_attributes=item.tag_keys if not self._tags else (),
+                precision=self._precision
+            )
+
+        return self._encoders[key]
 
-            for field, value in fields:
-                point.field(field, value)
+    def dispose(self) -> None:
+        if self._downsample_disposable is not None:
+            self._downsample_disposable.dispose()
+            self._downsample_disposable = None
 
-            logger.debug(f"InfluxDB write: {point.to_line_protocol()}")
-            self._write_api.write(self._bucket, self._org, record=point)
+        if self._own_writer is not None:
+            try:
+                asyncio.get_running_loop().create_task(task_exception(self._own_writer.close()))
+            except RuntimeError:
+                pass
+            self._own_writer = None
 
-    def dispose(self) -> None:
-        self._client.__del__()
         super().dispose()
-
-    def __del__(self):
-        self.dispose()
\ No newline at end of file
@@ -0,0 +1,388 @@
+"""Process-wide asyncio writer, shared by the `InfluxObserver`s (ie. a single connection pool for all the sinks).
+
+Points (line protocol) are buffered by bucket and written with the InfluxDB v2 HTTP API
+(`/api/v2/write`) when a buffer reaches `batch_size` lines, or every `flush_interval` seconds.
+
+With a `SpillQueue`, batches not written after the retries (or over `max_pending`) are spilled
+to disk, and the following ones too until the backlog is replayed (ie. the backend recovered).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+from aiohttp.client_exceptions import ClientError
+from influxdb_client import Point
+
+from mape.utils import log_task_exception, task_exception
+from mape.remote.spill import SpillQueue
+
+logger = logging.getLogger(__name__)
+
+_writer: InfluxWriter | None = None
+
+# Max seconds between replay attempts of the spilled batches
+MAX_REPLAY_DELAY = 30
+
+
+@dataclass
+class WriteMetrics:
+    """ Statistics of an `InfluxWriter` """
+    # Lines stored by InfluxDB
+    written: int = 0
+    # Lines dropped (ie. after all the retries, or buffers full)
+    failed: int = 0
+    dropped: int = 0
+    requests: int = 0
+    retries: int = 0
+    # Lines waiting to be written
+    pending: int = 0
+    # Batches stored on disk, and written from disk
+    spilled: int = 0
+    replayed: int = 0
+
+
+class InfluxWriter:
+    """Asyncio (non blocking) writer of line protocol, batching by size and time.
+
+    Examples:
+        ```python
+        writer = InfluxWriter("http://localhost:8086", token="...", org="univaq")
+        writer.write("mape", "car,loop=car_panda speed=87.5 1670000000000000000")
+        ```
+
+    Args:
+        batch_size: Max lines in a request (a full buffer is flushed immediately).
+        flush_interval: Max seconds a line waits in the buffer.
+        concurrency: Max requests in flight.
+        retries: Attempts after a failure (connection error, timeout, 429 or 5xx status), with exponential backoff.
+        backoff: Seconds before the first retry (doubled on each attempt, or as `Retry-After`).
+        max_pending: Max buffered lines, the oldest are dropped (or spilled).
+        precision: Timestamp precision of the lines (`ns`, `us`, `ms` or `s`).
+        spill: Disk queue of the batches while the backend is unreachable (lines should have a timestamp).
+        replay_batch: Spilled batches read at once on replay.
+    """
+
+    def __init__(self,
+                 url: str,
+                 token: str | None = None,
+                 org: str | None = None,
+                 batch_size: int = 5000,
+                 flush_interval: float = 1,
+                 concurrency: int = 2,
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 max_pending: int = 100_000,
+                 precision: str = 'ns',
+                 session: aiohttp.ClientSession | None = None,
+                 spill: SpillQueue | None = None,
+                 replay_batch: int = 16) -> None:
+        self._url = url
+        self._org = org
+        self._headers = {'Content-Type': 'text/plain; charset=utf-8'}
+        if token:
+            self._headers['Authorization'] = f"Token {token}"
+
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._retries = retries
+        self._backoff = backoff
+        self._max_pending = max_pending
+        self._precision = precision
+
+        self._session = session
+        self._own_session = session is None
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self._buffers: Dict[str, List[str]] = dict()
+        self._requests = set()
+        self._timer = None
+        self.metrics = WriteMetrics()
+
+        self._spill = spill
+        self._replay_batch = replay_batch
+        # Blocking file I/O, in order
+        self._spill_executor = ThreadPoolExecutor(1, thread_name_prefix='influxdb-spill') if spill else None
+        self._replay = None
+        # Appends submitted and not yet done, the event is set when none
+        self._spilling = 0
+        self._spilled = asyncio.Event()
+        self._spilled.set()
+
+        # Backlog from a previous run
+        if spill is not None and not spill.empty:
+            self._start_replay()
+
+    @property
+    def precision(self) -> str:
+        return self._precision
+
+    def write(self, bucket: str, record: str | bytes | Point) -> None:
+        """ Buffer a line (or a `Point`), never blocks """
+        if isinstance(record, Point):
+            record = record.to_line_protocol()
+        elif isinstance(record, bytes):
+            record = record.decode()
+
+        if self.metrics.pending >= self._max_pending and not self._make_room():
+            self.metrics.dropped += 1
+            return
+
+        lines = self._buffers.setdefault(bucket, [])
+        lines.append(record)
+        self.metrics.pending += 1
+
+        if len(lines) >= self._batch_size:
+            self._flush_bucket(bucket)
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_timer())
+
+    def _make_room(self) -> bool:
+        """ Spill the largest buffer, or drop its oldest half, `False` if nothing is buffered (ie. all in flight) """
+        if not self._buffers:
+            return False
+
+        bucket = max(self._buffers, key=lambda bucket: len(self._buffers[bucket]))
+
+        if self._spill is not None:
+            lines = self._buffers.pop(bucket)
+            self.metrics.pending -= len(lines)
+            self._track(self._spill_lines(bucket, '\n'.join(lines).encode()))
+            return True
+
+        lines = self._buffers[bucket]
+        dropped = len(lines) // 2 or len(lines)
+        del lines[:dropped]
+
+        self.metrics.pending -= dropped
+        self.metrics.dropped += dropped
+        logger.warning(f"InfluxDB writer buffers full, {dropped} lines dropped")
+        return True
+
+    def _track(self, coroutine) -> None:
+        task = asyncio.create_task(task_exception(coroutine))
+        self._requests.add(task)
+        task.add_done_callback(self._requests.discard)
+
+    def _flush_bucket(self, bucket: str) -> None:
+        lines = self._buffers.pop(bucket, None)
+
+        if lines:
+            self._track(self._write_lines(bucket, lines))
+
+    @log_task_exception
+    async def _flush_timer(self) -> None:
+        try:
+            await asyncio.sleep(self._flush_interval)
+        finally:
+            self._timer = None
+
+        for bucket in list(self._buffers):
+            self._flush_bucket(bucket)
+
+    async def _write_lines(self, bucket: str, lines: List[str]) -> None:
+        body = '\n'.join(lines).encode()
+
+        # Backlog on disk (ie. backend unreachable), keep the order
+        if self._replay is not None:
+            self.metrics.pending -= len(lines)
+            await self._spill_lines(bucket, body)
+            return
+
+        try:
+            async with self._semaphore:
+                written = await self._request(bucket, body)
+        finally:
+            self.metrics.pending -= len(lines)
+
+        if written:
+            self.metrics.written += len(lines)
+        elif written is None and self._spill is not None:
+            await self._spill_lines(bucket, body)
+        else:
+            self.metrics.failed += len(lines)
+
+    async def _in_spill(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._spill_executor, func, *args)
+
+    async def _spill_lines(self, bucket: str, body: bytes) -> None:
+        self._spilling += 1
+        self._spilled.clear()
+        try:
+            await self._in_spill(self._spill.append, bucket.encode() + b'\n' + body)
+        finally:
+            self._spilling -= 1
+            if not self._spilling:
+                self._spilled.set()
+        self.metrics.spilled += 1
+
+        if self._replay is None:
+            logger.warning("InfluxDB unreachable, batches spilled to disk")
+            self._start_replay()
+
+    def _start_replay(self) -> None:
+        self._replay = asyncio.create_task(self._replay_spilled())
+
+    @log_task_exception
+    async def _replay_spilled(self) -> None:
+        delay = self._backoff
+
+        try:
+            while True:
+                try:
+                    records, position = await self._in_spill(self._spill.read_each, self._replay_batch)
+                except OSError as e:
+                    logger.error(f"InfluxDB spill read failed: {e!r}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_REPLAY_DELAY)
+                    continue
+
+                if not records:
+                    # Skip a truncated tail (if any)
+                    await self._in_spill(self._spill.commit, position)
+
+                    # Appends pending, replayed once done (ie. in order)
+                    if self._spilling:
+                        await self._spilled.wait()
+                        continue
+
+                    # The spill stays the write path until drained
+                    if await self._in_spill(lambda: self._spill.empty) and not self._spilling:
+                        logger.info("InfluxDB spilled batches replayed")
+                        return
+
+                    continue
+
+                if await self._replay_records(records):
+                    delay = self._backoff
+                else:
+                    # Still unreachable, retried from the batch not written
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_REPLAY_DELAY)
+        finally:
+            self._replay = None
+
+    async def _replay_records(self, records) -> bool:
+        """ Write the spilled records in order, `False` if the backend is still unreachable """
+        for record, end in records:
+            try:
+                bucket, body = record.split(b'\n', 1)
+                bucket = bucket.decode()
+            except ValueError:
+                # Not a spilled batch (eg. corrupted file), skipped
+                logger.error(f"InfluxDB spilled record malformed, dropped ({len(record)} bytes)")
+                written = False
+                body = record
+            else:
+                try:
+                    async with self._semaphore:
+                        written = await self._request(bucket, body)
+                except Exception as e:
+                    # Retried as unreachable, never lost
+                    logger.error(f"InfluxDB replay on '{bucket}' failed: {e!r}")
+                    written = None
+
+                if written is None:
+                    return False
+
+                self.metrics.replayed += 1
+
+            if not written:
+                self.metrics.failed += body.count(b'\n') + 1
+
+            # Checkpoint each batch, never written twice
+            await self._in_spill(self._spill.commit, end)
+
+        return True
+
+    async def _request(self, bucket: str, body: bytes) -> Optional[bool]:
+        """ POST with retries, return `True` if written, `False` if rejected, `None` if unreachable """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(self._url)
+
+        params = {'bucket': bucket, 'precision': self._precision}
+        if self._org:
+            params['org'] = self._org
+
+        for attempt in range(self._retries + 1):
+            self.metrics.requests += 1
+            delay = self._backoff * 2 ** attempt
+
+            try:
+                async with self._session.post('/api/v2/write', data=body, params=params, headers=self._headers) as resp:
+                    if resp.status < 300:
+                        return True
+
+                    text = await resp.text()
+                    error = f"InfluxDB write on '{bucket}' status {resp.status}: '{text}'"
+
+                    # Not recoverable (eg. malformed line, bucket not exist)
+                    if resp.status < 500 and resp.status != 429:
+                        logger.error(error)
+                        return False
+
+                    if retry_after := resp.headers.get('Retry-After'):
+                        delay = float(retry_after) if retry_after.isdigit() else delay
+
+            except (ClientError, asyncio.TimeoutError, OSError) as e:
+                # repr, a timeout has no message
+                error = f"InfluxDB write on '{bucket}' failed: {e!r}"
+
+            if attempt < self._retries:
+                self.metrics.retries += 1
+                await asyncio.sleep(delay)
+
+        logger.error(f"{error} (after {self._retries} retries)")
+        return None
+
+    async def flush(self) -> None:
+        """ Write all the buffered lines, and wait the requests in flight """
+        for bucket in list(self._buffers):
+            self._flush_bucket(bucket)
+
+        if self._requests:
+            await asyncio.gather(*self._requests, return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.flush()
+
+        if self._timer is not None:
+            self._timer.cancel()
+
+        if self._spill is not None:
+            if self._replay is not None:
+                self._replay.cancel()
+            await self._in_spill(self._spill.close)
+            self._spill_executor.shutdown()
+
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def get_writer() -> InfluxWriter:
+    """ The shared writer, created from the `influxdb` config (options of `InfluxWriter` in `influxdb.writer`) """
+    global _writer
+    from . import _config
+
+    if _writer is None:
+        options = dict(_config.get('writer') or {})
+        if spill := options.get('spill'):
+            options['spill'] = SpillQueue(**spill)
+
+        _writer = InfluxWriter(_config['url'],
+                               token=_config.get('token'),
+                               org=_config.get('org'),
+                               **options)
+
+    return _writer
+
+
+def set_writer(writer: InfluxWriter | None) -> None:
+    """ Replace the shared writer (eg. `None` to recreate it from a new config) """
+    global _writer
+    _writer = writer
@@ -12,8 +12,10 @@ from purse import (
     Redlock
 )
 
+from .versioned import RedisVersioned, VersionConflict
+from .aggregate import redis_aggregate, register_lua_aggregate
 from .rx_utils import PubObserver, SubObservable
-from .pubsub import subscribe_handler_deco, subscribe_handler, notifications_handler
+from .pubsub import subscribe_handler_deco, subscribe_handler, notifications_handler, keyspace_events_handler
 from .collections_patch import purse_monkey_patch as _purse_monkey_patch
 
 _purse_monkey_patch()
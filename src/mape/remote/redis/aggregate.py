@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from aioredis import Redis
+from typing import Any, Dict, List, Tuple
+
+# Collect in `items` the {key, number} of the source:
+#  * ARGV[1] == 'zset': members and scores of the sorted set KEYS[1]
+#  * ARGV[1] == 'pattern': the KEYS (matched client side by SCAN) holding a number (string, or versioned 'd' field)
+# ARGV[3] is the optional aggregate argument (eg. k of top-k)
+_LUA_ITEMS = """
+local items = {}
+if ARGV[1] == 'zset' then
+    local raw = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+    for i = 1, #raw, 2 do
+        items[#items + 1] = {raw[i], tonumber(raw[i + 1])}
+    end
+else
+    for _, key in ipairs(KEYS) do
+        local kind = redis.call('TYPE', key)['ok']
+        local value
+        if kind == 'string' then
+            value = redis.call('GET', key)
+        elseif kind == 'hash' then
+            value = redis.call('HGET', key, 'd')
+        end
+        value = tonumber(value)
+        if value then
+            items[#items + 1] = {key, value}
+        end
+    end
+end
+"""
+
+# Numbers are returned as string (Lua numbers are converted to integer by Redis, and tostring() keeps
+# only 14 digits), lists as flat {key, value, ...}
+LUA_AGGREGATES: Dict[str, str] = {
+    'count': """
+return #items
+""",
+    'sum': """
+local acc = 0
+for _, item in ipairs(items) do acc = acc + item[2] end
+return string.format('%.17g', acc)
+""",
+    'min': """
+if #items == 0 then return false end
+local acc = items[1][2]
+for _, item in ipairs(items) do acc = math.min(acc, item[2]) end
+return string.format('%.17g', acc)
+""",
+    'max': """
+if #items == 0 then return false end
+local acc = items[1][2]
+for _, item in ipairs(items) do acc = math.max(acc, item[2]) end
+return string.format('%.17g', acc)
+""",
+    'mean': """
+if #items == 0 then return false end
+local acc = 0
+for _, item in ipairs(items) do acc = acc + item[2] end
+return string.format('%.17g', acc / #items)
+""",
+    'topk': """
+table.sort(items, function(a, b) return a[2] > b[2] end)
+local result = {}
+for i = 1, math.min(tonumber(ARGV[3]) or 10, #items) do
+    result[#result + 1] = items[i][1]
+    result[#result + 1] = string.format('%.17g', items[i][2])
+end
+return result
+"""
+}
+
+# Keys for each SCAN call
+SCAN_COUNT = 1000
+
+_scripts: Dict[Tuple[int, str], Any] = dict()
+
+
+def register_lua_aggregate(name: str, lua: str) -> None:
+    """Add (or replace) an aggregate operation.
+
+    Args:
+        name: Operation name used in `aggregate()`.
+        lua: Script body reducing the `items` table (`{key_or_member, number}`), and returning a number
+            as string (eg. `string.format('%.17g', value)`) or a flat `{key, value, ...}` list.
+    """
+    LUA_AGGREGATES[name] = lua
+
+    for script_key in [script_key for script_key in _scripts if script_key[1] == name]:
+        del _scripts[script_key]
+
+
+def _script(redis: Redis, name: str):
+    try:
+        return _scripts[id(redis), name]
+    except KeyError:
+        if name not in LUA_AGGREGATES:
+            raise ValueError(f"Aggregate '{name}' not registered")
+
+        script = _scripts[id(redis), name] = redis.register_script(_LUA_ITEMS + LUA_AGGREGATES[name])
+        return script
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _parse(result) -> Any:
+    if isinstance(result, list):
+        return [(_decode(key), float(value)) for key, value in zip(result[::2], result[1::2])]
+    elif isinstance(result, (bytes, str)):
+        return float(result)
+
+    return result
+
+
+async def redis_aggregate(redis: Redis,
+                          name: str,
+                          pattern: str | None = None,
+                          sortedset: str | None = None,
+                          arg: Any = None) -> float | int | List[Tuple[str, float]] | None:
+    """Run the aggregate `name` inside Redis, over keys matching `pattern` or `sortedset` scores.
+
+    Keys are matched client side (SCAN) and passed to the script as KEYS: only declared keys are accessed
+    (ie. script replication), but on Redis Cluster they must be in the same slot (eg. a `{hash tag}`).
+    """
+    if sortedset is not None:
+        keys, args = [sortedset], ['zset', '', '' if arg is None else arg]
+    else:
+        keys = [key async for key in redis.scan_iter(match=pattern, count=SCAN_COUNT)]
+        args = ['pattern', '', '' if arg is None else arg]
+
+    return _parse(await _script(redis, name)(keys=keys, args=args))
@@ -4,10 +4,12 @@ import asyncio
 import aioredis
 import logging
 from functools import partial
-from typing import Tuple, List, Dict, Callable
+from fnmatch import fnmatchcase
+from typing import Any, Tuple, List, Dict, Callable
 
 import mape
-from mape.remote.de_serializer import obj_from_raw, Pickled
+from mape.remote.de_serializer import decoder, decompress, Pickled
+from mape.remote.wire import LateJoin
 from mape.utils import log_task_exception, auto_task
 
 logger = logging.getLogger(__name__)
@@ -32,10 +34,16 @@ def subscribe_handler(sub_handlers: Dict[str, Callable], full_message=False, des
     if not isinstance(redis, aioredis.Redis):
         logger.error("You are trying to use Redis without config it!")
 
-    deserializer = deserializer or partial(obj_from_raw, Pickled)
+    deserializer = deserializer or decoder(Pickled)
 
     def _on_publish(message, callback):
-        message['data'] = deserializer(message['data'])
+        try:
+            message['data'] = deserializer(decompress(message['data']))
+        except LateJoin as e:
+            # Subscribed in the middle of a compact stream, decoded since its next resync
+            logger.debug(f"Message dropped on {message['channel']}: {e}")
+            return
+
         callback(message if full_message else message['data'])
 
     def on_cancel(_):
@@ -64,4 +72,34 @@ def notifications_handler(handler: Callable, key: str, cmd_filter=(), full_messa
         if not cmd_filter or redis_cmd in cmd_filter:
             auto_task(handler, message)
 
-    subscribe_handler({key: _pre_handler}, full_message, deserializer=partial(obj_from_raw, str), *args, **kwargs)
+    subscribe_handler({key: _pre_handler}, full_message, deserializer=decoder(str), *args, **kwargs)
+
+
+def keyspace_events_handler(callback: Callable[[str, str], Any], key_pattern: str, events=(), redis=None):
+    """Call `callback(key, event)` on change of keys matching `key_pattern`.
+
+    Providing `events` (eg. `('sadd', 'srem')`) the filter is done server side, subscribing
+    the keyevent channels instead of the keyspace one (only the key is matched client side).
+
+    Returns:
+        The function to stop the notifications.
+    """
+
+    def _decode(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    if events:
+        def _on_keyevent(message):
+            key = message['data']
+            if fnmatchcase(key, key_pattern):
+                callback(key, _decode(message['channel']).split(':', 1)[1])
+
+        sub_handlers = {f"__keyevent@*__:{event}": _on_keyevent for event in events}
+    else:
+        def _on_keyspace(message):
+            callback(_decode(message['channel']).split(':', 1)[1], message['data'])
+
+        sub_handlers = {f"__keyspace@*__:{key_pattern}": _on_keyspace}
+
+    task = subscribe_handler(sub_handlers, full_message=True, deserializer=decoder(str), redis=redis)
+    return task.cancel
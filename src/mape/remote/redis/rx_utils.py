@@ -3,7 +3,6 @@ from __future__ import annotations
 import asyncio
 import logging
 import aioredis
-from functools import partial
 
 import rx
 from rx.subject import Subject
@@ -17,7 +16,7 @@ import mape
 from mape.base_elements import Port
 from mape.utils import log_task_exception
 from .pubsub import subscribe_handler
-from ..de_serializer import obj_to_raw, Pickled
+from ..de_serializer import encoder, compress, Pickled
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +27,7 @@ class PubObserver(Observer):
         self._channel = channel
         self._queue = asyncio.Queue()
         self._redis = redis or mape.redis
-        self._serializer = serializer or partial(obj_to_raw, Pickled)
+        self._serializer = serializer or encoder(Pickled)
 
         if not isinstance(self._redis, aioredis.Redis):
             logger.error("You are trying to use Redis without config it!")
@@ -48,7 +47,7 @@ class PubObserver(Observer):
     async def _publish_queue(self):
         while True:
             item = await self._queue.get()
-            await self._redis.publish(self._channel, self._serializer(item))
+            await self._redis.publish(self._channel, compress(self._serializer(item)))
 
     def dispose(self) -> None:
         self._task.cancel()
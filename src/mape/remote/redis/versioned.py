@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from aioredis import Redis
+from typing import Any, Type, Tuple, TypeVar, Generic, Callable
+
+from purse import RedisKey
+
+from mape.utils import aio_call
+from mape.remote.de_serializer import encoder, decoder
+
+T = TypeVar('T')
+
+# Entry is a Redis Hash with the value in the 'd' field and its version in 'v' (0 means not existing)
+
+_SET_LUA = """
+redis.call('HSET', KEYS[1], 'd', ARGV[1])
+return redis.call('HINCRBY', KEYS[1], 'v', 1)
+"""
+
+_CAS_LUA = """
+local version = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+if version ~= tonumber(ARGV[2]) then
+    return {0, version}
+end
+redis.call('HSET', KEYS[1], 'd', ARGV[1])
+return {1, redis.call('HINCRBY', KEYS[1], 'v', 1)}
+"""
+
+_INCR_LUA = """
+local value
+if ARGV[2] == 'int' then
+    value = redis.call('HINCRBY', KEYS[1], 'd', ARGV[1])
+else
+    value = redis.call('HINCRBYFLOAT', KEYS[1], 'd', ARGV[1])
+end
+return {tostring(value), redis.call('HINCRBY', KEYS[1], 'v', 1)}
+"""
+
+
+class VersionConflict(Exception):
+    """ Optimistic update failed (ie. entry changed by others on each retry) """
+    pass
+
+
+def check_increment(value_type: Type, amount: int | float) -> None:
+    """ As Redis HINCRBY/HINCRBYFLOAT: an `int` value only by an `int` amount, and numbers only """
+    if value_type not in (int, float):
+        raise TypeError(f"Increment of a non numeric value ({value_type.__name__})")
+
+    if value_type is int and not isinstance(amount, int):
+        raise TypeError(f"Increment of an int value by a {type(amount).__name__} ({amount!r})")
+
+
+def _numeric_or_raw(value_type: Type[T]) -> Tuple[Callable, Callable]:
+    """ (serializer, deserializer), numbers are stored as string allowing server side increment """
+    if value_type in (int, float):
+        return repr, lambda raw: value_type(raw.decode() if isinstance(raw, bytes) else raw)
+
+    return encoder(value_type), decoder(value_type)
+
+
+class RedisVersioned(Generic[T], RedisKey):
+    """Single value with a version, allowing optimistic concurrency (ie. compare-and-set) without locks.
+
+    Each write is a server side (Lua) script: one round trip, retry needed only on conflict.
+
+    Examples:
+        ```python
+        speed_limit = level.k.create_versioned('speed_limit', int)
+
+        # Retry only if someone else changed it between get and set
+        value, version = await speed_limit.update(lambda limit: min(limit or 130, 90))
+        ```
+    """
+    __slots__ = ('_value_type', '_serializer', '_deserializer', '_set', '_cas', '_incr')
+
+    def __init__(self, redis: Redis, rkey: str, value_type: Type[T]):
+        super().__init__(redis, rkey)
+        self._value_type: Type[T] = value_type
+        self._serializer, self._deserializer = _numeric_or_raw(value_type)
+
+        self._set = redis.register_script(_SET_LUA)
+        self._cas = redis.register_script(_CAS_LUA)
+        self._incr = redis.register_script(_INCR_LUA)
+
+    async def get(self) -> Tuple[T | None, int]:
+        """ Return `(value, version)`, version is 0 if entry not exist """
+        raw_item, version = await self.redis.hmget(self.rkey, 'd', 'v')
+
+        if raw_item is None:
+            return None, 0
+
+        return self._deserializer(raw_item), int(version)
+
+    async def version(self) -> int:
+        return int(await self.redis.hget(self.rkey, 'v') or 0)
+
+    async def set(self, value: T) -> int:
+        """ Unconditional set, return the new version """
+        return int(await self._set(keys=[self.rkey], args=[self._serializer(value)]))
+
+    async def compare_and_set(self, value: T, version: int) -> int | None:
+        """ Set only if current version is `version`, return the new version or `None` on conflict """
+        done, new_version = await self._cas(keys=[self.rkey], args=[self._serializer(value), version])
+        return int(new_version) if done else None
+
+    async def increment(self, amount: int | float = 1) -> Tuple[T, int]:
+        """ Atomic increment (value type must be `int` or `float`), return `(value, version)` """
+        check_increment(self._value_type, amount)
+        kind = 'int' if self._value_type is int else 'float'
+        value, version = await self._incr(keys=[self.rkey], args=[amount, kind])
+        return self._deserializer(value), int(version)
+
+    async def update(self, func: Callable[[T | None], Any], retries: int = 10) -> Tuple[T, int]:
+        """ Optimistic read-modify-write: `func(current_value)` (also coroutine) returns the new value.
+        Raise `VersionConflict` after `retries` failed attempts. """
+        for _ in range(retries):
+            value, version = await self.get()
+            new_value = await aio_call(func(value))
+
+            if (new_version := await self.compare_and_set(new_value, version)) is not None:
+                return new_value, new_version
+
+        raise VersionConflict(f"'{self.rkey}' update failed after {retries} retries")
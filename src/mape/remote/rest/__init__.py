@@ -1,3 +1,4 @@
 from .webserver import UvicornDaemon
 from .setup import setup
-from .rx_utils import POSTObserver
+from .rx_utils import POSTObserver, PostObservable
+from .websocket import WSObserver, WSObservable
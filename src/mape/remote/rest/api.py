@@ -1,16 +1,21 @@
 from enum import Enum
-from typing import Callable
-from functools import partial
+from typing import Awaitable, Callable, Dict, Optional
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, WebSocket
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette import status
+from starlette.responses import Response, StreamingResponse
 
 import mape
 from mape.loop import Loop
 from mape.base_elements import Element
 
-from ..de_serializer import obj_from_raw, Pickled
+from mape.constants import RESERVED_SEPARATOR
+
+from ..de_serializer import decoder, decompress, Pickled
+from . import batch, bridge
+from .websocket import serve_element, element_stream_path
+from .sse import element_events, element_events_path, SSE_MEDIA_TYPE
 
 
 class Port(str, Enum):
@@ -25,10 +30,24 @@ class Notification(str, Enum):
 
 
 element_notify_path = '/loops/{loop_uid}/elements/{element_uid}'
+element_batch_path = '/elements/batch'
+ingest_path = '/ingest/{path:path}'
+
+# Dispatch table of `ingest_path` (ie. routes added also after the server start), see `PostObservable`
+ingest_routes: Dict[str, Callable[[Request], Awaitable[Response]]] = dict()
+
+
+def _notify(port, notification: Notification, value) -> None:
+    if notification is Notification.next:
+        port.on_next(value)
+    elif notification is Notification.error:
+        port.on_error(value)
+    elif notification is Notification.completed:
+        port.on_completed()
 
 
 def api_setup(fastapi_app: FastAPI, mape_app: mape.App, deserializer: Callable = None):
-    deserializer = deserializer or partial(obj_from_raw, Pickled)
+    deserializer = deserializer or decoder(Pickled)
 
     def common_loop(loop_uid: str) -> Loop:
         if loop_uid not in mape_app.loops:
@@ -76,11 +95,87 @@ def api_setup(fastapi_app: FastAPI, mape_app: mape.App, deserializer: Callable =
         """
         port = element.port_in if port is Port.p_in else element.port_out
 
-        body = deserializer(await request.body())
+        body = deserializer(decompress(await request.body()))
+        bridge.to_mape_loop(_notify, port, notification, body)
+
+    @fastapi_app.post(element_batch_path,
+                      tags=['elements'],
+                      summary='Push many notifications on Element Ports',
+                      response_description='Number of pushed notifications')
+    async def elements_batch(request: Request):
+        """
+        Push, in order, the notifications of the body on their Element Port (also of different Loops).
+
+        Body formats (by **Content-Type**):
 
-        if notification is Notification.next:
-            port.on_next(body)
-        elif notification is Notification.error:
-            port.on_error(body)
-        elif notification is Notification.completed:
-            port.on_completed()
+        - **application/octet-stream**: length-prefixed binary frames (see `mape.remote.rest.batch`)
+        - **application/x-ndjson**: a JSON object for each line, `{"path", "port", "notification", "value"}`
+
+        Nothing is pushed if an item is malformed or targets a not existing Element.
+        """
+        try:
+            items = batch.decode(decompress(await request.body()),
+                                 request.headers.get('content-type'),
+                                 lambda payload: deserializer(decompress(payload)))
+
+            targets = []
+            for path, port, notification, value in items:
+                loop_uid, element_uid = path.split(RESERVED_SEPARATOR)
+                element = common_element(element_uid, common_loop(loop_uid))
+                port = element.port_in if Port(port) is Port.p_in else element.port_out
+                targets.append((port, Notification(notification), value))
+        except HTTPException:
+            raise
+        except Exception as e:
+            # Any decode failure of an untrusted body (eg. EOFError, AttributeError, ImportError of unpickling)
+            raise HTTPException(status_code=400, detail=f"Malformed batch: {e!r}")
+
+        for port, notification, value in targets:
+            bridge.to_mape_loop(_notify, port, notification, value)
+
+        return {'count': len(targets)}
+
+    @fastapi_app.post(ingest_path,
+                      tags=['ingest'],
+                      summary='Push a body into an HTTP source',
+                      response_description='Number of pushed items')
+    async def ingest(path: str, request: Request):
+        """
+        Push the body items into the `PostObservable` of the path (status 429 if its buffer is full).
+        """
+        route = ingest_routes.get(f"/{path}")
+        if route is None:
+            raise HTTPException(status_code=404, detail=f"Ingest route '/{path}' does not exist")
+
+        return await route(request)
+
+    @fastapi_app.get(element_events_path,
+                     tags=['elements'],
+                     summary='Stream Element output as Server-Sent Events',
+                     response_class=StreamingResponse)
+    async def element_events_stream(element: common_element = Depends(),
+                                    max_rate: Optional[float] = None,
+                                    latest: bool = False,
+                                    buffer: int = 100):
+        """
+        Stream the Element `port_out` as Server-Sent Events (JSON data), eg. for dashboards.
+
+        - **max_rate**: max events per second
+        - **latest**: send only the latest item (ie. sampling)
+        - **buffer**: max items waiting for a slow client, the oldest are dropped
+        """
+        return StreamingResponse(element_events(element, max_rate, latest, buffer),
+                                 media_type=SSE_MEDIA_TYPE,
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @fastapi_app.websocket(element_stream_path)
+    async def element_stream(websocket: WebSocket, loop_uid: str, element_uid: str, subscribe: bool = False):
+        """ Binary stream into the Element `port_in` (and from its `port_out` with `subscribe`) """
+        try:
+            element = common_element(element_uid, common_loop(loop_uid))
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        await websocket.accept()
+        await serve_element(websocket, element, deserializer, subscribe=subscribe)
@@ -0,0 +1,102 @@
+"""Body formats of the bulk endpoint (`element_batch_path`), many notifications for (possibly) different elements.
+
+Binary (`application/octet-stream`), a sequence of frames (little-endian):
+
+    | path length (u16) | port (u8) | notification (u8) | payload length (u32) | utf-8 element path | payload |
+
+with the payload serialized as for `element_notify` (default `Pickled`).
+
+NDJSON (`application/x-ndjson`), a JSON object for each line:
+
+    {"path": "loop_uid.element_uid", "port": "in", "notification": "next", "value": ...}
+"""
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+BINARY_MEDIA_TYPE = 'application/octet-stream'
+
+# Values of api.Port and api.Notification, in wire order
+PORTS = ('in', 'out')
+NOTIFICATIONS = ('next', 'error', 'completed')
+
+_frame = struct.Struct('<HBBI')
+
+
+class BatchItem(NamedTuple):
+    # Element path (ie. loop_uid.element_uid)
+    path: str
+    port: str = 'in'
+    notification: str = 'next'
+    value: Any = None
+
+
+def encode_frames(items: Iterable[BatchItem], serializer: Callable[[Any], bytes]) -> bytes:
+    chunks = []
+
+    for path, port, notification, value in items:
+        raw_path = path.encode()
+        payload = serializer(value)
+        payload = payload.encode() if isinstance(payload, str) else payload
+
+        chunks.append(_frame.pack(len(raw_path), PORTS.index(port), NOTIFICATIONS.index(notification), len(payload)))
+        chunks.append(raw_path)
+        chunks.append(payload)
+
+    return b''.join(chunks)
+
+
+def decode_frames(body: bytes, deserializer: Callable[[bytes], Any]) -> Iterator[BatchItem]:
+    view = memoryview(body)
+    pos = 0
+
+    while pos < len(view):
+        if pos + _frame.size > len(view):
+            raise ValueError(f"Truncated frame header at byte {pos}")
+
+        path_len, port, notification, payload_len = _frame.unpack_from(view, pos)
+        pos += _frame.size
+        end = pos + path_len + payload_len
+
+        if end > len(view):
+            raise ValueError(f"Truncated frame at byte {pos - _frame.size}")
+
+        try:
+            port, notification = PORTS[port], NOTIFICATIONS[notification]
+        except IndexError:
+            raise ValueError(f"Unknown port or notification code at byte {pos - _frame.size}")
+
+        path = bytes(view[pos:pos + path_len]).decode()
+        payload = view[pos + path_len:end]
+        # Completed notifications have no value
+        value = deserializer(payload) if payload_len and notification != 'completed' else None
+
+        yield BatchItem(path, port, notification, value)
+        pos = end
+
+
+def encode_ndjson(items: Iterable[BatchItem]) -> bytes:
+    return b''.join(json.dumps(item._asdict()).encode() + b'\n' for item in items)
+
+
+def decode_ndjson(body: bytes) -> Iterator[BatchItem]:
+    for line_number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+
+        try:
+            item = json.loads(line)
+            yield BatchItem(item['path'], item.get('port', 'in'), item.get('notification', 'next'), item.get('value'))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Malformed line {line_number}: {e!r}")
+
+
+def decode(body: bytes, content_type: str | None, deserializer: Callable[[bytes], Any]) -> List[BatchItem]:
+    """ Decode the whole body (ie. nothing is pushed if an item is malformed) """
+    if content_type and content_type.startswith(NDJSON_MEDIA_TYPE):
+        return list(decode_ndjson(body))
+
+    return list(decode_frames(body, deserializer))
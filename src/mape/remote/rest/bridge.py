@@ -0,0 +1,75 @@
+"""Hand-off between the web server and the MAPE (control) asyncio loop.
+
+By default the web server runs on the MAPE loop, and the hand-off is a plain call. Running the server
+in its own thread (see `UvicornDaemon(threaded=True)`), request parsing and decoding are done there,
+and the decoded notifications are queued to the MAPE loop (a single wake-up for many notifications).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from asyncio import AbstractEventLoop
+from collections import deque
+from typing import Any, Callable, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+_mape_loop: AbstractEventLoop | None = None
+_server_loop: AbstractEventLoop | None = None
+
+_pending: Deque[Tuple[Callable, Tuple]] = deque()
+_scheduled = False
+_lock = threading.Lock()
+
+
+def set_loops(mape_loop: AbstractEventLoop | None, server_loop: AbstractEventLoop | None) -> None:
+    """ Set (or unset with `None`) the loops of a web server running in its own thread """
+    global _mape_loop, _server_loop
+    _mape_loop, _server_loop = mape_loop, server_loop
+
+
+def threaded() -> bool:
+    return _server_loop is not None
+
+
+def _drain() -> None:
+    global _scheduled
+
+    with _lock:
+        _scheduled = False
+
+    while _pending:
+        func, args = _pending.popleft()
+
+        try:
+            func(*args)
+        except Exception as e:
+            logger.exception(e)
+
+
+def to_mape_loop(func: Callable, *args: Any) -> None:
+    """ Call `func(*args)` in the MAPE loop, preserving the order of the calls """
+    global _scheduled
+
+    if _mape_loop is None:
+        return func(*args)
+
+    _pending.append((func, args))
+
+    with _lock:
+        if not _scheduled:
+            _scheduled = True
+            _mape_loop.call_soon_threadsafe(_drain)
+
+
+def to_server_loop(callback: Callable) -> Callable:
+    """ Wrap `callback` (eg. an observer of an element port) to be called in the web server loop """
+    if _server_loop is None:
+        return callback
+
+    server_loop = _server_loop
+
+    def wrapper(*args):
+        server_loop.call_soon_threadsafe(callback, *args)
+
+    return wrapper
@@ -1,113 +1,288 @@
 from __future__ import annotations
 
-import logging
+import time
 import json
+import logging
 import aiohttp
 import asyncio
 
-from typing import Any
-from functools import partial
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, List, Tuple
 from aiohttp.client_exceptions import ClientError
+from starlette.requests import Request
+from starlette.responses import Response, JSONResponse
+
+import rx
+from rx import operators as ops
 from rx.core import Observer, Observable
+from rx.core.notification import OnNext, OnError, OnCompleted
+from rx.disposable import Disposable
 
 import mape
 from mape.utils import log_task_exception, task_exception
 from mape.constants import RESERVED_SEPARATOR
 
-from .api import Port, Notification, element_notify_path
-from ..de_serializer import obj_to_raw, obj_from_raw, Pickled
+from . import batch, bridge
+from .api import Port, Notification, element_notify_path, element_batch_path, ingest_routes
+from ..de_serializer import encoder, decoder, compress, decompress, Pickled
 
 logger = logging.getLogger(__name__)
 
-# TODO:
-# * better implemented with a queue (like PubObserver) to preserve notifications order
-
-
 def _element_path2url_path(element_path):
     loop_uid, element_uid = element_path.split(RESERVED_SEPARATOR)
     return element_notify_path.format(loop_uid=loop_uid, element_uid=element_uid)
 
 
+@dataclass
+class DeliveryMetrics:
+    """ Delivery statistics of a `POSTObserver` """
+    # Delivered notifications
+    sent: int = 0
+    # Notifications dropped (ie. after all the retries)
+    failed: int = 0
+    requests: int = 0
+    retries: int = 0
+    # Notifications waiting to be sent
+    queue_depth: int = 0
+    # Seconds from the notification to the response (last, exponential moving average, max)
+    latency: float = 0
+    latency_avg: float = 0
+    latency_max: float = 0
+
+    def add_latency(self, latency: float, alpha: float = 0.1) -> None:
+        self.latency = latency
+        self.latency_avg = latency if not self.latency_avg else self.latency_avg + alpha * (latency - self.latency_avg)
+        self.latency_max = max(self.latency_max, latency)
+
+
 class POSTObserver(Observer):
+    """Sink sending the stream to an element port of a remote node (REST API).
+
+    Notifications are queued and delivered by `concurrency` workers over keep-alive connections:
+    with a single worker (default) the order is preserved. With `batch_size > 1` the queued
+    notifications are sent together to the bulk endpoint (`element_batch_path`).
+
+    Examples:
+        ```python
+        detect.subscribe(POSTObserver("http://0.0.0.0:6060", "ambulance.policy", batch_size=64))
+        ```
+
+    Args:
+        concurrency: Max requests in flight (order not guaranteed if greater than 1).
+        batch_size: Max notifications in a request.
+        batch_interval: Max seconds waiting to fill a batch.
+        retries: Attempts after a failure (connection error, timeout, 429 or 5xx status), with exponential backoff.
+        backoff: Seconds before the first retry (doubled on each attempt).
+        keepalive: Seconds an idle connection is kept open for reuse.
+    """
+
     def __init__(self,
                  base_url: str,
                  path: str,
                  port: Port = Port.p_in,
                  serializer=None,
-                 session: aiohttp.ClientSession = None) -> None:
+                 session: aiohttp.ClientSession = None,
+                 concurrency: int = 1,
+                 batch_size: int = 1,
+                 batch_interval: float = 0.01,
+                 retries: int = 3,
+                 backoff: float = 0.1,
+                 keepalive: float = 30) -> None:
         self._base_url = base_url
+        self._element_path = None if path.startswith('/') else path
 
         try:
             self._path = path if path.startswith('/') else _element_path2url_path(path)
         except ValueError as e:
             logger.error(f"Malformed element_path: '{path}'")
 
+        if batch_size > 1 and self._element_path is None:
+            logger.warning(f"Batching needs an element path (ie. loop_uid.element_uid), given '{path}'")
+            batch_size = 1
+
         self._port = port
-        self._session = session or aiohttp.ClientSession(base_url)
-        self._serializer = serializer or partial(obj_to_raw, Pickled)
-        # self._queue = asyncio.Queue()
+        self._own_session = session is None
+        self._session = session or aiohttp.ClientSession(
+            base_url, connector=aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=keepalive))
+        self._serializer = serializer or encoder(Pickled)
+
+        self._batch_size = batch_size
+        self._batch_interval = batch_interval
+        self._retries = retries
+        self._backoff = backoff
+
+        self.metrics = DeliveryMetrics()
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._deliver_queue()) for _ in range(concurrency)]
 
         super().__init__()
 
+    def _enqueue(self, value: Any, notification: Notification) -> None:
+        self._queue.put_nowait((value, notification, time.monotonic()))
+        self.metrics.queue_depth = self._queue.qsize()
+
     def _on_next_core(self, value: Any) -> None:
-        asyncio.create_task(self.post(value, Notification.next))
+        self._enqueue(value, Notification.next)
 
     def _on_error_core(self, error: Exception) -> None:
-        asyncio.create_task(self.post(error, Notification.error))
+        self._enqueue(error, Notification.error)
 
     def _on_completed_core(self) -> None:
-        asyncio.create_task(self.post(None, Notification.completed))
+        self._enqueue(None, Notification.completed)
+
+    async def _next_batch(self) -> List[Tuple[Any, Notification, float]]:
+        items = [await self._queue.get()]
+        deadline = time.monotonic() + self._batch_interval
+
+        while len(items) < self._batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                if (timeout := deadline - time.monotonic()) <= 0:
+                    break
+
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+        self.metrics.queue_depth = self._queue.qsize()
+        return items
 
     @log_task_exception
-    async def post(self, value, notification: Notification):
-        try:
-            data = self._serializer(value)
-            params = {'port': self._port.value, 'notification': notification.value}
+    async def _deliver_queue(self):
+        while True:
+            items = await self._next_batch()
+
+            try:
+                if len(items) == 1:
+                    value, notification, _ = items[0]
+                    delivered = await self.post(value, notification)
+                else:
+                    delivered = await self.post_batch([(value, notification) for value, notification, _ in items])
+            except Exception as e:
+                # Eg. not serializable, the worker goes on with the next items
+                logger.error(f"Delivery of {len(items)} notifications to '{self._path}' failed: {e!r}")
+                delivered = False
+
+            if delivered:
+                now = time.monotonic()
+                self.metrics.sent += len(items)
+                for *_, queued_at in items:
+                    self.metrics.add_latency(now - queued_at)
+            else:
+                self.metrics.failed += len(items)
+
+    async def _request(self, path: str, data: bytes, **kwargs) -> bool:
+        """ POST with retries, return `True` if delivered """
+        for attempt in range(self._retries + 1):
+            self.metrics.requests += 1
+
+            try:
+                async with self._session.post(path, data=data, **kwargs) as resp:
+                    if resp.status == 200:
+                        return True
 
-            async with self._session.post(self._path, data=data, params=params) as resp:
-                if resp.status != 200:
                     text = await resp.text()
-                    logger.error(f"Response from '{self._path}' status {resp.status}: '{json.loads(text)}'")
+                    error = f"Response from '{path}' status {resp.status}: '{text}'"
+
+                    # Not recoverable (eg. element not exist)
+                    if resp.status < 500 and resp.status != 429:
+                        logger.error(error)
+                        return False
+
+            except (ClientError, asyncio.TimeoutError, OSError) as e:
+                # repr, a timeout has no message
+                error = repr(e)
+
+            if attempt < self._retries:
+                self.metrics.retries += 1
+                await asyncio.sleep(self._backoff * 2 ** attempt)
+
+        logger.error(f"{error} (after {self._retries} retries)")
+        return False
+
+    async def post(self, value, notification: Notification) -> bool:
+        data = compress(self._serializer(value))
+        params = {'port': self._port.value, 'notification': notification.value}
 
-        except aiohttp.client_exceptions.ClientError as e:
-            logger.error(e)
+        return await self._request(self._path, data, params=params)
+
+    async def post_batch(self, items: List[Tuple[Any, Notification]]) -> bool:
+        body = batch.encode_frames(
+            (batch.BatchItem(self._element_path, self._port.value, notification.value, value)
+             for value, notification in items),
+            lambda value: compress(self._serializer(value)))
+
+        return await self._request(element_batch_path, compress(body),
+                                   headers={'Content-Type': batch.BINARY_MEDIA_TYPE})
 
     def dispose(self) -> None:
-        asyncio.create_task(task_exception(self._session.close()))
+        if not self._tasks:
+            return
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        if self._own_session:
+            asyncio.create_task(task_exception(self._session.close()))
+
         super().dispose()
 
     def __del__(self):
         self.dispose()
 
 
-# TODO: to finish
-import rx
-from rx.disposable import Disposable
-from fastapi import FastAPI
-from starlette.requests import Request
-from starlette.responses import Response
+def _notification(notification: str, value: Any):
+    if notification == 'next':
+        return OnNext(value)
+    elif notification == 'error':
+        return OnError(value)
 
+    return OnCompleted()
 
-class PostObservable(Observable):
-    def __init__(self, path, deserializer=None, fastapi: FastAPI | None = None) -> None:
-        self._path = path
-        self._fastapi = fastapi or mape.fastapi
-        self._deserializer = deserializer or partial(obj_from_raw, Pickled)
 
+class PostObservable(Observable):
+    """HTTP source: bodies POSTed to `/ingest/{path}` are decoded and emitted (in order).
+
+    The route is served by a dispatch table, so it can be added also after the web server start.
+    Decoded items wait in a bounded buffer, when full the request is refused with status 429
+    (and `Retry-After`), allowing the senders to slow down.
+
+    Body formats (by **Content-Type**):
+
+    * `application/json`: a JSON value
+    * `application/x-ndjson`: a JSON value for each line (batch)
+    * others: a value serialized by the sender (default `Pickled`), or with `?batch=true` the binary
+        frames of `mape.remote.rest.batch` (their element path is ignored)
+
+    Examples:
+        ```python
+        # curl -X POST -H 'Content-Type: application/json' -d '87.5' http://0.0.0.0:6060/ingest/speed
+        PostObservable('/speed').subscribe(detect)
+        ```
+    """
+
+    def __init__(self, path: str, deserializer=None, buffer: int = 1024, retry_after: int = 1) -> None:
+        self._path = path if path.startswith('/') else f"/{path}"
+        self._deserializer = deserializer or decoder(Pickled)
+        self._max_buffer = buffer
+        self._retry_after = retry_after
+
+        self._buffer: Deque = deque()
+        self._available = asyncio.Event()
         self._task = None
 
         def on_subscribe(observer, scheduler):
+            if self._path in ingest_routes:
+                logger.warning(f"Ingest route '{self._path}' already registered, replaced")
 
-            async def on_next1(request: Request):
-                print(await request.body())
-                return await request.body()
-                # observer.on_next(value)
+            ingest_routes[self._path] = self._handle
+            self._task = asyncio.create_task(self._emit_buffer(observer))
 
-            self._fastapi.post(self._path, response_class=Response)(on_next1)
-
-            print("subscribed", self._path)
-
-            return Disposable()
+            return Disposable(self.close)
 
         self._auto_connect = rx.create(on_subscribe).pipe(ops.dematerialize(), ops.share())
         super().__init__()
@@ -115,16 +290,58 @@ class PostObservable(Observable):
     def _subscribe_core(self, observer, scheduler=None):
         return self._auto_connect.subscribe(observer, scheduler=scheduler)
 
-    # TODO: re-running create unpredictable error (endpoint appear and disappear
-    # def close(self):
-    #     # Find the route by path
-    #     # try:
-    #     route = [route for route in self._fastapi.routes if route.path == self._path]
-    #     if len(route):
-    #         self._fastapi.routes.remove(route[0])
-    #     # except (IndexError, ValueError) as e:
-    #     #     # already removed (ie. webserver shutdown)
-    #     #     pass
-    #
-    # def __del__(self):
-    #     self.close()
\ No newline at end of file
+    def _decode(self, body: bytes, content_type: str, is_batch: bool) -> List[Any]:
+        """ Body as list of (materialized) notifications """
+        if content_type.startswith('application/json'):
+            return [OnNext(json.loads(body))]
+        elif content_type.startswith(batch.NDJSON_MEDIA_TYPE):
+            return [OnNext(json.loads(line)) for line in body.splitlines() if line.strip()]
+        elif is_batch:
+            return [_notification(item.notification, item.value)
+                    for item in batch.decode_frames(body, lambda payload: self._deserializer(decompress(payload)))]
+
+        return [OnNext(self._deserializer(body))]
+
+    async def _handle(self, request: Request) -> Response:
+        try:
+            notifications = self._decode(decompress(await request.body()),
+                                         request.headers.get('content-type', ''),
+                                         request.query_params.get('batch', '').lower() in ('1', 'true', 'yes'))
+        except Exception as e:
+            # Any decode failure of an untrusted body (eg. EOFError, AttributeError, ImportError of unpickling)
+            return JSONResponse({'detail': f"Malformed body: {e!r}"}, status_code=400)
+
+        if len(notifications) > self._max_buffer:
+            return JSONResponse({'detail': f"Batch larger than the buffer ({self._max_buffer} items)"},
+                                status_code=413)
+
+        # Backpressure
+        if len(self._buffer) + len(notifications) > self._max_buffer:
+            return JSONResponse({'detail': f"Buffer of '{self._path}' full"},
+                                status_code=429, headers={'Retry-After': str(self._retry_after)})
+
+        self._buffer.extend(notifications)
+        bridge.to_mape_loop(self._available.set)
+
+        return JSONResponse({'count': len(notifications)})
+
+    @log_task_exception
+    async def _emit_buffer(self, observer):
+        while True:
+            await self._available.wait()
+            self._available.clear()
+
+            while self._buffer:
+                observer.on_next(self._buffer.popleft())
+
+                # Let the other tasks run on long bursts
+                if len(self._buffer) % 64 == 0:
+                    await asyncio.sleep(0)
+
+    def close(self):
+        if ingest_routes.get(self._path) == self._handle:
+            del ingest_routes[self._path]
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
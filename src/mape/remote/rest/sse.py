@@ -0,0 +1,94 @@
+"""Server-Sent Events stream of an Element `port_out` (eg. for browser dashboards).
+
+Each notification is an event (`next`, `error` or `completed`) with the JSON value as data, and the
+sequence number of the notification as id (ie. a gap means dropped items). Each client has its own
+bounded buffer (the oldest items are dropped), and the rate is limited server side, so a slow client
+never backs up the loop.
+"""
+from __future__ import annotations
+
+import json
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator
+
+from fastapi.encoders import jsonable_encoder
+from rx import operators as ops
+from rx.core.notification import OnNext, OnError
+
+from . import bridge
+
+logger = logging.getLogger(__name__)
+
+element_events_path = '/loops/{loop_uid}/elements/{element_uid}/events'
+
+SSE_MEDIA_TYPE = 'text/event-stream'
+
+
+def _to_json(value: Any) -> str:
+    try:
+        return json.dumps(jsonable_encoder(value))
+    except (TypeError, ValueError):
+        return json.dumps(repr(value))
+
+
+def _event(seq: int, notification) -> str:
+    if isinstance(notification, OnNext):
+        name, data = 'next', _to_json(notification.value)
+    elif isinstance(notification, OnError):
+        name, data = 'error', _to_json(str(notification.exception))
+    else:
+        name, data = 'completed', 'null'
+
+    return f"id: {seq}\nevent: {name}\ndata: {data}\n\n"
+
+
+async def element_events(element,
+                         max_rate: float | None = None,
+                         latest: bool = False,
+                         buffer: int = 100,
+                         heartbeat: float = 15) -> AsyncIterator[str]:
+    """Events of `element.port_out`, until the client disconnects (or the stream completes).
+
+    Args:
+        max_rate: Max events per second (default unlimited).
+        latest: Send only the latest item (ie. sampling), dropping the ones arrived in the meanwhile.
+        buffer: Max items waiting to be sent, the oldest are dropped.
+        heartbeat: Seconds of inactivity before a keep-alive comment.
+    """
+    queue = deque(maxlen=1 if latest else max(buffer, 1))
+    available = asyncio.Event()
+    seq = 0
+
+    def on_notification(notification):
+        nonlocal seq
+        seq += 1
+        queue.append((seq, notification))
+        available.set()
+
+    disposable = element.port_out.pipe(ops.materialize()).subscribe(bridge.to_server_loop(on_notification))
+    min_interval = 1 / max_rate if max_rate else 0
+
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(available.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            available.clear()
+
+            while queue:
+                notification_seq, notification = queue.popleft()
+                yield _event(notification_seq, notification)
+
+                if not isinstance(notification, OnNext):
+                    return
+
+                if min_interval:
+                    # Items arriving in the meanwhile are buffered (or replaced with latest)
+                    await asyncio.sleep(min_interval)
+    finally:
+        disposable.dispose()
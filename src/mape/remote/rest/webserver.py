@@ -1,14 +1,20 @@
 import asyncio
+import threading
 
 from uvicorn import Config, Server
-from multiprocessing import Process
+
+from . import bridge
 
 # TODO: format correctly the logger output
 
 
 class UvicornDaemon:
-    def __init__(self, app, loop, host='0.0.0.0', port=6060, log_level='info', **kwargs) -> None:
+    """Uvicorn web server, running on the MAPE asyncio `loop`, or with `threaded` in its own thread and loop
+    (ie. request parsing and decoding don't delay the control loops, see `bridge`)."""
+
+    def __init__(self, app, loop, host='0.0.0.0', port=6060, log_level='info', threaded=False, **kwargs) -> None:
         self._loop = loop
+        self._thread = None
 
         kwargs = {
             'app': app,
@@ -20,12 +26,39 @@ class UvicornDaemon:
 
         config = Config(**kwargs)
         self._server = Server(config)
-        self._loop.create_task(self._server.serve())
+
+        if threaded:
+            server_loop = asyncio.new_event_loop()
+            bridge.set_loops(loop, server_loop)
+
+            self._thread = threading.Thread(target=self._serve_thread, args=(server_loop,),
+                                            name='uvicorn', daemon=True)
+            self._thread.start()
+        else:
+            self._loop.create_task(self._server.serve())
+
+    def _serve_thread(self, server_loop):
+        asyncio.set_event_loop(server_loop)
+        # Signals are handled by the MAPE loop (ie. main thread)
+        self._server.install_signal_handlers = lambda: None
+
+        try:
+            server_loop.run_until_complete(self._server.serve())
+        finally:
+            bridge.set_loops(None, None)
+            server_loop.close()
 
     def stop(self):
-        self._loop.create_task(self._server.shutdown())
+        if self._thread is not None:
+            # Graceful exit checked by the server loop
+            self._server.should_exit = True
+        else:
+            self._loop.create_task(self._server.shutdown())
+
+    @property
+    def threaded(self):
+        return self._thread is not None
 
     @property
     def config(self):
         return self._server.config
-
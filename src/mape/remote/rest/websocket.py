@@ -0,0 +1,480 @@
+"""Persistent (WebSocket) stream with an Element: push items into its `port_in`, receive its `port_out`.
+
+Binary frames, the first byte is the frame type:
+
+    ITEM    | 0x01 | notification (u8: next, error, completed) | payload (serialized value) |
+    CREDIT  | 0x02 | credits (u32) |
+    PING    | 0x03 | timestamp (f64) |
+    PONG    | 0x04 | timestamp (f64, of the PING) |
+
+Flow control is credit based: each side sends ITEMs only while it has credits granted by the other side,
+which grants new ones (CREDIT) once the items are consumed (ie. pushed into the `port_in` by the MAPE loop,
+or by the observers of `WSObservable`). A slow consumer never gets flooded, and a slow producer never backs
+up the loop (see `buffer`). Both sides send a PING every `heartbeat` seconds, and close the stream after
+3 heartbeats without frames. The client side reconnects (with exponential backoff) when the stream is lost.
+"""
+from __future__ import annotations
+
+import time
+import struct
+import asyncio
+import logging
+import aiohttp
+from typing import Any, Awaitable, Callable, Deque, Tuple
+from collections import deque
+
+import rx
+from rx.core import Observer, Observable
+from rx.disposable import Disposable
+from rx import operators as ops
+from rx.core.notification import OnNext, OnError, OnCompleted
+
+from mape.utils import log_task_exception, task_exception
+from mape.constants import RESERVED_SEPARATOR
+
+from ..de_serializer import encoder, decoder, compress, decompress, Pickled
+from . import bridge
+
+logger = logging.getLogger(__name__)
+
+element_stream_path = '/loops/{loop_uid}/elements/{element_uid}/stream'
+
+ITEM = 0x01
+CREDIT = 0x02
+PING = 0x03
+PONG = 0x04
+
+NEXT = 0
+ERROR = 1
+COMPLETED = 2
+
+_item = struct.Struct('<BB')
+_credit = struct.Struct('<BI')
+_ping = struct.Struct('<Bd')
+
+# Missed heartbeats before closing the stream
+_MAX_MISSED_HEARTBEATS = 3
+
+
+def _element_path2url_path(element_path: str) -> str:
+    loop_uid, element_uid = element_path.split(RESERVED_SEPARATOR)
+    return element_stream_path.format(loop_uid=loop_uid, element_uid=element_uid)
+
+
+class StreamProtocol:
+    """Framing, flow control and heartbeat of a stream (used by both server and client side).
+
+    Args:
+        send_bytes: Coroutine function sending a binary WebSocket message.
+        on_item: Called with `(notification, payload)` for each received ITEM.
+        window: Credits granted to the other side (ie. max items in flight toward us, and not yet consumed).
+        heartbeat: Seconds between PINGs.
+        consume_on_item: Item consumed when `on_item` returns, otherwise call `consumed()`.
+    """
+
+    def __init__(self,
+                 send_bytes: Callable[[bytes], Awaitable],
+                 on_item: Callable[[int, memoryview], Any],
+                 window: int = 256,
+                 heartbeat: float = 10,
+                 consume_on_item: bool = True) -> None:
+        self._send_bytes = send_bytes
+        self._on_item = on_item
+        self._window = window
+        self.heartbeat = heartbeat
+        self._consume_on_item = consume_on_item
+
+        self._loop = asyncio.get_running_loop()
+        self._send_lock = asyncio.Lock()
+        self._credits = 0
+        self._credits_available = asyncio.Event()
+        self._consumed = 0
+        self._closed = False
+        self.last_seen = time.monotonic()
+        self.rtt: float | None = None
+
+    async def send(self, frame: bytes) -> None:
+        async with self._send_lock:
+            await self._send_bytes(frame)
+
+    async def send_item(self, notification: int, payload: str | bytes) -> None:
+        """ Wait a credit, then send """
+        if isinstance(payload, str):
+            payload = payload.encode()
+
+        while self._credits <= 0:
+            if self._closed:
+                raise ConnectionResetError("Stream closed")
+
+            self._credits_available.clear()
+            await self._credits_available.wait()
+
+        self._credits -= 1
+        await self.send(_item.pack(ITEM, notification) + payload)
+
+    async def grant(self, credits: int | None = None) -> None:
+        await self.send(_credit.pack(CREDIT, credits or self._window))
+
+    def consumed(self) -> None:
+        """ A received item has been consumed (call it in the loop of the protocol) """
+        self._consumed += 1
+
+        # Replenish (ie. half window consumed)
+        if self._consumed >= max(self._window // 2, 1) and not self._closed:
+            consumed, self._consumed = self._consumed, 0
+            self._loop.create_task(task_exception(self.grant(consumed)))
+
+    def close(self) -> None:
+        """ Connection lost: wake up the senders waiting credits (ie. `ConnectionResetError`) """
+        self._closed = True
+        self._credits_available.set()
+
+    async def on_frame(self, frame: bytes) -> None:
+        self.last_seen = time.monotonic()
+        frame_type = frame[0]
+
+        if frame_type == ITEM:
+            self._on_item(frame[1], memoryview(frame)[_item.size:])
+
+            if self._consume_on_item:
+                self.consumed()
+        elif frame_type == CREDIT:
+            self._credits += _credit.unpack(frame)[1]
+            self._credits_available.set()
+        elif frame_type == PING:
+            await self.send(_ping.pack(PONG, _ping.unpack(frame)[1]))
+        elif frame_type == PONG:
+            self.rtt = time.monotonic() - _ping.unpack(frame)[1]
+        else:
+            logger.warning(f"Unknown frame type {frame_type}, ignored")
+
+    async def keepalive(self, close: Callable[[], Awaitable]) -> None:
+        """ Send PINGs, close the stream if the other side is silent """
+        while True:
+            await asyncio.sleep(self.heartbeat)
+
+            if time.monotonic() - self.last_seen > self.heartbeat * _MAX_MISSED_HEARTBEATS:
+                logger.warning(f"Stream silent for {_MAX_MISSED_HEARTBEATS} heartbeats, closing")
+                await close()
+                return
+
+            await self.send(_ping.pack(PING, time.monotonic()))
+
+
+def _notification2frame(notification) -> Tuple[int, Any]:
+    if isinstance(notification, OnNext):
+        return NEXT, notification.value
+    elif isinstance(notification, OnError):
+        return ERROR, notification.exception
+
+    return COMPLETED, None
+
+
+def _frame2notification(notification: int, value: Any):
+    if notification == NEXT:
+        return OnNext(value)
+    elif notification == ERROR:
+        return OnError(value)
+
+    return OnCompleted()
+
+
+async def serve_element(websocket,
+                        element,
+                        deserializer: Callable[[bytes], Any],
+                        subscribe: bool = False,
+                        serializer: Callable[[Any], bytes] | None = None,
+                        window: int = 256,
+                        buffer: int = 1024,
+                        heartbeat: float = 10) -> None:
+    """Serve an accepted (starlette) `websocket`: received items are pushed (in order) into `element.port_in`,
+    and with `subscribe` the `element.port_out` is streamed back.
+
+    Args:
+        buffer: Max `port_out` items waiting for credits, the oldest are dropped.
+    """
+    serializer = serializer or encoder(Pickled)
+    queue: asyncio.Queue = asyncio.Queue()
+    port_in = element.port_in
+
+    def notify(notification: int, value: Any):
+        if notification == NEXT:
+            port_in.on_next(value)
+        elif notification == ERROR:
+            port_in.on_error(value)
+        else:
+            port_in.on_completed()
+
+    def notify_and_consume(notification: int, value: Any):
+        try:
+            notify(notification, value)
+        finally:
+            # Credit back once pushed into the port (ie. backpressure of the MAPE loop)
+            consumed()
+
+    def on_item(notification: int, payload: memoryview):
+        try:
+            value = deserializer(decompress(payload)) if notification != COMPLETED else None
+        except Exception:
+            protocol.consumed()
+            raise
+
+        bridge.to_mape_loop(notify_and_consume, notification, value)
+
+    protocol = StreamProtocol(websocket.send_bytes, on_item, window=window, heartbeat=heartbeat,
+                              consume_on_item=False)
+    consumed = bridge.to_server_loop(protocol.consumed)
+
+    def on_port_out(notification):
+        if queue.qsize() >= buffer:
+            queue.get_nowait()
+            logger.debug(f"Stream of '{element.path}' full, oldest item dropped")
+
+        queue.put_nowait(notification)
+
+    async def writer():
+        while True:
+            notification, value = _notification2frame(await queue.get())
+            await protocol.send_item(notification, compress(serializer(value)))
+
+    async def close():
+        await websocket.close()
+
+    disposable = element.port_out.pipe(ops.materialize()).subscribe(bridge.to_server_loop(on_port_out)) \
+        if subscribe else Disposable()
+    tasks = [asyncio.create_task(task_exception(protocol.keepalive(close)))]
+    if subscribe:
+        tasks.append(asyncio.create_task(task_exception(writer())))
+
+    try:
+        await protocol.grant()
+
+        while True:
+            message = await websocket.receive()
+
+            if message['type'] == 'websocket.disconnect':
+                break
+            elif message.get('bytes') is not None:
+                await protocol.on_frame(message['bytes'])
+    finally:
+        protocol.close()
+        disposable.dispose()
+        for task in tasks:
+            task.cancel()
+
+
+class _StreamClient:
+    """ Client side connection (reconnecting), shared by `WSObserver` and `WSObservable` """
+
+    def __init__(self, base_url: str, path: str, session: aiohttp.ClientSession | None, subscribe: bool,
+                 on_item: Callable[[int, memoryview], Any], window: int, heartbeat: float,
+                 backoff: float = 0.5, max_backoff: float = 30) -> None:
+        try:
+            self._path = path if path.startswith('/') else _element_path2url_path(path)
+        except ValueError:
+            logger.error(f"Malformed element_path: '{path}'")
+            raise
+
+        self._session = session or aiohttp.ClientSession(base_url)
+        self._own_session = session is None
+        self._subscribe = subscribe
+        self._on_item = on_item
+        self._window = window
+        self._heartbeat = heartbeat
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+
+        self.protocol: StreamProtocol | None = None
+        self.connected = asyncio.Event()
+        self._ws: aiohttp.ClientWebSocketResponse | None = None
+        self._closed = False
+        self._established = False
+
+    async def run(self) -> None:
+        """ Stream until `close()`, reconnecting with exponential backoff """
+        delay = self._backoff
+
+        while not self._closed:
+            self._established = False
+            try:
+                await self._run()
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                logger.warning(f"Stream '{self._path}': {e!r}")
+            finally:
+                self.connected.clear()
+                if self.protocol is not None:
+                    self.protocol.close()
+
+            if self._closed:
+                break
+
+            # Backoff restarts after a working connection
+            if self._established:
+                delay = self._backoff
+            self.protocol = None
+
+            logger.info(f"Stream '{self._path}' lost, reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_backoff)
+
+    async def _run(self) -> None:
+        params = {'subscribe': 'true' if self._subscribe else 'false'}
+
+        async with self._session.ws_connect(self._path, params=params, heartbeat=None) as ws:
+            self._ws = ws
+            self.protocol = StreamProtocol(ws.send_bytes, self._on_item, window=self._window, heartbeat=self._heartbeat)
+            keepalive = asyncio.create_task(task_exception(self.protocol.keepalive(ws.close)))
+
+            try:
+                if self._subscribe:
+                    await self.protocol.grant()
+
+                self.connected.set()
+                self._established = True
+
+                async for message in ws:
+                    if message.type == aiohttp.WSMsgType.BINARY:
+                        await self.protocol.on_frame(message.data)
+                    elif message.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSE):
+                        break
+            finally:
+                keepalive.cancel()
+
+    async def close(self) -> None:
+        self._closed = True
+
+        if self._ws is not None:
+            await self._ws.close()
+
+        if self._own_session:
+            await self._session.close()
+
+
+class WSObserver(Observer):
+    """Sink streaming items into the `port_in` of a remote element, over a single WebSocket.
+
+    Items are sent in order, as soon as the remote element grants credits. Up to `buffer` items wait
+    for credits (or reconnection), then the oldest are dropped.
+
+    Examples:
+        ```python
+        detect.subscribe(WSObserver("http://0.0.0.0:6060", "ambulance.policy"))
+        ```
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 path: str,
+                 serializer=None,
+                 session: aiohttp.ClientSession = None,
+                 window: int = 256,
+                 heartbeat: float = 10,
+                 buffer: int = 1024) -> None:
+        self._serializer = serializer or encoder(Pickled)
+        self._queue: Deque[Tuple[int, Any]] = deque(maxlen=buffer)
+        self._available = asyncio.Event()
+        self._client = _StreamClient(base_url, path, session, False, lambda *_: None, window, heartbeat)
+
+        self._task = asyncio.create_task(self._stream())
+        super().__init__()
+
+    def _put(self, notification: int, value: Any) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            logger.debug("WSObserver buffer full, oldest item dropped")
+
+        self._queue.append((notification, value))
+        self._available.set()
+
+    def _on_next_core(self, value: Any) -> None:
+        self._put(NEXT, value)
+
+    def _on_error_core(self, error: Exception) -> None:
+        self._put(ERROR, error)
+
+    def _on_completed_core(self) -> None:
+        self._put(COMPLETED, None)
+
+    async def _send_queue(self) -> None:
+        while True:
+            await self._client.connected.wait()
+            protocol = self._client.protocol
+
+            try:
+                while True:
+                    while not self._queue:
+                        self._available.clear()
+                        await self._available.wait()
+
+                    # Removed once sent (ie. kept across reconnection)
+                    item = self._queue[0]
+
+                    try:
+                        payload = compress(self._serializer(item[1]))
+                    except Exception as e:
+                        # Not serializable, the stream goes on
+                        logger.error(f"WSObserver item not serializable, dropped: {e!r}")
+                    else:
+                        await protocol.send_item(item[0], payload)
+
+                    if self._queue and self._queue[0] is item:
+                        self._queue.popleft()
+            except (ConnectionError, aiohttp.ClientError):
+                # Wait for the reconnection
+                while self._client.protocol is protocol and self._client.connected.is_set():
+                    await asyncio.sleep(0.1)
+
+    @log_task_exception
+    async def _stream(self) -> None:
+        sender = asyncio.create_task(task_exception(self._send_queue()))
+
+        try:
+            await self._client.run()
+        finally:
+            sender.cancel()
+
+    def dispose(self) -> None:
+        self._task.cancel()
+        asyncio.create_task(task_exception(self._client.close()))
+        super().dispose()
+
+
+class WSObservable(Observable):
+    """Source streaming the `port_out` of a remote element, over a single WebSocket.
+
+    Examples:
+        ```python
+        WSObservable("http://0.0.0.0:6060", "car_panda.detect").subscribe(policy)
+        ```
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 path: str,
+                 deserializer=None,
+                 session: aiohttp.ClientSession = None,
+                 window: int = 256,
+                 heartbeat: float = 10) -> None:
+        self._deserializer = deserializer or decoder(Pickled)
+        self._client = None
+        self._task = None
+
+        def on_subscribe(observer, scheduler):
+            def on_item(notification: int, payload: memoryview):
+                value = self._deserializer(decompress(payload)) if notification != COMPLETED else None
+                observer.on_next(_frame2notification(notification, value))
+
+            self._client = _StreamClient(base_url, path, session, True, on_item, window, heartbeat)
+            self._task = asyncio.create_task(task_exception(self._client.run()))
+
+            return Disposable(self.unsubscribe)
+
+        self._auto_connect = rx.create(on_subscribe).pipe(ops.dematerialize(), ops.share())
+        super().__init__()
+
+    def _subscribe_core(self, observer, scheduler=None):
+        return self._auto_connect.subscribe(observer, scheduler=scheduler)
+
+    def unsubscribe(self):
+        if self._task is not None:
+            self._task.cancel()
+            asyncio.create_task(task_exception(self._client.close()))
@@ -0,0 +1,238 @@
+"""Disk-backed spill queue (write-ahead) for sinks whose backend is slow or unreachable.
+
+Records are appended to segment files (`<index>.seg`, length-prefixed records), and consumed from a
+checkpoint (`checkpoint`, segment index and offset), replaced atomically on commit. Segments fully
+consumed are deleted, and over `max_bytes` the oldest ones are dropped (ie. disk quota). The queue
+survives restarts, a record truncated by a crash is ignored.
+
+The methods do blocking file I/O: from the asyncio loop call them in an executor (see `InfluxWriter`).
+"""
+from __future__ import annotations
+
+import os
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_record = struct.Struct('<I')
+_checkpoint = struct.Struct('<QQ')
+
+SEGMENT_SUFFIX = '.seg'
+CHECKPOINT_NAME = 'checkpoint'
+
+# Segment index and offset
+Position = Tuple[int, int]
+
+
+class SpillQueue:
+    """Append-only segments with a checkpoint (thread safe).
+
+    Examples:
+        ```python
+        spill = SpillQueue('/var/lib/mape/spill/influxdb', max_bytes=512 * 2**20)
+        spill.append(b'car value=87.5 1670000000000000000')
+
+        records, position = spill.read(100)
+        # ... records delivered
+        spill.commit(position)
+        ```
+
+    Args:
+        path: Directory of the segments (created if not exist).
+        max_bytes: Disk quota, the oldest segments are dropped when exceeded.
+        segment_bytes: Segment size before starting a new one.
+        fsync: Sync each append to disk (safe on power loss, slower).
+    """
+
+    def __init__(self,
+                 path: str | Path,
+                 max_bytes: int = 256 * 2**20,
+                 segment_bytes: int = 8 * 2**20,
+                 fsync: bool = False) -> None:
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._segment_bytes = min(segment_bytes, max_bytes)
+        self._fsync = fsync
+        self._lock = threading.RLock()
+
+        # Bytes dropped by the quota
+        self.dropped_bytes = 0
+
+        self._sizes = {self._segment_index(file): file.stat().st_size
+                       for file in self._path.glob(f"*{SEGMENT_SUFFIX}")}
+        self._position = self._load_checkpoint()
+
+        if not self._sizes:
+            self._sizes[self._position[0]] = 0
+
+        self._writing = max(self._sizes)
+        self._repair(self._writing)
+        self._file = open(self._segment_path(self._writing), 'ab')
+
+    @staticmethod
+    def _segment_index(file: Path) -> int:
+        return int(file.stem)
+
+    def _segment_path(self, index: int) -> Path:
+        return self._path / f"{index:016d}{SEGMENT_SUFFIX}"
+
+    def _load_checkpoint(self) -> Position:
+        try:
+            segment, offset = _checkpoint.unpack((self._path / CHECKPOINT_NAME).read_bytes())
+        except (FileNotFoundError, struct.error):
+            return min(self._sizes, default=0), 0
+
+        # Segments before the checkpoint not yet deleted (eg. crash on commit)
+        for index in [index for index in self._sizes if index < segment]:
+            self._remove_segment(index)
+
+        return segment, offset
+
+    def _repair(self, index: int) -> None:
+        """ Truncate a record partially written (eg. crash), the next appends would be unreadable """
+        path = self._segment_path(index)
+        if not path.exists():
+            return
+
+        data = memoryview(path.read_bytes())
+        pos = 0
+        while pos + _record.size <= len(data):
+            length, = _record.unpack_from(data, pos)
+            if pos + _record.size + length > len(data):
+                break
+            pos += _record.size + length
+
+        if pos < len(data):
+            logger.warning(f"Spill segment {index} truncated at byte {pos} (partial record)")
+            os.truncate(path, pos)
+            self._sizes[index] = pos
+
+    def _remove_segment(self, index: int) -> None:
+        self._segment_path(index).unlink(missing_ok=True)
+        self._sizes.pop(index, None)
+
+    @property
+    def size(self) -> int:
+        """ Bytes on disk """
+        return sum(self._sizes.values())
+
+    @property
+    def empty(self) -> bool:
+        with self._lock:
+            segment, offset = self._position
+            return segment == self._writing and offset >= self._sizes[segment]
+
+    def append(self, record: bytes) -> None:
+        self.extend((record,))
+
+    def extend(self, records) -> None:
+        data = b''.join(_record.pack(len(record)) + record for record in records)
+
+        with self._lock:
+            # Before the quota, the queued records are kept
+            if len(data) > self._max_bytes:
+                self.dropped_bytes += len(data)
+                logger.warning(f"Spill of {len(data)} bytes larger than the quota, dropped")
+                return
+
+            if self._sizes[self._writing] and self._sizes[self._writing] + len(data) > self._segment_bytes:
+                self._new_segment()
+
+            self._enforce_quota(len(data))
+            self._file.write(data)
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+
+            self._sizes[self._writing] += len(data)
+
+    def _new_segment(self) -> None:
+        self._file.close()
+        self._writing += 1
+        self._sizes[self._writing] = 0
+        self._file = open(self._segment_path(self._writing), 'ab')
+
+    def _enforce_quota(self, incoming: int) -> None:
+        while self.size + incoming > self._max_bytes and len(self._sizes) > 1:
+            oldest = min(self._sizes)
+            self.dropped_bytes += self._sizes[oldest]
+            logger.warning(f"Spill quota exceeded, segment {oldest} ({self._sizes[oldest]} bytes) dropped")
+
+            self._remove_segment(oldest)
+            if self._position[0] <= oldest:
+                self._position = (min(self._sizes), 0)
+                self._write_checkpoint()
+
+    def read(self, max_records: int) -> Tuple[List[bytes], Position]:
+        """ Next records (from the checkpoint) and the position after them, to `commit` when delivered """
+        records, position = self.read_each(max_records)
+        return [record for record, _ in records], position
+
+    def read_each(self, max_records: int) -> Tuple[List[Tuple[bytes, Position]], Position]:
+        """ As `read`, with the position after each record (ie. to `commit` them one at a time) """
+        with self._lock:
+            segment, offset = self._position
+            records = []
+
+            while len(records) < max_records:
+                if segment not in self._sizes:
+                    break
+
+                with open(self._segment_path(segment), 'rb') as file:
+                    file.seek(offset)
+                    data = file.read(self._sizes[segment] - offset)
+
+                view, pos = memoryview(data), 0
+                while len(records) < max_records and pos + _record.size <= len(view):
+                    length, = _record.unpack_from(view, pos)
+                    if pos + _record.size + length > len(view):
+                        break
+
+                    record = bytes(view[pos + _record.size:pos + _record.size + length])
+                    pos += _record.size + length
+                    records.append((record, (segment, offset + pos)))
+
+                offset += pos
+
+                if len(records) >= max_records or segment == self._writing:
+                    break
+
+                # Next segment (a truncated tail record is skipped)
+                segment, offset = segment + 1, 0
+
+            return records, (segment, offset)
+
+    def commit(self, position: Position) -> None:
+        """ Records before `position` are delivered """
+        with self._lock:
+            # Already dropped by the quota
+            if position < self._position:
+                return
+
+            self._position = position
+            self._write_checkpoint()
+
+            for index in [index for index in self._sizes if index < position[0]]:
+                self._remove_segment(index)
+
+            # All consumed: restart the writing segment
+            if self.empty and self._sizes[self._writing]:
+                self._file.close()
+                self._file = open(self._segment_path(self._writing), 'wb')
+                self._sizes[self._writing] = 0
+                self._position = (self._writing, 0)
+                self._write_checkpoint()
+
+    def _write_checkpoint(self) -> None:
+        tmp = self._path / f"{CHECKPOINT_NAME}.tmp"
+        tmp.write_bytes(_checkpoint.pack(*self._position))
+        os.replace(tmp, self._path / CHECKPOINT_NAME)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
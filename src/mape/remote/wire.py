@@ -0,0 +1,246 @@
+"""Compact binary wire format for `Message` and `CallMethod`.
+
+Layout (little-endian):
+
+    header  | MAGIC (4 bytes) | stream (u32) | epoch (u16) | kind (u8) | flags (u8) |
+    fields  | src (u16) | dst (u16) | name (u16) | hops (u32) | timestamp (i64 microseconds, or f64) |
+    paths   | count (u8) | first index (u16) | count * (length (u16), utf-8 path) |
+    padding | 0-7 bytes (aligned out-of-band buffers) |
+    value   | Pickled `value` (Message) or `(args, kwargs)` (CallMethod) |
+
+Element paths (and method names) are interned per stream (ie. each `WireEncoder`, one per connection):
+sent once as string, then as index. The sender starts a new epoch (ie. a new table) every `resync`
+items or `resync_interval` seconds, so receivers joining late (eg. Redis pub/sub) learn the table again.
+Until then, their items referring to paths sent before they joined are dropped (`LateJoin`).
+
+Items wrapped in a materialized `OnNext` notification (ie. as published by `PubObserver`) are encoded
+the same way. Receivers don't need any configuration: the format is decoded by the default `Pickled` codec.
+"""
+from __future__ import annotations
+
+import time
+import random
+import struct
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple, Callable
+
+from rx.core.notification import OnNext
+
+from mape.typing import Message, CallMethod
+from mape.remote.de_serializer import encoder, decoder, register_frame, Pickled
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'\x00MW1'
+
+# header and fields, with timestamp as integer microseconds or float
+_fixed_int = struct.Struct('<4sIHBBHHHIq')
+_fixed_float = struct.Struct('<4sIHBBHHHId')
+_FLAGS_OFFSET = 11
+_paths = struct.Struct('<BH')
+_path_len = struct.Struct('<H')
+_NO_PATHS = _paths.pack(0, 0)
+
+_KIND_MESSAGE = 0
+_KIND_CALL_METHOD = 1
+_FLAG_TS_FLOAT = 0x01
+# Padding length is in the flags bits 1-3
+_PADDING_SHIFT = 1
+_PADDING_MASK = 0x0E
+# Item wrapped in a (materialized) OnNext notification (eg. `PubObserver`)
+_FLAG_ON_NEXT = 0x10
+
+_NONE = 0xFFFF
+_MAX_PATHS = 0xFFFF - 3
+_ALIGN = 8
+# Receiver side tables kept (LRU), one for each sender stream
+_MAX_STREAMS = 1024
+
+_kinds = {Message: _KIND_MESSAGE, CallMethod: _KIND_CALL_METHOD}
+# Number of instance attributes (ie. dataclass fields), others can't be encoded
+_kind_fields = {_KIND_MESSAGE: 5, _KIND_CALL_METHOD: 7}
+_path_types = (str, type(None))
+
+_pickled_encode, _pickled_decode = encoder(Pickled), decoder(Pickled)
+
+
+class LateJoin(ValueError):
+    """ Item referring to paths sent before the receiver joined the stream (ie. wait for the next epoch) """
+    pass
+
+
+class WireEncoder:
+    """Encode `Message` and `CallMethod` in the compact format, other items by `fallback`.
+
+    Use one encoder for each connection (ie. sink).
+
+    Examples:
+        ```python
+        detect.subscribe(PubObserver(detect.path, serializer=WireEncoder()))
+        ```
+    """
+
+    def __init__(self,
+                 resync: int = 100,
+                 resync_interval: float = 1,
+                 fallback: Callable[[Any], bytes] = None) -> None:
+        self._resync = resync
+        self._resync_interval = resync_interval
+        self._fallback = fallback or _pickled_encode
+
+        self._stream = random.getrandbits(32)
+        self._epoch = 0
+        self._table: Dict[str, int] = dict()
+        self._count = 0
+        self._epoch_start = time.monotonic()
+
+    def _new_epoch(self) -> None:
+        self._epoch = (self._epoch + 1) & 0xFFFF
+        self._table.clear()
+        self._count = 0
+        self._epoch_start = time.monotonic()
+
+    def _intern(self, path: str | None, new_paths: List[bytes]) -> int:
+        if path is None:
+            return _NONE
+
+        try:
+            return self._table[path]
+        except KeyError:
+            index = self._table[path] = len(self._table)
+            new_paths.append(path.encode())
+            return index
+
+    @staticmethod
+    def _encodable(item: Any, kind: int) -> bool:
+        return (len(item.__dict__) == _kind_fields[kind]
+                and type(item.src) in _path_types
+                and type(item.dst) in _path_types
+                and type(item.hops) is int and 0 <= item.hops <= 0xFFFFFFFF
+                and type(item.timestamp) is float
+                and (kind == _KIND_MESSAGE or type(item.name) is str))
+
+    def encode(self, item: Any) -> bytes:
+        notification = item
+
+        if on_next := type(item) is OnNext and len(item.__dict__) == 3:
+            item = item.value
+
+        kind = _kinds.get(type(item))
+
+        if kind is None or not self._encodable(item, kind):
+            return self._fallback(notification)
+
+        if (self._count >= self._resync or len(self._table) >= _MAX_PATHS
+                or time.monotonic() - self._epoch_start >= self._resync_interval):
+            self._new_epoch()
+
+        self._count += 1
+        first_index = len(self._table)
+        new_paths: List[bytes] = []
+
+        src = self._intern(item.src, new_paths)
+        dst = self._intern(item.dst, new_paths)
+
+        if kind == _KIND_CALL_METHOD:
+            name = self._intern(item.name, new_paths)
+            raw_value = _pickled_encode((item.args, item.kwargs))
+        else:
+            name = _NONE
+            raw_value = _pickled_encode(item.value)
+
+        if new_paths:
+            chunks = [_paths.pack(len(new_paths), first_index)]
+
+            for raw_path in new_paths:
+                chunks.append(_path_len.pack(len(raw_path)))
+                chunks.append(raw_path)
+
+            raw_paths = b''.join(chunks)
+        else:
+            raw_paths = _NO_PATHS
+
+        # Align only out-of-band buffers (ie. framed value)
+        padding = -(_fixed_int.size + len(raw_paths)) % _ALIGN if raw_value[:1] == b'\x00' else 0
+        flags = padding << _PADDING_SHIFT | (_FLAG_ON_NEXT if on_next else 0)
+
+        # Integer microseconds, if the float is restored exactly
+        timestamp = item.timestamp
+        timestamp_us = round(timestamp * 1e6)
+
+        if timestamp_us / 1e6 == timestamp:
+            fixed = _fixed_int.pack(MAGIC, self._stream, self._epoch, kind, flags,
+                                    src, dst, name, item.hops, timestamp_us)
+        else:
+            fixed = _fixed_float.pack(MAGIC, self._stream, self._epoch, kind, flags | _FLAG_TS_FLOAT,
+                                      src, dst, name, item.hops, timestamp)
+
+        return b''.join((fixed, raw_paths, b'\x00' * padding, raw_value))
+
+    def __call__(self, item: Any) -> bytes:
+        return self.encode(item)
+
+
+# stream => (epoch, interned paths)
+_streams: OrderedDict[int, Tuple[int, Dict[int, str]]] = OrderedDict()
+
+
+def _stream_table(stream: int, epoch: int) -> Dict[int, str]:
+    try:
+        table_epoch, table = _streams[stream]
+        _streams.move_to_end(stream)
+
+        if table_epoch == epoch:
+            return table
+    except KeyError:
+        if len(_streams) >= _MAX_STREAMS:
+            _streams.popitem(last=False)
+
+    table = dict()
+    _streams[stream] = (epoch, table)
+    return table
+
+
+def decode(raw_item: bytes | memoryview) -> Message | CallMethod | OnNext:
+    flags = raw_item[_FLAGS_OFFSET]
+    fixed = _fixed_float if flags & _FLAG_TS_FLOAT else _fixed_int
+    _, stream, epoch, kind, flags, src, dst, name, hops, timestamp = fixed.unpack_from(raw_item)
+
+    if not flags & _FLAG_TS_FLOAT:
+        timestamp /= 1e6
+
+    table = _stream_table(stream, epoch)
+    count, index = _paths.unpack_from(raw_item, fixed.size)
+    pos = fixed.size + _paths.size
+
+    for index in range(index, index + count):
+        length, = _path_len.unpack_from(raw_item, pos)
+        pos += _path_len.size
+        table[index] = bytes(raw_item[pos:pos + length]).decode()
+        pos += length
+
+    pos += (flags & _PADDING_MASK) >> _PADDING_SHIFT
+    # Zero copy value (eg. out-of-band buffers)
+    value = _pickled_decode(memoryview(raw_item)[pos:])
+
+    try:
+        src = None if src == _NONE else table[src]
+        dst = None if dst == _NONE else table[dst]
+
+        if kind == _KIND_CALL_METHOD:
+            item = CallMethod(src=src, dst=dst, hops=hops, timestamp=timestamp,
+                              name=table[name], args=value[0], kwargs=value[1])
+        else:
+            item = Message(src=src, dst=dst, hops=hops, timestamp=timestamp, value=value)
+    except KeyError as e:
+        if 0 not in table:
+            # Joined after the start of the epoch (the first item always sends path #0)
+            raise LateJoin(f"Path #{e.args[0]} of stream {stream:08x} sent before joining (waiting the resync)")
+
+        raise ValueError(f"Unknown path #{e.args[0]} of stream {stream:08x}")
+
+    return OnNext(item) if flags & _FLAG_ON_NEXT else item
+
+
+register_frame(MAGIC, decode)
@@ -0,0 +1,212 @@
+"""State of the rolling statistics operators (see `mape.operators.rolling_mean` and siblings).
+
+Each state updates in O(1) for an item (running sums over a NumPy ring buffer), and for a batch
+of values (eg. from `buffer_with_count`) computes the statistic at each position with vectorized
+math (cumulative sums, sliding views), then appends the whole batch at once.
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class RollingWindow:
+    """Last `size` values, with running sum and sum of squares.
+
+    The values are written twice (at `i` and `i + size`), so the window is always a contiguous view.
+    """
+
+    def __init__(self, size: int) -> None:
+        if size < 1:
+            raise ValueError(f"Window size must be positive, given {size}")
+
+        self.size = size
+        self._buffer = np.zeros(2 * size)
+        self._start = 0
+        self._len = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        # Updates before recomputing the sums (ie. floating point drift)
+        self._resync = size
+
+    def __len__(self):
+        return self._len
+
+    def view(self) -> np.ndarray:
+        return self._buffer[self._start:self._start + self._len]
+
+    def push(self, value: float) -> None:
+        size = self.size
+
+        if self._len == size:
+            oldest = self._buffer[self._start]
+            self._sum -= oldest
+            self._sumsq -= oldest * oldest
+            pos = self._start
+            self._start = (self._start + 1) % size
+        else:
+            pos = (self._start + self._len) % size
+            self._len += 1
+
+        self._buffer[pos] = self._buffer[pos + size] = value
+        self._sum += value
+        self._sumsq += value * value
+
+        self._resync -= 1
+        if not self._resync:
+            self._recompute()
+
+    def extend(self, values: np.ndarray) -> None:
+        """ Append a batch (vectorized) """
+        values = values[-self.size:]
+        window = np.concatenate((self.view(), values))[-self.size:]
+
+        self._len = len(window)
+        self._start = 0
+        self._buffer[:self._len] = window
+        self._buffer[self.size:self.size + self._len] = window
+        self._recompute()
+
+    def _recompute(self) -> None:
+        window = self.view()
+        self._sum = float(window.sum())
+        self._sumsq = float(window @ window)
+        self._resync = self.size
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._len if self._len else math.nan
+
+    @property
+    def var(self) -> float:
+        if not self._len:
+            return math.nan
+
+        mean = self._sum / self._len
+        return max(self._sumsq / self._len - mean * mean, 0.0)
+
+    def quantile(self, q: float) -> float:
+        return float(np.quantile(self.view(), q)) if self._len else math.nan
+
+    def _extended(self, values: np.ndarray) -> np.ndarray:
+        # Window before the batch, then the batch
+        return np.concatenate((self.view(), values))
+
+    def batch_mean_var(self, values: np.ndarray):
+        """ Mean and variance of the window ending at each value of the batch, then append it """
+        extended = self._extended(values)
+        # Shifted, for the precision of the sums of squares
+        shifted = extended - (extended.mean() if len(extended) else 0)
+
+        sums = np.concatenate(([0.0], np.cumsum(shifted)))
+        sumsqs = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+
+        ends = np.arange(len(extended) - len(values) + 1, len(extended) + 1)
+        starts = np.maximum(ends - self.size, 0)
+        counts = ends - starts
+
+        means = (sums[ends] - sums[starts]) / counts
+        variances = np.maximum((sumsqs[ends] - sumsqs[starts]) / counts - means * means, 0.0)
+
+        self.extend(values)
+        return means + (extended.mean() if len(extended) else 0), variances
+
+    def batch_quantile(self, values: np.ndarray, q: float) -> np.ndarray:
+        """ Quantile of the window ending at each value of the batch, then append it """
+        extended = self._extended(values)
+        first_end = len(extended) - len(values) + 1
+        quantiles = np.empty(len(values))
+
+        # Partial windows (ie. less than `size` values seen)
+        partial = min(max(self.size - first_end, 0), len(values))
+        for i in range(partial):
+            quantiles[i] = np.quantile(extended[:first_end + i], q)
+
+        if partial < len(values):
+            windows = sliding_window_view(extended, self.size)[first_end + partial - self.size:]
+            quantiles[partial:] = np.quantile(windows, q, axis=1)
+
+        self.extend(values)
+        return quantiles
+
+
+class Ewma:
+    """ Exponentially weighted moving average, `alpha` the weight of the new value """
+
+    def __init__(self, alpha: float) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError(f"Alpha must be in (0, 1], given {alpha}")
+
+        self.alpha = alpha
+        self.value: float | None = None
+
+        # Batch chunk keeping (1 - alpha) ** -chunk far from overflow
+        decay = 1 - alpha
+        self._chunk = max(int(150 / -math.log10(decay)), 1) if decay > 0 else 1
+
+    def update(self, value: float) -> float:
+        self.value = value if self.value is None else self.value + self.alpha * (value - self.value)
+        return self.value
+
+    def update_batch(self, values: np.ndarray) -> np.ndarray:
+        """ Average after each value of the batch (closed form of the recurrence, by chunks) """
+        results = np.empty(len(values))
+        decay = 1 - self.alpha
+
+        for begin in range(0, len(values), self._chunk):
+            chunk = values[begin:begin + self._chunk]
+            if self.value is None:
+                self.value = float(chunk[0])
+
+            if decay == 0:
+                results[begin:begin + len(chunk)] = chunk
+            else:
+                # y_t = decay^t * y_0 + alpha * sum(decay^(t-i) * x_i)
+                powers = decay ** np.arange(1, len(chunk) + 1)
+                results[begin:begin + len(chunk)] = powers * (self.value + self.alpha * np.cumsum(chunk / powers))
+
+            self.value = float(results[begin + len(chunk) - 1])
+
+        return results
+
+
+class RateOfChange:
+    """ Change per second (or per item without timestamps) from the previous value """
+
+    def __init__(self) -> None:
+        self._value: float | None = None
+        self._timestamp: float | None = None
+
+    def update(self, value: float, timestamp: float | None = None) -> float:
+        if self._value is None:
+            rate = math.nan
+        elif timestamp is None or self._timestamp is None:
+            rate = value - self._value
+        else:
+            elapsed = timestamp - self._timestamp
+            rate = (value - self._value) / elapsed if elapsed else math.nan
+
+        self._value, self._timestamp = value, timestamp
+        return rate
+
+    def update_batch(self, values: np.ndarray, timestamps: np.ndarray | None = None) -> np.ndarray:
+        previous = math.nan if self._value is None else self._value
+        deltas = np.diff(values, prepend=previous)
+
+        if timestamps is not None and not np.isnan(timestamps).any():
+            previous_timestamp = math.nan if self._timestamp is None else self._timestamp
+            elapsed = np.diff(timestamps, prepend=previous_timestamp)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates = np.where(elapsed != 0, deltas / elapsed, math.nan)
+
+            # Previous value without timestamp: the difference (as `update`)
+            if self._timestamp is None:
+                rates[0] = deltas[0]
+            deltas = rates
+
+        self._value = float(values[-1])
+        self._timestamp = float(timestamps[-1]) if timestamps is not None else None
+        return deltas
@@ -0,0 +1,303 @@
+"""Routing index of the destination paths (eg. `item.dst`), used by the `gateway` operator.
+
+Each `App` keeps its `RoutingTable` (`app.routes`) up to date as loops and elements are registered
+(or moved), so routing an item is a single dict lookup instead of splitting the path and walking the
+loops and elements. Other routes, also with wildcard patterns (eg. `*.policy`), and more observers
+for the same path (ie. multicast) can be added; each path resolution is an immutable tuple, cached.
+
+`ContentRouter` routes by the item content (eg. region, vehicle class, value thresholds), used by the
+`content_router` operator. Its rules are compiled into indexes for each attribute: a dict for the
+equality predicates, and the sorted bounds of the ranges (with the rules covering each interval
+between them) for a bisect. Each index gives the matching rules as a bitset (an int), and matching
+an item is the intersection of the bitsets of its attributes, without evaluating each predicate.
+"""
+from __future__ import annotations
+
+import re
+import fnmatch
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+# Max cached resolutions of paths matched by patterns, cleared when exceeded
+MAX_CACHED_PATHS = 65536
+
+Observers = Tuple[Any, ...]
+
+
+class RoutingTable:
+    """Paths (or `fnmatch` patterns) to observers.
+
+    Examples:
+        ```python
+        mape.app.routes.add("*.policy", audit)       # multicast: every policy, and audit
+        mape.app.routes.resolve("ambulance.policy")  # (ambulance.policy, audit)
+        ```
+    """
+
+    def __init__(self) -> None:
+        self._exact: Dict[str, List[Any]] = dict()
+        self._patterns: Dict[str, Tuple[re.Pattern, List[Any]]] = dict()
+        self._resolved: Dict[str, Observers] = dict()
+
+    @staticmethod
+    def is_pattern(path: str) -> bool:
+        return any(char in path for char in '*?[')
+
+    def add(self, path: str, *observers) -> None:
+        if self.is_pattern(path):
+            _, targets = self._patterns.setdefault(path, (re.compile(fnmatch.translate(path)), []))
+        else:
+            targets = self._exact.setdefault(path, [])
+
+        targets.extend(observer for observer in observers if observer not in targets)
+        self._resolved.clear()
+
+    def remove(self, path: str, observer=None) -> None:
+        """ Remove `observer` from the path (or pattern), all the observers when `None` """
+        table = self._patterns if path in self._patterns else self._exact
+        if path not in table:
+            return
+
+        targets = table[path][1] if table is self._patterns else table[path]
+        if observer is not None and observer in targets:
+            targets.remove(observer)
+
+        if observer is None or not targets:
+            del table[path]
+
+        self._resolved.clear()
+
+    def add_element(self, element) -> None:
+        self.add(element.path, element)
+
+    def remove_element(self, element) -> None:
+        self.remove(element.path, element)
+
+    def add_loop(self, loop) -> None:
+        for element in loop:
+            self.add_element(element)
+
+    def remove_loop(self, loop) -> None:
+        """ Remove the elements of the loop (call it before the loop uid changes) """
+        for element in loop:
+            self.remove_element(element)
+
+    def resolve(self, path: str) -> Observers | None:
+        """ Observers of the path (exact and matching patterns), `None` if not routed """
+        try:
+            return self._resolved[path]
+        except KeyError:
+            pass
+        except TypeError:
+            # Not hashable
+            return None
+
+        if not isinstance(path, str):
+            return None
+
+        targets = list(self._exact.get(path, ()))
+        for regex, observers in self._patterns.values():
+            if regex.match(path):
+                targets.extend(observer for observer in observers if observer not in targets)
+
+        resolved = tuple(targets) or None
+
+        if len(self._resolved) >= MAX_CACHED_PATHS:
+            self._resolved.clear()
+        self._resolved[path] = resolved
+
+        return resolved
+
+    def __contains__(self, path: str) -> bool:
+        return self.resolve(path) is not None
+
+    def __len__(self):
+        return len(self._exact) + len(self._patterns)
+
+
+class Range(NamedTuple):
+    """ Values in [low, high), `None` unbounded """
+    low: Any = None
+    high: Any = None
+
+
+class Rule:
+    """Destination(s) of the items matching all the conditions (by item attribute).
+
+    A condition is a value (equality, booleans never equal to numbers), a set/list/tuple (any of the values),
+    or a `Range`.
+
+    Examples:
+        ```python
+        Rule('north.exec', region='north', vehicle={'truck', 'van'}, value=Range(90))
+        ```
+
+    Args:
+        dest: Observer(s) or element path(s) (resolved as `gateway()` does).
+        name: Of the match statistics (default the destination).
+    """
+
+    def __init__(self, dest, name: str | None = None, **conditions) -> None:
+        self.dest = tuple(dest) if isinstance(dest, (list, tuple)) else (dest,)
+        self.name = name or ','.join(dest if isinstance(dest, str) else getattr(dest, 'path', repr(dest))
+                                     for dest in self.dest)
+        self.conditions = conditions
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name}, {self.conditions})"
+
+
+_MISSING = object()
+
+
+def _equality_key(value):
+    """ Key of a value in the equality index: booleans apart from the numbers (ie. `True == 1`) """
+    if isinstance(value, bool) or getattr(getattr(value, 'dtype', None), 'kind', None) == 'b':
+        return bool, bool(value)
+
+    return value
+
+
+class _AttributeIndex:
+    """ Rules matching the values of an attribute, as bitsets """
+
+    def __init__(self, rules: List[Rule], attribute: str) -> None:
+        self.equal: Dict[Any, int] = dict()
+        # Rules without condition on the attribute (ie. any value)
+        self.free = 0
+
+        ranges: List[Tuple[int, Range]] = []
+        for bit, rule in enumerate(rules):
+            if attribute not in rule.conditions:
+                self.free |= 1 << bit
+                continue
+
+            condition = rule.conditions[attribute]
+            if isinstance(condition, Range):
+                ranges.append((bit, condition))
+            else:
+                values = condition if isinstance(condition, (set, frozenset, list, tuple)) else (condition,)
+                for value in values:
+                    key = _equality_key(value)
+                    self.equal[key] = self.equal.get(key, 0) | 1 << bit
+
+        try:
+            self.bounds = sorted({bound for _, range_ in ranges for bound in range_ if bound is not None})
+        except TypeError as e:
+            raise ValueError(f"Ranges of '{attribute}' with bounds not comparable") from e
+
+        # Rules covering each interval: (-inf, bounds[0]), [bounds[0], bounds[1]), ..., [bounds[-1], inf)
+        self.intervals = [0] * (len(self.bounds) + 1)
+        for bit, (low, high) in ranges:
+            first = 0 if low is None else self.bounds.index(low) + 1
+            last = len(self.bounds) if high is None else self.bounds.index(high)
+
+            for interval in range(first, last + 1):
+                self.intervals[interval] |= 1 << bit
+
+    def match(self, value) -> int:
+        matched = self.free
+        if value is _MISSING:
+            return matched
+
+        try:
+            matched |= self.equal.get(_equality_key(value), 0)
+        except TypeError:
+            # Not hashable
+            pass
+
+        if self.bounds:
+            try:
+                matched |= self.intervals[bisect_right(self.bounds, value)]
+            except TypeError:
+                # Not comparable with the bounds
+                pass
+
+        return matched
+
+
+@dataclass
+class RouterStats:
+    items: int = 0
+    unmatched: int = 0
+    # Items matched by each rule (name)
+    matches: Dict[str, int] = field(default_factory=dict)
+
+
+class ContentRouter:
+    """Rules compiled into indexes, hot-swappable (`update()`) while routing.
+
+    Examples:
+        ```python
+        rules = ContentRouter([
+            Rule('north.exec', region='north'),
+            Rule('fleet.trucks', vehicle='truck', value=Range(90, 130)),
+        ])
+        rules.match(item)  # matching rules, in order
+        rules.stats.matches
+        ```
+
+    Args:
+        first_match: Only the first matching rule (ie. the rule order is the priority).
+    """
+
+    def __init__(self, rules: Iterable[Rule] = (), first_match: bool = False) -> None:
+        self.first_match = first_match
+        self._items = 0
+        self._unmatched = 0
+        self.update(rules)
+
+    def update(self, rules: Iterable[Rule]) -> None:
+        """ Compile and swap the rules (counters of rules with the same name are kept) """
+        rules = list(rules)
+        attributes = {attribute for rule in rules for attribute in rule.conditions}
+        indexes = tuple((attribute, _AttributeIndex(rules, attribute)) for attribute in attributes)
+
+        previous = self.stats.matches if hasattr(self, '_compiled') else {}
+        counts = [previous.pop(rule.name, 0) for rule in rules]
+
+        # Single assignment, the items being routed see the old or the new rules
+        self._compiled = (tuple(rules), indexes, (1 << len(rules)) - 1, counts)
+
+    @property
+    def rules(self) -> Tuple[Rule, ...]:
+        return self._compiled[0]
+
+    def match(self, item) -> List[Rule]:
+        rules, indexes, candidates, counts = self._compiled
+
+        for attribute, index in indexes:
+            candidates &= index.match(getattr(item, attribute, _MISSING))
+            if not candidates:
+                break
+
+        self._items += 1
+        if not candidates:
+            self._unmatched += 1
+            return []
+
+        matched = []
+        while candidates:
+            lowest = candidates & -candidates
+            bit = lowest.bit_length() - 1
+            matched.append(rules[bit])
+            counts[bit] += 1
+
+            if self.first_match:
+                break
+            candidates ^= lowest
+
+        return matched
+
+    @property
+    def stats(self) -> RouterStats:
+        rules, _, _, counts = self._compiled
+        matches = dict()
+        for rule, count in zip(rules, counts):
+            matches[rule.name] = matches.get(rule.name, 0) + count
+
+        return RouterStats(self._items, self._unmatched, matches)
+
+    def __len__(self):
+        return len(self._compiled[0])
@@ -0,0 +1,132 @@
+"""Compact binary file format used to snapshot (and restore) the Knowledge.
+
+Layout (little-endian):
+
+    header  | MAGIC (8 bytes) | version (u8) | encoding (u8) |
+    entries | payload of each key, concatenated |
+    index   | count (u32) | count * (key_len (u16), offset (u64), length (u32), expire_at (f64)), key |
+    trailer | index offset (u64) |
+
+The payload encoding depends on the backend (ie. `Encoding`). The file is read through a memory map,
+so payloads can be decoded on demand (without copy) when a key is accessed for the first time.
+"""
+from __future__ import annotations
+
+import os
+import mmap
+import struct
+from enum import IntEnum
+from typing import BinaryIO, Iterator, Tuple, Dict, NamedTuple
+
+MAGIC = b'MAPEKSNP'
+VERSION = 1
+
+_header = struct.Struct('<8sBB')
+_index_count = struct.Struct('<I')
+_index_entry = struct.Struct('<HQId')
+_trailer = struct.Struct('<Q')
+
+
+class Encoding(IntEnum):
+    PICKLE = 0
+    REDIS_DUMP = 1
+
+
+class Entry(NamedTuple):
+    offset: int
+    length: int
+    # Absolute (epoch) time, 0 without expiration
+    expire_at: float
+
+
+class SnapshotWriter:
+    """ Sequentially write entries, the index is written on `close()` """
+
+    def __init__(self, path: str, encoding: Encoding) -> None:
+        self._path = path
+        self._tmp_path = f"{path}.tmp"
+        self._file: BinaryIO = open(self._tmp_path, 'wb')
+        self._index: Dict[str, Entry] = dict()
+
+        self._file.write(_header.pack(MAGIC, VERSION, encoding))
+
+    def write(self, key: str, payload: bytes, expire_at: float = 0) -> None:
+        self._index[key] = Entry(self._file.tell(), len(payload), expire_at or 0)
+        self._file.write(payload)
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self) -> None:
+        index_offset = self._file.tell()
+        chunks = [_index_count.pack(len(self._index))]
+
+        for key, entry in self._index.items():
+            raw_key = key.encode()
+            chunks.append(_index_entry.pack(len(raw_key), *entry))
+            chunks.append(raw_key)
+
+        chunks.append(_trailer.pack(index_offset))
+        self._file.write(b''.join(chunks))
+        self._file.close()
+
+        # Atomic replace (ie. never leave a truncated snapshot)
+        os.replace(self._tmp_path, self._path)
+
+    def __enter__(self) -> SnapshotWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class SnapshotReader:
+    """ Memory mapped snapshot, only the index is parsed on open """
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, encoding = _header.unpack_from(self._mmap, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"'{path}' is not a valid Knowledge snapshot (version {VERSION})")
+
+        self.encoding = Encoding(encoding)
+        self.index: Dict[str, Entry] = self._read_index()
+
+    def _read_index(self) -> Dict[str, Entry]:
+        index = dict()
+        pos = _trailer.unpack_from(self._mmap, len(self._mmap) - _trailer.size)[0]
+        count, = _index_count.unpack_from(self._mmap, pos)
+        pos += _index_count.size
+
+        for _ in range(count):
+            key_len, *entry = _index_entry.unpack_from(self._mmap, pos)
+            pos += _index_entry.size
+            index[self._mmap[pos:pos + key_len].decode()] = Entry(*entry)
+            pos += key_len
+
+        return index
+
+    def payload(self, entry: Entry) -> memoryview:
+        """ Zero copy view of the payload (release it before `close()`) """
+        return memoryview(self._mmap)[entry.offset:entry.offset + entry.length]
+
+    def read(self, entry: Entry) -> bytes:
+        return self._mmap[entry.offset:entry.offset + entry.length]
+
+    def items(self) -> Iterator[Tuple[str, Entry]]:
+        return iter(self.index.items())
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._mmap.closed
@@ -69,6 +69,19 @@ class CallMethod(Item):
         return f"{self.__class__.__name__}({self.name}, {self.args}, {self.kwargs}, {self.src}, {self.dst}, {self.hops}, {self.timestamp})"
 
 
+@dataclass
+class KnowledgeEvent:
+    """ Change of a Knowledge key, emitted by `Knowledge.watch()` """
+    # Key without the Knowledge prefix
+    key: str
+    # Last Redis command changing the key (eg. 'sadd')
+    event: str
+    # Fetched value (only watching with fetch)
+    value: Any = None
+    # Number of changes merged in this event
+    coalesced: int = 1
+
+
 # TODO: delete... before check if somewhere is used
 class MapeLoop(ABC):
     __slots__ = ()
@@ -0,0 +1,82 @@
+import os
+import asyncio
+
+import pytest
+import aioredis
+
+import mape
+from mape.knowledge import MemoryBackend, RedisBackend
+
+# Redis backend tests run only given a (disposable, it is flushed) Redis instance
+REDIS_URL = os.environ.get('MAPE_TEST_REDIS_URL')
+
+BACKENDS = [
+    'memory',
+    pytest.param('redis', marks=pytest.mark.skipif(not REDIS_URL, reason="MAPE_TEST_REDIS_URL not set"))
+]
+
+
+@pytest.fixture(params=BACKENDS)
+def make_backend(request):
+    """ Coroutine function creating the Knowledge backend (ie. in the loop of the test) """
+    async def make():
+        if request.param == 'memory':
+            return MemoryBackend()
+
+        redis = aioredis.from_url(REDIS_URL)
+        await redis.flushdb()
+        return RedisBackend(redis)
+
+    return make
+
+
+@pytest.fixture
+def aio_loop(tmp_path):
+    """ A new asyncio loop, and the framework initialized on it (in memory Knowledge) """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    mape.rx_scheduler = None
+    mape.init(asyncio_loop=loop, config_file=str(tmp_path / 'mape.yml'))
+
+    yield loop
+
+    mape.app.k_backend.close()
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b'', headers=()):
+    """ Call an ASGI app in process, return `(status, body)` """
+    path, _, query = path.partition('?')
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'body': b''}
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(key.lower().encode(), value.encode()) for key, value in headers],
+        'client': ('127.0.0.1', 1234), 'server': ('testserver', 80)
+    }
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    await app(scope, receive, send)
+    return response['status'], response['body']
+
+
+@pytest.fixture
+def rest_app(aio_loop):
+    """ FastAPI app of the REST API (called in process, see `asgi_request`) """
+    from fastapi import FastAPI
+    from mape.remote.rest.api import api_setup
+
+    fastapi_app = FastAPI()
+    api_setup(fastapi_app, mape.app)
+    return fastapi_app
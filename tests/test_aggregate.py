@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from mape.knowledge import Knowledge
+from mape.memory.aggregate import _number
+
+
+async def _speeds(make_backend):
+    k = Knowledge(await make_backend(), 'k.test')
+    for car, speed in (('car1', 80.5), ('car2', 120), ('car3', 95.25)):
+        await k.create_versioned(f"speed_{car}", float).set(speed)
+
+    # Not numbers, or not matching
+    await k.create_versioned('speed_car4', str).set('fast')
+    await k.create_versioned('limit', float).set(130)
+    return k
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('count', 3),
+    ('sum', 295.75),
+    ('min', 80.5),
+    ('max', 120),
+    ('mean', 295.75 / 3)
+])
+def test_aggregates(make_backend, name, expected):
+    async def main():
+        k = await _speeds(make_backend)
+        assert await k.aggregate(name, 'speed_*') == pytest.approx(expected, rel=1e-15)
+
+    asyncio.run(main())
+
+
+def test_topk_and_empty(make_backend):
+    async def main():
+        k = await _speeds(make_backend)
+        assert await k.aggregate('topk', 'speed_*', arg=2) == [('speed_car2', 120), ('speed_car3', 95.25)]
+        assert await k.aggregate('mean', 'nothing_*') is None
+        assert await k.aggregate('count', 'nothing_*') == 0
+
+    asyncio.run(main())
+
+
+def test_sortedset_scores(make_backend):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+        await k.create_sortedset('ranking', str).add_multi([('car1', 3), ('car2', 1.5), ('car3', 2)])
+
+        assert await k.aggregate('sum', sortedset='ranking') == 6.5
+        assert await k.aggregate('max', sortedset='ranking') == 3
+
+    asyncio.run(main())
+
+
+def test_string_values(make_backend):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+        speeds = k.create_keyspace('speeds', str)
+        for car, speed in (('car1', '80'), ('car2', '0x10'), ('car3', '1_000'), ('car4', 'inf')):
+            await speeds.set(car, speed)
+
+        # As Lua tonumber(): hexadecimal, but no underscores or inf
+        assert await k.aggregate('sum', 'speeds.*') == 96
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('12.5', 12.5), (b'-3', -3), (' 7 ', 7), ('0x1f', 31), ('1e3', 1000),
+    ('1_0', None), ('nan', None), ('-inf', None), ('car', None), (b'\xff', None), (12, None)
+])
+def test_memory_number_rules(raw, expected):
+    assert _number(raw) == expected
@@ -0,0 +1,125 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+import mape
+from mape.remote.rest import bridge
+from mape.remote.rest.rx_utils import POSTObserver
+from mape.remote.rest.webserver import UvicornDaemon
+
+
+@pytest.fixture
+def server_loop():
+    mape_loop, server_loop = asyncio.new_event_loop(), asyncio.new_event_loop()
+    bridge.set_loops(mape_loop, server_loop)
+    yield mape_loop, server_loop
+
+    bridge.set_loops(None, None)
+    mape_loop.close()
+    server_loop.close()
+
+
+def test_direct_call_without_thread():
+    calls = []
+    callback = calls.append
+    bridge.to_mape_loop(callback, 1)
+
+    assert calls == [1]
+    assert not bridge.threaded()
+    assert bridge.to_server_loop(callback) is callback
+
+
+def test_calls_from_server_thread_in_order(server_loop):
+    mape_loop, _ = server_loop
+    calls, threads = [], set()
+
+    def call(i):
+        calls.append(i)
+        threads.add(threading.get_ident())
+
+    def server():
+        for i in range(1000):
+            bridge.to_mape_loop(call, i)
+        bridge.to_mape_loop(mape_loop.stop)
+
+    thread = threading.Thread(target=server)
+    thread.start()
+    mape_loop.run_forever()
+    thread.join()
+
+    assert bridge.threaded()
+    assert calls == list(range(1000))
+    assert threads == {threading.get_ident()}
+
+
+def test_failing_call_not_stop_the_others(server_loop):
+    mape_loop, _ = server_loop
+    calls = []
+
+    bridge.to_mape_loop(lambda: 1 / 0)
+    bridge.to_mape_loop(calls.append, 'after')
+    bridge.to_mape_loop(mape_loop.stop)
+    mape_loop.run_forever()
+
+    assert calls == ['after']
+
+
+def test_to_server_loop(server_loop):
+    _, server_loop = server_loop
+    calls = []
+
+    bridge.to_server_loop(calls.append)('value')
+    assert calls == []
+
+    server_loop.call_soon(server_loop.stop)
+    server_loop.run_forever()
+    assert calls == ['value']
+
+
+def test_threaded_server(aio_loop, rest_app):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    loop = mape.Loop('car')
+
+    @loop.monitor
+    def detect(item, on_next):
+        on_next(item)
+
+    received, threads = [], set()
+
+    def on_next(item):
+        received.append(item)
+        threads.add(threading.get_ident())
+
+    detect.port_in.subscribe(on_next)
+    daemon = UvicornDaemon(rest_app, aio_loop, host='127.0.0.1', port=port, log_level='error', threaded=True)
+
+    async def main():
+        while not daemon._server.started:
+            await asyncio.sleep(0.01)
+
+        observer = POSTObserver(f"http://127.0.0.1:{port}", 'car.detect', batch_size=8)
+        for i in range(100):
+            observer.on_next(i)
+
+        for _ in range(200):
+            if len(received) == 100:
+                break
+            await asyncio.sleep(0.01)
+
+        observer.dispose()
+        await asyncio.sleep(0)
+
+    aio_loop.run_until_complete(main())
+    daemon.stop()
+    daemon._thread.join(5)
+
+    assert daemon.threaded
+    assert received == list(range(100))
+    # Notified in the MAPE loop
+    assert threads == {threading.get_ident()}
+    assert not bridge.threaded()
@@ -0,0 +1,72 @@
+import pytest
+from pydantic import BaseModel
+
+from mape.remote import de_serializer
+from mape.remote.de_serializer import (
+    Codec, Pickled, register_codec, get_codec, encoder, decoder, obj_to_raw, obj_from_raw, list_from_raw
+)
+
+
+class Car(BaseModel):
+    plate: str
+    speed: float
+
+
+class Plate(str):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def codecs(monkeypatch):
+    """ Registry restored after each test """
+    monkeypatch.setattr(de_serializer, '_codec_factories', dict(de_serializer._codec_factories))
+    monkeypatch.setattr(de_serializer, '_codecs', dict())
+
+
+@pytest.mark.parametrize('value_type, value', [
+    (str, 'car'),
+    (Plate, Plate('AB123')),
+    (dict, {'speed': 80, 'plate': 'AB123', 'gps': [1.5, 2.5]}),
+    (Pickled, {'nested': ({1, 2}, b'raw')}),
+    (Car, Car(plate='AB123', speed=87.5)),
+    (bytes, b'\x00\x01')
+])
+def test_round_trip(value_type, value):
+    raw = obj_to_raw(value_type, value)
+    assert obj_from_raw(value_type, raw) == value
+    assert list_from_raw(value_type, [raw, raw]) == [value, value]
+
+
+def test_json_as_str():
+    assert isinstance(obj_to_raw(dict, {'speed': 80}), str)
+    # Not supported by orjson (ie. stdlib fallback)
+    assert obj_from_raw(dict, obj_to_raw(dict, {'big': 2 ** 70})) == {'big': 2 ** 70}
+
+
+def test_resolved_by_mro():
+    assert get_codec(Plate) is get_codec(Plate)
+    assert get_codec(Plate).decode == get_codec(str).decode
+
+
+def test_wrong_type():
+    with pytest.raises(ValueError, match="Incorrect type"):
+        obj_to_raw(str, 12)
+
+
+def test_register_codec_after_encoder():
+    encode, decode = encoder(Plate), decoder(Plate)
+    assert encode(Plate('ab123')) == 'ab123'
+
+    register_codec(Plate, Codec(lambda value: value.upper(), lambda raw: Plate(raw.lower())))
+
+    # Encoders created before follow the registration
+    assert encode(Plate('ab123')) == 'AB123'
+    assert decode('AB123') == 'ab123'
+    # Subclasses of other types unchanged
+    assert obj_to_raw(str, 'ab123') == 'ab123'
+
+
+def test_register_codec_factory():
+    register_codec(Car, lambda value_type: Codec(lambda car: car.plate, lambda raw: value_type(plate=raw, speed=0)))
+
+    assert obj_from_raw(Car, obj_to_raw(Car, Car(plate='AB123', speed=80))) == Car(plate='AB123', speed=0)
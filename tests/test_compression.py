@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from mape.remote import de_serializer
+from mape.remote.de_serializer import (
+    Pickled, set_compression, compress, decompress, obj_to_raw, obj_from_raw
+)
+
+ALGORITHMS = ['zlib', 'zstd', 'lz4']
+
+
+@pytest.fixture(autouse=True)
+def compression(monkeypatch):
+    """ Settings restored after each test """
+    for name in ('_compress_threshold', '_compress_magic', '_compress'):
+        monkeypatch.setattr(de_serializer, name, getattr(de_serializer, name))
+
+
+def _set_compression(algorithm, threshold=64):
+    try:
+        set_compression(threshold, algorithm)
+    except ImportError as e:
+        pytest.skip(str(e))
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_round_trip(algorithm):
+    _set_compression(algorithm)
+    payload = b'car,speed=87.5 ' * 100
+
+    compressed = compress(payload)
+    assert compressed[:3] == b'\x00CP' and len(compressed) < len(payload)
+    assert bytes(decompress(compressed)) == payload
+    assert compress(b'short') == b'short'
+
+
+def test_disabled_by_default():
+    payload = b'x' * 10_000
+    assert compress(payload) is payload
+
+
+def test_incompressible_kept():
+    _set_compression('zlib')
+    payload = os.urandom(1000)
+
+    assert compress(payload) == payload
+
+
+def test_any_algorithm_decompressed():
+    _set_compression('zlib')
+    compressed = compress(b'a' * 1000)
+
+    # Receiver with other settings
+    set_compression(None)
+    assert bytes(decompress(compressed)) == b'a' * 1000
+
+
+def test_magic_escaped():
+    _set_compression('zlib')
+    raw = b'\x00CPz not a frame'
+
+    assert bytes(decompress(compress(raw))) == raw
+    assert bytes(decompress(compress(raw * 100))) == raw * 100
+
+
+def test_only_serialized_values():
+    _set_compression('zlib')
+    text = 'speed ' * 100
+
+    # Raw str values stored as is, serialized values compressed
+    assert obj_to_raw(str, text) == text
+    assert obj_to_raw(Pickled, text)[:3] == b'\x00CP'
+    assert obj_from_raw(Pickled, obj_to_raw(Pickled, text)) == text
+    assert obj_from_raw(dict, obj_to_raw(dict, {'text': text})) == {'text': text}
+
+
+def test_unknown_algorithm():
+    with pytest.raises(ValueError, match="Unknown compression algorithm"):
+        set_compression(64, 'brotli')
@@ -0,0 +1,123 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import rx
+from rx.subject import Subject
+
+import mape
+from mape.operators import content_router
+from mape.routing import ContentRouter, Rule, Range
+
+REGIONS = ['north', 'south', 'east', None]
+VEHICLES = ['car', 'truck', 'van', 'bike']
+
+
+def _satisfied(condition, value):
+    if isinstance(condition, Range):
+        try:
+            return (condition.low is None or value >= condition.low) and (condition.high is None or value < condition.high)
+        except TypeError:
+            return False
+
+    values = condition if isinstance(condition, (set, frozenset, list, tuple)) else (condition,)
+    # Booleans never equal to numbers
+    return any(value == v and isinstance(value, bool) == isinstance(v, bool) for v in values)
+
+
+def _brute_force(rules, item):
+    return [rule for rule in rules
+            if all(hasattr(item, key) and _satisfied(condition, getattr(item, key))
+                   for key, condition in rule.conditions.items())]
+
+
+def _random_rule(rng, n):
+    conditions = {}
+    if rng.random() < 0.5:
+        conditions['region'] = rng.choice(REGIONS[:3])
+    if rng.random() < 0.5:
+        conditions['vehicle'] = set(rng.sample(VEHICLES, rng.randint(1, 3)))
+    if rng.random() < 0.6:
+        low, high = sorted(rng.sample(range(0, 150, 10), 2))
+        conditions['value'] = Range(rng.choice([low, None]), rng.choice([high, None]))
+    return Rule(f"dest{n}", **conditions)
+
+
+def _random_item(rng):
+    attributes = {'vehicle': rng.choice(VEHICLES), 'value': rng.choice([rng.uniform(-10, 160), rng.randrange(0, 150, 10)])}
+    if region := rng.choice(REGIONS):
+        attributes['region'] = region
+    return SimpleNamespace(**attributes)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_brute_force(seed):
+    rng = random.Random(seed)
+    rules = [_random_rule(rng, n) for n in range(30)]
+    router = ContentRouter(rules)
+    first = ContentRouter(rules, first_match=True)
+
+    for _ in range(500):
+        item = _random_item(rng)
+        expected = _brute_force(rules, item)
+
+        assert router.match(item) == expected
+        assert first.match(item) == expected[:1]
+
+
+def test_booleans_apart_from_numbers():
+    router = ContentRouter([Rule('flagged', anomaly=True), Rule('one', anomaly=1), Rule('zero', anomaly={0, 2})])
+
+    assert [r.name for r in router.match(SimpleNamespace(anomaly=True))] == ['flagged']
+    assert [r.name for r in router.match(SimpleNamespace(anomaly=np.bool_(True)))] == ['flagged']
+    assert [r.name for r in router.match(SimpleNamespace(anomaly=1.0))] == ['one']
+    assert [r.name for r in router.match(SimpleNamespace(anomaly=False))] == []
+    assert [r.name for r in router.match(SimpleNamespace(anomaly=0))] == ['zero']
+
+
+def test_not_hashable_and_not_comparable():
+    router = ContentRouter([Rule('speed', value=Range(90)), Rule('any', region='north')])
+
+    assert router.match(SimpleNamespace(value=[1], region='north')) == [router.rules[1]]
+    assert router.match(SimpleNamespace(value='fast')) == []
+    with pytest.raises(ValueError, match='not comparable'):
+        ContentRouter([Rule('a', value=Range(1)), Rule('b', value=Range('x'))])
+
+
+def test_update_and_stats():
+    router = ContentRouter([Rule('north', region='north'), Rule('south', region='south')])
+    for region in ('north', 'north', 'south', 'west'):
+        router.match(SimpleNamespace(region=region))
+
+    stats = router.stats
+    assert (stats.items, stats.unmatched, stats.matches) == (4, 1, {'north': 2, 'south': 1})
+
+    # Counters kept by name
+    router.update([Rule('north', region={'north', 'west'})])
+    router.match(SimpleNamespace(region='west'))
+    assert router.stats.matches == {'north': 3} and len(router) == 1
+
+
+def test_operator(aio_loop):
+    loop = mape.Loop('fleet')
+
+    @loop.execute
+    def trucks(item, on_next):
+        on_next(item)
+
+    received, logged, north = [], [], Subject()
+    trucks.port_in.subscribe(received.append)
+    north.subscribe(logged.append)
+
+    items = [SimpleNamespace(region='north', vehicle='truck'), SimpleNamespace(region='south', vehicle='car')]
+    dispatch = content_router([Rule(north, region='north'), Rule('fleet.trucks', vehicle='truck'),
+                               Rule(north, name='again', vehicle='truck')], default='fleet.trucks')
+    passed = []
+    rx.from_iterable(items).pipe(dispatch).subscribe(passed.append)
+
+    assert passed == items
+    # Each destination once, and the default for the unmatched
+    assert logged == [items[0]]
+    assert received == items
+    assert dispatch.router.stats.matches == {repr(north): 1, 'fleet.trucks': 1, 'again': 1}
@@ -0,0 +1,135 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+import rx
+from rx.subject import Subject
+
+from mape.remote import influxdb
+from mape.remote.influxdb import InfluxObserver, downsample, Downsampled
+from mape.remote.influxdb.downsample import WindowState
+
+
+def _aggregates(values):
+    return {'min': min(values), 'max': max(values), 'mean': pytest.approx(sum(values) / len(values)),
+            'count': len(values), 'last': values[-1]}
+
+
+def test_tumbling_state():
+    state = WindowState(capacity=1)
+    for i in range(10):
+        state.add(('car', 'speed'), float(i))
+    state.add(('bike', 'speed'), 5.0)
+
+    assert state.rotate() == {('car', 'speed'): _aggregates(list(range(10))), ('bike', 'speed'): _aggregates([5])}
+    assert state.rotate() == {}
+    # Idle series released
+    assert len(state) == 0
+
+
+@pytest.mark.parametrize('panes', [1, 2, 5])
+def test_sliding_state_brute_force(panes):
+    rng = random.Random(panes)
+    state = WindowState(panes, capacity=2)
+    history = []
+
+    for _ in range(30):
+        pane = {series: [rng.uniform(-10, 10) for _ in range(rng.randint(0, 3))] for series in 'abcd'}
+        for series, values in pane.items():
+            for value in values:
+                state.add(series, value)
+        history.append(pane)
+
+        window = history[-panes:]
+        expected = {}
+        for series in 'abcd':
+            values = [value for pane in window for value in pane[series]]
+            if values:
+                expected[series] = _aggregates(values)
+                # Last of the series (also from older windows)
+                expected[series]['last'] = next(p[series][-1] for p in reversed(history) if p[series])
+
+        assert state.rotate() == expected
+
+
+def test_released_rows_reused():
+    state = WindowState(capacity=1)
+    state.add('a', 1.0)
+    state.rotate()
+    state.rotate()
+
+    state.add('b', 2.0)
+    assert state._rows == {'b': 0}
+    assert state.rotate() == {'b': _aggregates([2])}
+
+
+def test_invalid_windows():
+    with pytest.raises(ValueError, match='multiple'):
+        downsample(10, every=3)
+    with pytest.raises(ValueError, match='Unknown aggregates'):
+        downsample(10, aggregates=('median',))
+
+
+def test_operator_by_tags():
+    items = [SimpleNamespace(src='car1', value=1), SimpleNamespace(src='car2', value=10),
+             SimpleNamespace(src='car1', value=3), SimpleNamespace(src='car1', value='not a number')]
+
+    async def main():
+        results = []
+        rx.from_iterable(items).pipe(
+            downsample(60, aggregates=('mean', 'count'), measurement='car')
+        ).subscribe(results.append)
+        return results
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, Downsampled) and result.measurement == 'car' for result in results)
+    assert {result.src: result.fields for result in results} == {
+        'car1': {'value_mean': 2, 'value_count': 2}, 'car2': {'value_mean': 10, 'value_count': 1}}
+    assert results[0].tag_keys == ('src',)
+
+
+def test_operator_timer():
+    async def main():
+        source, results = Subject(), []
+        source.pipe(downsample(0.05, tags=())).subscribe(results.append)
+
+        for value in (1, 2, 3):
+            source.on_next(value)
+        await asyncio.sleep(0.08)
+        source.on_next(10)
+        source.on_completed()
+        return results
+
+    first, last = asyncio.run(main())
+    assert first.fields['value_mean'] == 2 and first.fields['value_count'] == 3
+    assert last.fields['value_last'] == 10 and last.fields['value_count'] == 1
+
+
+class RecordingWriter:
+    precision = 'ns'
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, bucket, record):
+        self.lines.append(record)
+
+
+def test_observer_downsample(monkeypatch):
+    monkeypatch.setattr(influxdb, '_config', {'bucket': 'mape', 'downsample': {'car': {'window': 60}}})
+
+    async def main():
+        writer = RecordingWriter()
+        observer = InfluxObserver('car', writer=writer)
+        for value in (1.0, 2.0, 6.0):
+            observer.on_next(SimpleNamespace(src='car1', value=value))
+
+        assert writer.lines == []
+        observer.on_completed()
+        observer.dispose()
+        return writer.lines
+
+    assert asyncio.run(main()) == \
+        ['car,src=car1 value_count=3i,value_last=6,value_max=6,value_mean=3,value_min=1']
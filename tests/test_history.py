@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+import pytest
+
+import mape
+from mape.history import History, Series
+
+
+def _brute_force(items, seconds, now):
+    return [value for timestamp, value in items if timestamp >= now - seconds]
+
+
+@pytest.mark.parametrize('capacity, max_capacity', [(1, 2**16), (4, 16), (64, 64)])
+def test_window_brute_force(capacity, max_capacity):
+    rng = random.Random(capacity)
+    series = Series(retention=10, capacity=capacity, max_capacity=max_capacity)
+    items, timestamp = [], 0.0
+
+    for _ in range(500):
+        timestamp += rng.uniform(0, 0.5)
+        value = rng.uniform(-100, 100)
+        series.append(value, timestamp)
+        items.append((timestamp, value))
+
+        kept = [item for item in items if item[0] >= timestamp - 10][-max_capacity:]
+        seconds = rng.uniform(0, 12)
+        expected = _brute_force(kept, seconds, timestamp)
+
+        assert series.values(seconds, now=timestamp).tolist() == expected
+        assert series.count(seconds, now=timestamp) == len(expected)
+        assert series.last == value and series.last_timestamp == timestamp
+        if expected:
+            assert series.mean(seconds, now=timestamp) == pytest.approx(np.mean(expected))
+            assert series.std(seconds, now=timestamp) == pytest.approx(np.std(expected))
+            assert series.min(seconds, now=timestamp) == min(expected)
+            assert series.max(seconds, now=timestamp) == max(expected)
+            assert series.percentile(95, seconds, now=timestamp) == pytest.approx(np.percentile(expected, 95))
+
+    assert len(series) <= max_capacity
+
+
+def test_empty_window():
+    series = Series()
+
+    assert series.last is None and series.mean() is None and series.percentile(50) is None
+    assert series.slope() is None and series.count() == 0
+
+
+def test_slope():
+    series = Series(retention=100)
+    now = 1.7e9
+    series.extend([2 * i + 5 for i in range(50)], [now + i for i in range(50)])
+
+    assert series.slope(now=now + 49) == pytest.approx(2)
+    # Constant timestamps
+    flat = Series()
+    flat.extend([1, 2], [now, now])
+    assert flat.slope(now=now) is None
+
+
+def test_window_read_only():
+    series = Series()
+    series.append(1.0)
+    _, values = series.window()
+
+    with pytest.raises(ValueError):
+        values[0] = 2
+
+
+def test_history_evict():
+    history = History(retention=10)
+    history.append('car1', 87.5, 100)
+    history.append('car2', 60.0, 105)
+
+    assert 'car1' in history and len(history) == 2 and history['car2'].last == 60.0
+    assert history.evict(now=112) == 1
+    assert list(history) == ['car2']
+
+    del history['car2']
+    assert len(history) == 0
+
+
+def test_history_evicts_on_new_series():
+    history = History(retention=10)
+    for i in range(64):
+        history.append(i, 1.0, 0)
+
+    # Idle series removed when the next one is created
+    history.append('new', 1.0)
+    assert list(history) == ['new']
+
+
+def test_loop_history(aio_loop, monkeypatch):
+    monkeypatch.setattr(mape.mape_config, 'config_dict', {'history': {'retention': 5}})
+    loop = mape.Loop('car')
+
+    assert loop.history is loop.history
+    assert loop.history.retention == 5
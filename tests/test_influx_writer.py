@@ -0,0 +1,195 @@
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+from aiohttp import web
+from influxdb_client import WriteOptions, InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+from mape.remote import influxdb
+from mape.remote.influxdb import InfluxObserver, InfluxWriter
+
+
+class FakeInflux:
+    """ `/api/v2/write` recording the written lines, answering the `statuses` first """
+
+    def __init__(self, *statuses, delay=0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = []
+
+    async def write(self, request):
+        await asyncio.sleep(self.delay)
+        self.requests.append((dict(request.query), (await request.text()).split('\n')))
+        return web.Response(status=self.statuses.pop(0) if self.statuses else 204)
+
+    @property
+    def lines(self):
+        return [line for _, lines in self.requests for line in lines]
+
+
+async def _serve(influx, main):
+    app = web.Application()
+    app.router.add_post('/api/v2/write', influx.write)
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    try:
+        return await main(f"http://127.0.0.1:{port}")
+    finally:
+        await runner.cleanup()
+
+
+def test_batch_by_size():
+    influx = FakeInflux()
+
+    async def main(url):
+        writer = InfluxWriter(url, token='secret', org='univaq', batch_size=3, flush_interval=60)
+        for i in range(7):
+            writer.write('mape', f"car speed={i}")
+        await writer.close()
+        return writer.metrics
+
+    metrics = asyncio.run(_serve(influx, main))
+
+    assert influx.lines == [f"car speed={i}" for i in range(7)]
+    assert [len(lines) for _, lines in influx.requests] == [3, 3, 1]
+    assert influx.requests[0][0] == {'bucket': 'mape', 'precision': 'ns', 'org': 'univaq'}
+    assert metrics.written == 7 and metrics.pending == 0
+
+
+def test_flush_interval():
+    influx = FakeInflux()
+
+    async def main(url):
+        writer = InfluxWriter(url, flush_interval=0.01)
+        writer.write('mape', 'car speed=1')
+        writer.write('other', 'car speed=2')
+        await asyncio.sleep(0.1)
+
+        requests = list(influx.requests)
+        await writer.close()
+        return requests
+
+    requests = asyncio.run(_serve(influx, main))
+    assert sorted((query['bucket'], lines) for query, lines in requests) == \
+        [('mape', ['car speed=1']), ('other', ['car speed=2'])]
+
+
+def test_retries():
+    influx = FakeInflux(503, 429)
+
+    async def main(url):
+        writer = InfluxWriter(url, retries=3, backoff=0.01)
+        writer.write('mape', 'car speed=1')
+        await writer.close()
+        return writer.metrics
+
+    metrics = asyncio.run(_serve(influx, main))
+    assert influx.lines == ['car speed=1'] * 3
+    assert metrics.retries == 2 and metrics.written == 1
+
+
+@pytest.mark.parametrize('status, retries', [(400, 0), (503, 1)])
+def test_failed(status, retries):
+    influx = FakeInflux(*[status] * 5)
+
+    async def main(url):
+        writer = InfluxWriter(url, retries=1, backoff=0.01)
+        writer.write('mape', 'car speed=1')
+        await writer.close()
+        return writer.metrics
+
+    metrics = asyncio.run(_serve(influx, main))
+    assert metrics.failed == 1 and metrics.written == 0 and metrics.retries == retries
+
+
+def test_timeout_unreachable():
+    influx = FakeInflux(delay=1)
+
+    async def main(url):
+        session = aiohttp.ClientSession(url, timeout=aiohttp.ClientTimeout(total=0.05))
+        writer = InfluxWriter(url, retries=1, backoff=0.01, session=session)
+        writer.write('mape', 'car speed=1')
+        await writer.close()
+        await session.close()
+        return writer.metrics
+
+    metrics = asyncio.run(_serve(influx, main))
+    assert metrics.failed == 1 and metrics.pending == 0 and metrics.retries == 1
+
+
+def test_max_pending_drops_oldest():
+    async def main():
+        writer = InfluxWriter('http://127.0.0.1:1', batch_size=100, max_pending=4)
+        for i in range(6):
+            writer.write('mape', f"car speed={i}")
+
+        lines = writer._buffers['mape']
+        writer._timer.cancel()
+        return lines, writer.metrics
+
+    lines, metrics = asyncio.run(main())
+    assert lines == ['car speed=2', 'car speed=3', 'car speed=4', 'car speed=5']
+    assert metrics.dropped == 2 and metrics.pending == 4
+
+
+class RecordingWriter:
+    precision = 'ns'
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, bucket, record):
+        self.lines.append((bucket, record))
+
+
+@pytest.fixture
+def config(monkeypatch):
+    config = {'url': 'http://127.0.0.1:1', 'bucket': 'mape'}
+    monkeypatch.setattr(influxdb, '_config', config)
+    return config
+
+
+def test_observer_writes_lines(config):
+    writer = RecordingWriter()
+    observer = InfluxObserver('car', tags=('loop', 'car_panda'), writer=writer)
+    observer.on_next({'value': 87.5})
+    observer.on_next(3)
+
+    assert writer.lines == [('mape', 'car,loop=car_panda value=87.5'), ('mape', 'car,loop=car_panda value=3i')]
+
+
+@pytest.mark.parametrize('write_options, batch_size', [(SYNCHRONOUS, 1), (WriteOptions(batch_size=50), 50)])
+def test_legacy_write_options(config, write_options, batch_size):
+    async def main():
+        with pytest.deprecated_call():
+            observer = InfluxObserver('car', write_options=write_options)
+
+        writer = observer._writer
+        assert writer is observer._own_writer
+        assert writer._batch_size == batch_size
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_legacy_client(config):
+    async def main():
+        client = InfluxDBClient('http://influx:8086', token='secret', org='univaq')
+        with pytest.deprecated_call():
+            observer = InfluxObserver('car', client=client)
+
+        writer = observer._writer
+        assert writer._url == 'http://influx:8086' and writer._org == 'univaq'
+        assert writer._headers['Authorization'] == 'Token secret'
+        await writer.close()
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+import json
+import pickle
+import asyncio
+
+import pytest
+
+from mape.remote.de_serializer import Pickled, encoder, compress
+from mape.remote.rest import batch
+from mape.remote.rest.api import ingest_routes
+from mape.remote.rest.batch import BatchItem
+from mape.remote.rest.rx_utils import PostObservable
+
+from .conftest import asgi_request
+
+
+@pytest.fixture
+def source(aio_loop):
+    received = []
+    observable = PostObservable('speed', buffer=4)
+
+    async def subscribe():
+        return observable.subscribe(received.append, lambda e: received.append(('error', e)),
+                                    lambda: received.append('completed'))
+
+    disposable = aio_loop.run_until_complete(subscribe())
+    yield observable, received
+
+    disposable.dispose()
+
+
+def _post(rest_app, aio_loop, path, body, content_type=None):
+    headers = [('Content-Type', content_type)] if content_type else []
+
+    async def post():
+        result = await asgi_request(rest_app, 'POST', path, body, headers)
+        # Emitted by the source task
+        await asyncio.sleep(0)
+        return result
+
+    return aio_loop.run_until_complete(post())
+
+
+def test_json(rest_app, aio_loop, source):
+    _, received = source
+    status, body = _post(rest_app, aio_loop, '/ingest/speed', b'87.5', 'application/json')
+
+    assert status == 200 and json.loads(body) == {'count': 1}
+    assert received == [87.5]
+
+
+def test_ndjson(rest_app, aio_loop, source):
+    _, received = source
+    status, _ = _post(rest_app, aio_loop, '/ingest/speed', b'1\n{"speed": 2}\n\n3\n', batch.NDJSON_MEDIA_TYPE)
+
+    assert status == 200
+    assert received == [1, {'speed': 2}, 3]
+
+
+def test_pickled_and_compressed(rest_app, aio_loop, source):
+    _, received = source
+    value = {'speed': list(range(2000))}
+    status, _ = _post(rest_app, aio_loop, '/ingest/speed', compress(encoder(Pickled)(value)))
+
+    assert status == 200
+    assert received == [value]
+
+
+def test_binary_batch(rest_app, aio_loop, source):
+    _, received = source
+    body = batch.encode_frames([BatchItem('ignored', 'in', 'next', 1), BatchItem('ignored', 'in', 'completed')],
+                               encoder(Pickled))
+    status, _ = _post(rest_app, aio_loop, '/ingest/speed?batch=true', body)
+
+    assert status == 200
+    assert received == [1, 'completed']
+
+
+def test_backpressure(rest_app, aio_loop, source):
+    observable, received = source
+    # Not emitted yet (ie. the buffer is full)
+    observable._buffer.extend([None] * 3)
+
+    status, body = _post(rest_app, aio_loop, '/ingest/speed', b'1\n2\n', batch.NDJSON_MEDIA_TYPE)
+    assert status == 429
+
+    status, _ = _post(rest_app, aio_loop, '/ingest/speed', b'1\n2\n3\n4\n5\n', batch.NDJSON_MEDIA_TYPE)
+    assert status == 413
+
+
+def test_malformed_and_unknown(rest_app, aio_loop, source):
+    assert _post(rest_app, aio_loop, '/ingest/speed', b'{', 'application/json')[0] == 400
+    assert _post(rest_app, aio_loop, '/ingest/speed', b'not pickled')[0] == 400
+    assert _post(rest_app, aio_loop, '/ingest/nothing', b'1', 'application/json')[0] == 404
+
+
+@pytest.mark.parametrize('body', [
+    b'',
+    # Unknown module, and unknown attribute of a module
+    pickle.dumps(int).replace(b'builtins', b'notamodl'),
+    pickle.dumps(int).replace(b'\x03int', b'\x03nil'),
+])
+def test_undecodable_body(rest_app, aio_loop, source, body):
+    status, response = _post(rest_app, aio_loop, '/ingest/speed', body)
+
+    assert status == 400 and b'Malformed body' in response
+
+
+def test_route_removed_on_dispose(aio_loop):
+    observable = PostObservable('/temperature')
+
+    async def subscribe():
+        return observable.subscribe(lambda _: None)
+
+    disposable = aio_loop.run_until_complete(subscribe())
+    assert '/temperature' in ingest_routes
+
+    disposable.dispose()
+    assert '/temperature' not in ingest_routes
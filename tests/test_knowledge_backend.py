@@ -0,0 +1,205 @@
+import sys
+import time
+import asyncio
+
+import pytest
+
+import mape
+from mape.knowledge import Knowledge, MemoryBackend
+from mape.memory import MemoryStore, WrongTypeError
+from mape.memory.store import SortedSet
+
+
+def test_keyspace(make_backend):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+        cars = k.create_keyspace('cars', str)
+
+        await cars.set('car1', 'red')
+        await cars.set('car2', 'blue', ex=60)
+        assert await cars.get('car1') == 'red'
+        assert await cars.get('missing') is None
+        assert 0 < await cars.ttl('car2') <= 60
+
+        assert not await cars.set('car1', 'green', nx=True)
+        assert sorted([key async for key in cars.keys()]) == ['car1', 'car2']
+
+        assert await cars.pop('car1') == 'red'
+        assert not await cars.contains('car1')
+        assert await cars.len() == 1
+
+    asyncio.run(main())
+
+
+def test_hash_set_list(make_backend):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+
+        speeds = k.create_hash('speeds', str)
+        await speeds.update({'car1': '80', 'car2': '95'})
+        await speeds.set('car3', '60')
+        assert await speeds.dict() == {'car1': '80', 'car2': '95', 'car3': '60'}
+        await speeds.delete('car2')
+        assert await speeds.len() == 2
+
+        plates = k.create_set('plates', str)
+        await plates.update('AB123', 'CD456')
+        await plates.add('AB123')
+        assert await plates.len() == 2
+        assert await plates.contains('CD456')
+        await plates.remove('CD456')
+        assert [plate async for plate in plates.values()] == ['AB123']
+
+        events = k.create_list('events', str)
+        await events.extend(['b', 'c'])
+        await events.appendleft('a')
+        assert await events.slice(0, 3) == ['a', 'b', 'c']
+        assert await events.pop() == 'c'
+        assert await events.popleft() == 'a'
+        assert await events.len() == 1
+
+    asyncio.run(main())
+
+
+def test_sortedset_and_queues(make_backend):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+
+        ranking = k.create_sortedset('ranking', str)
+        await ranking.add_multi([('car1', 3), ('car2', 1), ('car3', 2)])
+        assert await ranking.score('car3') == 2
+        assert await ranking.rank('car1') == 2
+        assert await ranking.pop_min() == [('car2', 1)]
+        assert await ranking.len() == 2
+
+        fifo = k.create_queue('fifo', str)
+        lifo = k.create_lifoqueue('lifo', str)
+        priority = k.create_priorityqueue('priority', str)
+
+        for item, prio in (('a', 3), ('b', 1), ('c', 2)):
+            await fifo.put(item)
+            await lifo.put(item)
+            await priority.put((item, prio))
+
+        assert [await fifo.get() for _ in range(3)] == ['a', 'b', 'c']
+        assert [await lifo.get() for _ in range(3)] == ['c', 'b', 'a']
+        assert [(await priority.get())[0] for _ in range(3)] == ['b', 'c', 'a']
+
+        with pytest.raises(asyncio.QueueEmpty):
+            await fifo.get_nowait()
+
+    asyncio.run(main())
+
+
+def test_memory_wrong_type():
+    async def main():
+        k = Knowledge(MemoryBackend(), 'k.test')
+        await k.create_hash('key', str).set('field', 'value')
+
+        with pytest.raises(WrongTypeError):
+            await k.create_list('key', str).append('value')
+
+    asyncio.run(main())
+
+
+def test_memory_notifications_deferred():
+    async def main():
+        store = MemoryStore()
+        events = []
+        MemoryBackend(store=store).notifications(events.append, 'k.*')
+
+        store.set('k.car', 'red')
+        # As a Redis subscription, not in the call of the change
+        assert events == []
+
+        await asyncio.sleep(0)
+        assert events == ['set']
+
+    asyncio.run(main())
+
+
+def test_memory_notifications_without_loop():
+    store = MemoryStore()
+    events = []
+    MemoryBackend(store=store).notifications(events.append, 'k.*')
+
+    store.set('k.car', 'red')
+    assert events == ['set']
+
+
+def test_redis_backend_needs_url(tmp_path):
+    mape_config = sys.modules['mape.config']
+    mape_config.set('knowledge.backend', 'redis')
+    loop = asyncio.new_event_loop()
+
+    try:
+        with pytest.raises(ValueError, match="needs a Redis url"):
+            mape.init(asyncio_loop=loop, config_file=str(tmp_path / 'mape.yml'))
+    finally:
+        del mape_config.config_dict['knowledge']
+        loop.close()
+
+
+def test_memory_set_no_op_not_notified():
+    async def main():
+        store = MemoryStore()
+        plates = Knowledge(MemoryBackend(store=store), 'k.test').create_set('plates', str)
+        await plates.add('AB123')
+
+        events = []
+        store.subscribe('*', lambda key, event: events.append(event))
+        # As Redis: nothing added or removed, nothing published
+        assert await plates.add('AB123') == 0
+        assert await plates.remove('CD456') == 0
+        assert events == []
+
+        await plates.remove('AB123')
+        assert events == ['srem']
+
+    asyncio.run(main())
+
+
+def test_memory_sortedset_equal_scores_any_member():
+    async def main():
+        ranking = Knowledge(MemoryBackend(), 'k.test').create_sortedset('ranking', str)
+        # Not orderable among them
+        await ranking.add_multi([(3, 1), ('b', 1), (('a', None), 1), (frozenset({1}), 1), ('a', 1), ('x', 0)])
+
+        members = [member for member, _ in await ranking.slice_by_rank(0, -1)]
+        assert members[:3] == ['x', 'a', 'b']
+        assert await ranking.rank(3) == members.index(3)
+
+        await ranking.remove(('a', None))
+        assert await ranking.len() == 5
+
+    asyncio.run(main())
+
+
+def test_memory_sortedset_previous_pickle():
+    zset = SortedSet()
+    zset.add('b', 1)
+    zset.add('a', 1)
+
+    # As saved by a previous version
+    restored = SortedSet.__new__(SortedSet)
+    restored.__setstate__((None, {'scores': dict(zset.scores), 'ordered': [(1, 'b'), (1, 'a')]}))
+    assert restored.ordered == [(1, 'a'), (1, 'b')]
+    assert restored.rank('b') == 1
+
+
+def test_memory_keys_without_paging_in(tmp_path):
+    path = str(tmp_path / 'k.snap')
+    store = MemoryStore()
+    store.set('k.a', 'a')
+    store.set('k.b', 'b')
+    store.expire('k.b', 0.01)
+    store.snapshot(path, 'k.*')
+
+    restored = MemoryStore()
+    restored.restore(path, 'k.*')
+    time.sleep(0.02)
+
+    assert list(restored.keys('k.*')) == ['k.a']
+    # Listed, not loaded
+    assert list(restored._lazy) == ['k.a']
+    assert restored.get('k.a') == 'a'
@@ -0,0 +1,52 @@
+import asyncio
+
+from mape.knowledge import Knowledge, MemoryBackend
+
+
+def _watch(aio_loop, k, main, **kwargs):
+    events = []
+    disposable = k.watch('cars*', **kwargs).subscribe(events.append)
+
+    aio_loop.run_until_complete(main(k))
+    disposable.dispose()
+    return events
+
+
+def test_debounce_coalesces_changes(aio_loop):
+    async def main(k):
+        cars = k.create_set('cars', str)
+        for plate in ('AB123', 'CD456', 'EF789'):
+            await cars.add(plate)
+        await k.create_set('other', str).add('GH012')
+        await asyncio.sleep(0.05)
+
+    events = _watch(aio_loop, Knowledge(MemoryBackend(), 'k.test'), main, debounce=0.01)
+
+    assert [(event.key, event.event, event.coalesced) for event in events] == [('cars', 'sadd', 3)]
+
+
+def test_without_debounce_and_filtered(aio_loop):
+    async def main(k):
+        cars = k.create_set('cars', str)
+        await cars.add('AB123')
+        await cars.add('CD456')
+        await cars.remove('AB123')
+
+    events = _watch(aio_loop, Knowledge(MemoryBackend(), 'k.test'), main, debounce=0, events=('srem',))
+
+    assert [(event.key, event.event) for event in events] == [('cars', 'srem')]
+
+
+def test_fetch_skips_unchanged_values(aio_loop):
+    k = Knowledge(MemoryBackend(), 'k.test')
+    cars = k.create_set('cars', str)
+
+    async def main(k):
+        for plate in ('AB123', 'AB123', 'CD456'):
+            await cars.add(plate)
+            await asyncio.sleep(0.02)
+
+    events = _watch(aio_loop, k, main, debounce=0.01, fetch=lambda key: cars.len())
+
+    # The second add leaves the set unchanged
+    assert [event.value for event in events] == [1, 2]
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from influxdb_client import Point
+
+from mape.remote import influxdb
+from mape.remote.influxdb import InfluxObserver
+from mape.remote.influxdb.line_protocol import LineEncoder, attributes_tags
+
+FIELDS = [
+    ('value', 87.5), ('value', 88.0), ('value', 3), ('value', True), ('value', 'say "hi"\\ now'),
+    ('value', np.float32(0.5)), ('value', np.int64(7)), ('value', 1e-300),
+    ('speed value', 1.25), ('a,b=c', -2)
+]
+
+TAGS = [(), (('loop', 'car_panda'),), (('path', 'car panda,x=y'), ('empty', None)), (('z', 'last'), ('a', 'first'))]
+
+
+def _fields_mapper(item):
+    return item.fields
+
+
+def _point(measurement, tags, fields):
+    point = Point(measurement)
+    for key, value in tags:
+        point.tag(key, value)
+    for key, value in fields:
+        point.field(key, value)
+    return point.to_line_protocol()
+
+
+@pytest.mark.parametrize('tags', TAGS)
+@pytest.mark.parametrize('field', FIELDS)
+def test_same_as_point(tags, field):
+    encoder = LineEncoder('car speed,x', lambda item: field, tags=tags)
+
+    assert encoder.encode(None) == _point('car speed,x', tags, [field])
+
+
+@pytest.mark.parametrize('value', [np.bool_(True), [1], {'a': 1}])
+def test_not_supported_as_point(value):
+    encoder = LineEncoder('car', lambda item: ('value', value))
+
+    with pytest.raises(ValueError, match='not supported'):
+        encoder.encode(None)
+    with pytest.raises(ValueError, match='not supported'):
+        _point('car', (), [('value', value)])
+
+
+def test_many_fields_and_attribute_tags():
+    item = SimpleNamespace(loop='car', element='detect=1', missing=None,
+                           fields=[('b', 2), ('a', 1.5), ('skipped', None), ('c', 'x')])
+    encoder = LineEncoder('car', _fields_mapper, tags=(('zone', 'north'),),
+                          tag_attributes=('loop', 'element', 'missing'))
+
+    expected = _point('car', [('zone', 'north'), ('loop', 'car'), ('element', 'detect=1')],
+                      [('b', 2), ('a', 1.5), ('c', 'x')])
+    assert encoder.encode(item) == expected
+    # Cached head
+    assert encoder.encode(item) == expected
+
+    item.loop = 'bike'
+    assert encoder.encode(item) == expected.replace('loop=car', 'loop=bike')
+
+
+def test_no_fields():
+    encoder = LineEncoder('car', _fields_mapper)
+
+    assert encoder.encode(SimpleNamespace(fields=[('value', None), ('nan', float('nan'))])) == ''
+
+
+@pytest.mark.parametrize('precision, expected', [('ns', 1500000000), ('us', 1500000), ('ms', 1500), ('s', 1)])
+def test_timestamp(precision, expected):
+    encoder = LineEncoder('car', lambda item: ('value', 1), precision=precision)
+
+    assert encoder.encode(SimpleNamespace(timestamp=1.5)) == f"car value=1i {expected}"
+    # Current time without the item timestamp
+    assert encoder.encode(None).rsplit(' ', 1)[1].isdigit()
+
+
+def test_attributes_tags():
+    item = SimpleNamespace(value=1, timestamp=2, loop='car', element='detect')
+
+    assert attributes_tags(item) == ('loop', 'element')
+    assert attributes_tags(1) == ()
+
+
+class RecordingWriter:
+    precision = 'ms'
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, bucket, record):
+        self.lines.append(record)
+
+
+@pytest.mark.parametrize('config_timestamp, timestamp, expected', [
+    (None, None, 'car value=1i'),
+    (True, None, 'car value=1i 1500'),
+    (True, False, 'car value=1i'),
+    (None, True, 'car value=1i 1500'),
+])
+def test_observer_timestamp_opt_in(monkeypatch, config_timestamp, timestamp, expected):
+    config = {'bucket': 'mape'}
+    if config_timestamp is not None:
+        config['timestamp'] = config_timestamp
+    monkeypatch.setattr(influxdb, '_config', config)
+
+    writer = RecordingWriter()
+    InfluxObserver('car', tags=(), writer=writer, timestamp=timestamp).on_next(SimpleNamespace(value=1, timestamp=1.5))
+
+    assert writer.lines == [expected]
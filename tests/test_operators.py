@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+
+import rx
+from rx import operators as ops
+from rx.subject import Subject
+
+import mape
+from mape.operators import group_and_pipe, through, through_shared
+
+
+def _item(src, value):
+    return SimpleNamespace(src=src, value=value)
+
+
+def _sum_pairs():
+    return ops.buffer_with_count(2), ops.map(lambda items: (items[0].src, sum(i.value for i in items)))
+
+
+def test_group_and_pipe():
+    async def main():
+        results = []
+        items = [_item('car1', 1), _item('car2', 10), _item('car1', 2), _item('car2', 20), _item('car1', 3)]
+        operator = group_and_pipe(_sum_pairs())
+        rx.from_iterable(items).pipe(operator).subscribe(results.append)
+        return results, operator.stats
+
+    results, stats = asyncio.run(main())
+    # Last partial buffer flushed on completed
+    assert results == [('car1', 3), ('car2', 30), ('car1', 3)]
+    assert stats.created == 2 and stats.evicted == 0
+
+
+def test_max_groups_evicts_least_recently_used():
+    async def main():
+        source, results, evicted = Subject(), [], []
+        operator = group_and_pipe(_sum_pairs(), max_groups=2, on_evict=evicted.append)
+        source.pipe(operator).subscribe(results.append)
+
+        source.on_next(_item('car1', 1))
+        source.on_next(_item('car2', 10))
+        source.on_next(_item('car1', 2))
+        # car2 least recently used, released (ie. its buffer flushed)
+        source.on_next(_item('car3', 100))
+        # Created again, car1 released (nothing buffered)
+        source.on_next(_item('car2', 20))
+        assert operator.stats.active == 2
+
+        source.on_completed()
+        return results, evicted, operator.stats
+
+    results, evicted, stats = asyncio.run(main())
+    assert results == [('car1', 3), ('car2', 10), ('car3', 100), ('car2', 20)]
+    assert evicted == ['car2', 'car1']
+    assert stats.active == 0 and stats.created == 4 and stats.evicted == 2
+
+
+def test_idle_groups_released():
+    async def main():
+        source, results, evicted = Subject(), [], []
+        operator = group_and_pipe(ops.map(lambda item: item.value), idle_timeout=0.02, on_evict=evicted.append)
+        disposable = source.pipe(operator).subscribe(results.append)
+
+        source.on_next(_item('car1', 1))
+        await asyncio.sleep(0.015)
+        source.on_next(_item('car2', 2))
+        for _ in range(100):
+            if len(evicted) == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert evicted == ['car1', 'car2'] and operator.stats.active == 0
+
+        source.on_next(_item('car1', 3))
+        disposable.dispose()
+        return results, operator.stats
+
+    results, stats = asyncio.run(main())
+    assert results == [1, 2, 3]
+    assert stats.created == 3 and stats.active == 0
+
+
+def test_key_mapper():
+    async def main():
+        results = []
+        rx.from_iterable(range(6)).pipe(
+            group_and_pipe((ops.buffer_with_count(3),), key_mapper=lambda item: item % 2)
+        ).subscribe(results.append)
+        return results
+
+    assert asyncio.run(main()) == [[0, 2, 4], [1, 3, 5]]
+
+
+def _counting_element():
+    loop = mape.Loop('car')
+    calls = []
+
+    @loop.plan
+    def policy(item, on_next):
+        calls.append(item)
+        on_next(item * 10)
+
+    policy.start()
+    return policy, calls
+
+
+def test_through_shared_traverses_once(aio_loop):
+    policy, calls = _counting_element()
+    source = Subject()
+    shared = source.pipe(through_shared(policy))
+
+    first, second = [], []
+    disposables = [shared.subscribe(first.append), shared.subscribe(second.append)]
+    source.on_next(1)
+
+    assert calls == [1]
+    assert first == second == [10]
+
+    # Disconnected by the last subscriber
+    for disposable in disposables:
+        disposable.dispose()
+    source.on_next(2)
+    assert calls == [1]
+
+
+def test_through_traverses_for_each_subscriber(aio_loop):
+    policy, calls = _counting_element()
+    source = Subject()
+    piped = source.pipe(through(policy))
+
+    piped.subscribe(lambda _: None)
+    piped.subscribe(lambda _: None)
+    source.on_next(1)
+
+    assert calls == [1, 1]
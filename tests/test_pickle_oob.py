@@ -0,0 +1,61 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from mape.remote import de_serializer
+from mape.remote.de_serializer import Pickled, obj_to_raw, obj_from_raw, register_frame
+
+
+def test_small_objects_plain_pickle():
+    raw = obj_to_raw(Pickled, {'speed': 80})
+
+    assert pickle.loads(raw) == {'speed': 80}
+
+
+def test_arrays_out_of_band():
+    value = {
+        'frame': np.arange(10_001, dtype=np.uint8).reshape(-1, 73)[:, :70],
+        'gps': np.linspace(0, 1, 1001),
+        'label': 'car'
+    }
+
+    raw = obj_to_raw(Pickled, value)
+    assert raw[:4] == b'\x00PB5'
+
+    decoded = obj_from_raw(Pickled, raw)
+    np.testing.assert_array_equal(decoded['frame'], value['frame'])
+    np.testing.assert_array_equal(decoded['gps'], value['gps'])
+    assert decoded['label'] == 'car'
+
+
+def test_zero_copy_aligned_buffers():
+    raw = bytearray(obj_to_raw(Pickled, np.arange(1000, dtype=np.float64)))
+    decoded = obj_from_raw(Pickled, raw)
+
+    # A view of the payload, aligned
+    assert np.shares_memory(decoded, np.frombuffer(raw, dtype=np.uint8))
+    assert decoded.ctypes.data % 8 == 0
+    np.testing.assert_array_equal(decoded, np.arange(1000))
+
+
+def test_register_frame(monkeypatch):
+    monkeypatch.setattr(de_serializer, '_frames', dict(de_serializer._frames))
+    register_frame(b'\x00TST', lambda raw: ('custom', bytes(raw[4:])))
+    assert obj_from_raw(Pickled, b'\x00TSTpayload') == ('custom', b'payload')
+
+    with pytest.raises(ValueError, match="Unknown frame"):
+        obj_from_raw(Pickled, b'\x00XXXpayload')
+
+    with pytest.raises(ValueError, match="must be 4 bytes"):
+        register_frame(b'TST0', lambda raw: raw)
+
+
+@pytest.mark.parametrize('as_type', [bytes, bytearray, memoryview])
+def test_decoded_arrays_writable(as_type):
+    raw = as_type(obj_to_raw(Pickled, {'gps': np.linspace(0, 1, 1001)}))
+    decoded = obj_from_raw(Pickled, raw)
+
+    assert decoded['gps'].flags.writeable
+    decoded['gps'][0] = 5
+    assert decoded['gps'][0] == 5
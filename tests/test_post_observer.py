@@ -0,0 +1,183 @@
+import asyncio
+import socket
+
+import aiohttp
+from aiohttp import web
+
+from mape.remote.rest import batch
+from mape.remote.rest.rx_utils import POSTObserver
+from mape.remote.de_serializer import encoder, decoder, decompress, Pickled
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Receiver:
+    """ Fake node recording the received notifications (failing the first `fail` requests) """
+
+    def __init__(self, fail: int = 0, slow: int = 0):
+        self.items = []
+        self.requests = 0
+        self.fail = fail
+        # Requests answered after the client timeout
+        self.slow = slow
+        self._decode = decoder(Pickled)
+
+    async def notify(self, request):
+        self.requests += 1
+        if self.slow:
+            self.slow -= 1
+            await asyncio.sleep(0.5)
+        if self.fail:
+            self.fail -= 1
+            return web.Response(status=503)
+
+        self.items.append((request.query['notification'], self._decode(decompress(await request.read()))))
+        return web.json_response({})
+
+    async def batch(self, request):
+        self.requests += 1
+        body = decompress(await request.read())
+        self.items.extend((item.notification, item.value)
+                          for item in batch.decode_frames(body, lambda p: self._decode(decompress(p))))
+        return web.json_response({})
+
+
+async def _serve(receiver, main):
+    app = web.Application()
+    app.router.add_post('/loops/car/elements/detect', receiver.notify)
+    app.router.add_post('/elements/batch', receiver.batch)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = _free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    try:
+        return await main(f"http://127.0.0.1:{port}")
+    finally:
+        await runner.cleanup()
+
+
+async def _wait(condition, timeout=2):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_ordered_delivery():
+    receiver = Receiver()
+
+    async def main(base_url):
+        observer = POSTObserver(base_url, 'car.detect')
+        for i in range(50):
+            observer.on_next(i)
+        observer.on_completed()
+
+        await _wait(lambda: len(receiver.items) == 51)
+        observer.dispose()
+        return observer.metrics
+
+    metrics = asyncio.run(_serve(receiver, main))
+
+    assert receiver.items == [('next', i) for i in range(50)] + [('completed', None)]
+    assert metrics.sent == 51 and metrics.failed == 0 and metrics.queue_depth == 0
+
+
+def test_batched_delivery():
+    receiver = Receiver()
+
+    async def main(base_url):
+        observer = POSTObserver(base_url, 'car.detect', batch_size=16)
+        for i in range(40):
+            observer.on_next(i)
+
+        await _wait(lambda: len(receiver.items) == 40)
+        observer.dispose()
+
+    asyncio.run(_serve(receiver, main))
+
+    assert receiver.items == [('next', i) for i in range(40)]
+    # 16 + 16 + 8
+    assert receiver.requests == 3
+
+
+def test_retries_on_server_error():
+    receiver = Receiver(fail=2)
+
+    async def main(base_url):
+        observer = POSTObserver(base_url, 'car.detect', retries=3, backoff=0.01)
+        observer.on_next('value')
+
+        await _wait(lambda: receiver.items)
+        observer.dispose()
+        return observer.metrics
+
+    metrics = asyncio.run(_serve(receiver, main))
+
+    assert receiver.items == [('next', 'value')]
+    assert metrics.retries == 2 and metrics.requests == 3 and metrics.sent == 1
+
+
+def test_dropped_after_retries():
+    receiver = Receiver(fail=10)
+
+    async def main(base_url):
+        observer = POSTObserver(base_url, 'car.detect', retries=1, backoff=0.01)
+        observer.on_next('value')
+
+        await _wait(lambda: observer.metrics.failed)
+        observer.dispose()
+        return observer.metrics
+
+    metrics = asyncio.run(_serve(receiver, main))
+
+    assert receiver.items == []
+    assert metrics.failed == 1 and metrics.requests == 2
+
+
+def test_timeout_not_stop_delivery():
+    receiver = Receiver(slow=1)
+
+    async def main(base_url):
+        session = aiohttp.ClientSession(base_url, timeout=aiohttp.ClientTimeout(total=0.05))
+        observer = POSTObserver(base_url, 'car.detect', session=session, retries=0)
+        observer.on_next('timed out')
+        observer.on_next('after')
+
+        await _wait(lambda: receiver.items)
+        observer.dispose()
+        await session.close()
+        return observer.metrics
+
+    metrics = asyncio.run(_serve(receiver, main))
+
+    assert receiver.items == [('next', 'after')]
+    assert metrics.failed == 1 and metrics.sent == 1
+
+
+def test_serializer_error_not_stop_delivery():
+    receiver = Receiver()
+
+    def serializer(value):
+        if value is None:
+            raise TypeError("not serializable")
+        return encoder(Pickled)(value)
+
+    async def main(base_url):
+        observer = POSTObserver(base_url, 'car.detect', serializer=serializer)
+        for value in (1, None, 2):
+            observer.on_next(value)
+
+        await _wait(lambda: len(receiver.items) == 2)
+        observer.dispose()
+        return observer.metrics
+
+    metrics = asyncio.run(_serve(receiver, main))
+
+    assert receiver.items == [('next', 1), ('next', 2)]
+    assert metrics.failed == 1 and metrics.sent == 2
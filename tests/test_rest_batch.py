@@ -0,0 +1,77 @@
+import pytest
+
+import mape
+from mape.remote.de_serializer import Pickled, encoder, decoder, compress
+from mape.remote.rest import batch
+from mape.remote.rest.api import element_batch_path
+from mape.remote.rest.batch import BatchItem
+
+from .conftest import asgi_request
+
+ITEMS = [
+    BatchItem('car.detect', 'in', 'next', {'speed': 87.5}),
+    BatchItem('car.policy', 'out', 'error', 'failure'),
+    BatchItem('car.detect', 'in', 'completed')
+]
+
+
+def test_frames_round_trip():
+    body = batch.encode_frames(ITEMS, encoder(Pickled))
+
+    assert batch.decode(body, batch.BINARY_MEDIA_TYPE, decoder(Pickled)) == ITEMS
+
+
+def test_ndjson_round_trip():
+    body = batch.encode_ndjson(ITEMS)
+
+    assert batch.decode(body, batch.NDJSON_MEDIA_TYPE, None) == ITEMS
+
+
+@pytest.mark.parametrize('body', [b'\x05\x00', b'\x0a\x00\x00\x00\x05\x00\x00\x00car', b'\x01\x00\x07\x00\x00\x00\x00\x00x'])
+def test_malformed_frames(body):
+    with pytest.raises(ValueError):
+        batch.decode(body, None, lambda payload: payload)
+
+
+def test_malformed_ndjson():
+    with pytest.raises(ValueError, match="Malformed line 2"):
+        batch.decode(b'{"path": "car.detect"}\n{"value": 1}\n', batch.NDJSON_MEDIA_TYPE, None)
+
+
+def _loop_with_sink():
+    loop = mape.Loop('car')
+
+    @loop.monitor
+    def detect(item, on_next):
+        on_next(item)
+
+    received = []
+    detect.port_in.subscribe(received.append)
+    return received
+
+
+def test_batch_endpoint(aio_loop, rest_app):
+    received = _loop_with_sink()
+    body = compress(batch.encode_frames([BatchItem('car.detect', value=i) for i in range(3)], encoder(Pickled)))
+
+    status, response = aio_loop.run_until_complete(asgi_request(
+        rest_app, 'POST', element_batch_path, body, [('content-type', batch.BINARY_MEDIA_TYPE)]))
+
+    assert (status, response) == (200, b'{"count":3}')
+    assert received == [0, 1, 2]
+
+
+@pytest.mark.parametrize('body, content_type', [
+    # Not a pickle, not existing element, malformed line
+    (batch.encode_frames([BatchItem('car.detect')], lambda value: b'\x80\x05garbage'), batch.BINARY_MEDIA_TYPE),
+    (batch.encode_ndjson([BatchItem('car.detect', value=1), BatchItem('car.missing', value=2)]), batch.NDJSON_MEDIA_TYPE),
+    (b'not json\n', batch.NDJSON_MEDIA_TYPE)
+])
+def test_batch_endpoint_rejects_all(aio_loop, rest_app, body, content_type):
+    received = _loop_with_sink()
+
+    status, _ = aio_loop.run_until_complete(asgi_request(
+        rest_app, 'POST', element_batch_path, body, [('content-type', content_type)]))
+
+    assert status in (400, 404)
+    assert received == []
@@ -0,0 +1,135 @@
+import math
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import rx
+from rx import operators as ops
+
+from mape.operators import rolling_mean, rolling_var, rolling_std, ewma, rolling_quantile, zscore, rate_of_change
+from mape.rolling import RollingWindow, Ewma
+
+_rng = random.Random(0)
+VALUES = [_rng.gauss(80, 15) for _ in range(300)]
+# Batches of random sizes (also larger than the windows)
+SIZES = [1, 3, 7, 1, 40, 2, 90, 5, 1, 60, 91]
+
+OPERATORS = {
+    'mean': lambda: rolling_mean(10),
+    'var': lambda: rolling_var(10),
+    'std': lambda: rolling_std(10),
+    'ewma': lambda: ewma(0.3),
+    'ewma_slow': lambda: ewma(0.001),
+    'quantile': lambda: rolling_quantile(10, 0.9),
+    'zscore': lambda: zscore(10),
+    'anomaly': lambda: zscore(10, threshold=1.5),
+    'rate_of_change': lambda: rate_of_change(),
+}
+
+
+def _batches(values):
+    batches, begin = [], 0
+    for size in SIZES:
+        batches.append(values[begin:begin + size])
+        begin += size
+    return batches
+
+
+def _collect(operator, source):
+    results = []
+    rx.from_iterable(source).pipe(operator).subscribe(results.append)
+    return results
+
+
+def _brute_force(name, values):
+    results = []
+    for i, value in enumerate(values):
+        window = np.array(values[max(i - 9, 0):i + 1])
+        previous = np.array(values[max(i - 10, 0):i])
+
+        if name == 'mean':
+            results.append(window.mean())
+        elif name in ('var', 'std'):
+            results.append(window.var() if name == 'var' else window.std())
+        elif name == 'quantile':
+            results.append(np.quantile(window, 0.9))
+        elif name in ('zscore', 'anomaly'):
+            z = (value - previous.mean()) / previous.std() if len(previous) >= 2 else math.nan
+            results.append(abs(z) > 1.5 if name == 'anomaly' else z)
+        elif name == 'rate_of_change':
+            results.append(value - values[i - 1] if i else math.nan)
+        else:
+            alpha = 0.3 if name == 'ewma' else 0.001
+            results.append(value if not i else results[-1] + alpha * (value - results[-1]))
+
+    return results
+
+
+@pytest.mark.parametrize('name', OPERATORS)
+def test_single_batch_brute_force(name):
+    values = VALUES[:sum(SIZES)]
+    single = _collect(OPERATORS[name](), values)
+    batched = [result for batch in _collect(OPERATORS[name](), _batches(values)) for result in batch]
+    arrays = np.concatenate(_collect(OPERATORS[name](), [np.array(batch) for batch in _batches(values)]))
+
+    expected = _brute_force(name, values)
+    for results in (single, batched, arrays.tolist()):
+        assert results == pytest.approx(expected, rel=1e-9, abs=1e-9, nan_ok=True)
+
+
+@pytest.mark.parametrize('name', OPERATORS)
+def test_items_with_value(name):
+    items = [SimpleNamespace(src='car', value=value) for value in VALUES[:20]]
+    results = _collect(OPERATORS[name](), items)
+
+    assert [item.src for item in results] == ['car'] * 20
+    assert [item.value for item in results] == pytest.approx(_brute_force(name, VALUES[:20]), nan_ok=True)
+    # Copies, the source items unchanged
+    assert [item.value for item in items] == VALUES[:20]
+
+
+def test_zscore_constant_values():
+    values = [5.0] * 30
+    single = _collect(zscore(10), values)
+    batched = [z for batch in _collect(zscore(10), [values[:12], values[12:]]) for z in batch]
+
+    assert all(math.isnan(z) for z in single + batched)
+    assert _collect(zscore(10, threshold=1), values) == [False] * 30
+
+
+def test_rate_of_change_with_timestamps():
+    items = [SimpleNamespace(value=value, timestamp=i * 0.5) for i, value in enumerate(VALUES[:30])]
+    expected = [math.nan] + [(b - a) / 0.5 for a, b in zip(VALUES, VALUES[1:30])]
+
+    single = [item.value for item in _collect(rate_of_change(), items)]
+    batched = [item.value for batch in _collect(rate_of_change(), [items[:1], items[1:12], items[12:]])
+               for item in batch]
+
+    assert single == pytest.approx(expected, nan_ok=True)
+    assert batched == pytest.approx(expected, nan_ok=True)
+
+
+def test_operator_over_buffer():
+    results = []
+    rx.from_iterable(VALUES[:100]).pipe(ops.buffer_with_count(16), rolling_mean(10)).subscribe(results.extend)
+
+    assert results == pytest.approx(_brute_force('mean', VALUES[:100]))
+
+
+def test_rolling_window_drift():
+    window = RollingWindow(4)
+    # Large then small values (ie. running sums recomputed)
+    for value in [1e12] * 4 + [1.0, 2.0, 3.0, 4.0]:
+        window.push(value)
+
+    assert window.mean == 2.5 and window.var == pytest.approx(1.25)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        RollingWindow(0)
+    with pytest.raises(ValueError):
+        Ewma(0)
+    with pytest.raises(ValueError):
+        rolling_quantile(10, 1.5)
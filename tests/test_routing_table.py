@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import rx
+from rx.subject import Subject
+
+import mape
+from mape.application import App
+from mape.knowledge import MemoryBackend
+from mape.operators import gateway
+from mape.routing import RoutingTable
+
+
+def test_exact_and_patterns():
+    routes = RoutingTable()
+    routes.add('car.policy', 'policy')
+    routes.add('*.policy', 'audit', 'policy')
+    routes.add('car.policy', 'policy')
+
+    assert routes.resolve('car.policy') == ('policy', 'audit')
+    assert routes.resolve('bike.policy') == ('audit', 'policy')
+    assert routes.resolve('car.exec') is None
+    assert 'bike.policy' in routes and len(routes) == 2
+
+
+def test_remove_invalidates_cache():
+    routes = RoutingTable()
+    routes.add('car.policy', 'policy', 'logger')
+    routes.add('*.policy', 'audit')
+    assert routes.resolve('car.policy') == ('policy', 'logger', 'audit')
+
+    routes.remove('car.policy', 'logger')
+    assert routes.resolve('car.policy') == ('policy', 'audit')
+
+    routes.remove('*.policy')
+    routes.remove('car.policy', 'policy')
+    assert routes.resolve('car.policy') is None and len(routes) == 0
+    # Not routed
+    routes.remove('nothing')
+
+
+def test_not_hashable_or_not_str():
+    routes = RoutingTable()
+    routes.add('*', 'all')
+
+    assert routes.resolve(['car.policy']) is None
+    assert routes.resolve(1) is None
+
+
+def test_elements_routed(aio_loop):
+    loop = mape.Loop('car')
+
+    @loop.plan
+    def policy(item, on_next):
+        on_next(item)
+
+    received, audited = [], []
+    policy.port_in.subscribe(received.append)
+    audit = Subject()
+    audit.subscribe(audited.append)
+    mape.app.routes.add('*.policy', audit)
+
+    assert mape.app.routes.resolve('car.policy') == (policy, audit)
+
+    item = SimpleNamespace(dst='car.policy', value=1)
+    rx.just(item).pipe(gateway()).subscribe()
+    # Element and pattern
+    assert received == audited == [item]
+
+
+def test_moved_element_unrouted(aio_loop):
+    car, bike = mape.Loop('car'), mape.Loop('bike')
+
+    @car.plan
+    def policy(item, on_next):
+        on_next(item)
+
+    bike.add_element(policy)
+
+    assert mape.app.routes.resolve('car.policy') is None
+    assert mape.app.routes.resolve('bike.policy') == (policy,)
+    assert 'policy' not in car.elements
+
+
+def test_moved_loop_unrouted(aio_loop):
+    loop = mape.Loop('car')
+
+    @loop.plan
+    def policy(item, on_next):
+        on_next(item)
+
+    other = App(None, MemoryBackend())
+    assert other.add_loop(loop) == 'car'
+
+    assert mape.app.routes.resolve('car.policy') is None and 'car' not in mape.app.loops
+    assert other.routes.resolve('car.policy') == (policy,)
+    assert loop.app is other
@@ -0,0 +1,94 @@
+import time
+import asyncio
+
+import pytest
+
+from mape.knowledge import Knowledge, MemoryBackend
+from mape.memory import MemoryStore
+from mape.snapshot import SnapshotWriter, SnapshotReader, Encoding
+
+
+def test_snapshot_file_round_trip(tmp_path):
+    path = str(tmp_path / 'k.snap')
+
+    with SnapshotWriter(path, Encoding.PICKLE) as writer:
+        writer.write('k.a', b'first')
+        writer.write('k.b', b'second', expire_at=123.5)
+
+    reader = SnapshotReader(path)
+    try:
+        assert reader.encoding is Encoding.PICKLE
+        entries = dict(reader.items())
+        assert reader.read(entries['k.a']) == b'first'
+        assert reader.read(entries['k.b']) == b'second'
+        assert entries['k.b'].expire_at == 123.5
+    finally:
+        reader.close()
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_memory_snapshot_restore(tmp_path, lazy):
+    path = str(tmp_path / 'k.snap')
+
+    async def main():
+        k = Knowledge(MemoryBackend(), 'k.test')
+        await k.create_hash('speeds', str).update({'car1': '80', 'car2': '95'})
+        await k.create_list('events', str).extend(['a', 'b'])
+        await k.create_keyspace('cars', str).set('car1', 'red', ex=60)
+        await k.create_keyspace('other', str).set('car1', 'excluded')
+        assert await k._backend.snapshot(path, 'k.test.[!o]*') == 3
+
+        restored = Knowledge(MemoryBackend(), 'k.test')
+        assert await restored._backend.restore(path, 'k.test.*', lazy=lazy) == 3
+
+        assert await restored.create_hash('speeds', str).dict() == {'car1': '80', 'car2': '95'}
+        assert await restored.create_list('events', str).slice(0, 2) == ['a', 'b']
+        cars = restored.create_keyspace('cars', str)
+        assert await cars.get('car1') == 'red'
+        assert 0 < await cars.ttl('car1') <= 60
+        assert await restored.create_keyspace('other', str).get('car1') is None
+
+    asyncio.run(main())
+
+
+def test_memory_restore_skips_expired(tmp_path):
+    path = str(tmp_path / 'k.snap')
+    store = MemoryStore()
+    store.set('k.live', 'a')
+    store.set('k.expiring', 'b')
+    store.expire('k.expiring', 0.01)
+    store.snapshot(path, 'k.*')
+
+    time.sleep(0.02)
+    restored = MemoryStore()
+    assert restored.restore(path, 'k.*') == 1
+    assert restored.get('k.live') == 'a'
+    assert restored.get('k.expiring') is None
+
+
+def test_memory_restore_releases_snapshot(tmp_path):
+    path = str(tmp_path / 'k.snap')
+    store = MemoryStore()
+    store.set('k.a', 'a')
+    store.set('k.b', 'b')
+    store.snapshot(path, 'k.*')
+
+    restored = MemoryStore()
+    restored.restore(path, 'k.*')
+    reader, = restored._snapshots
+
+    # A key paged in, the other replaced without reading it
+    assert restored.get('k.a') == 'a'
+    restored.set('k.b', 'new')
+
+    assert reader.closed
+    assert restored.get('k.b') == 'new'
+
+
+def test_restore_rejects_other_encoding(tmp_path):
+    path = str(tmp_path / 'k.snap')
+    with SnapshotWriter(path, Encoding.REDIS_DUMP) as writer:
+        writer.write('k.a', b'\x00')
+
+    with pytest.raises(ValueError, match="not been created by a memory store"):
+        MemoryStore().restore(path)
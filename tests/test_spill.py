@@ -0,0 +1,239 @@
+import asyncio
+
+import pytest
+
+from mape.remote.spill import SpillQueue, CHECKPOINT_NAME
+from mape.remote.influxdb import writer as influx_writer
+from mape.remote.influxdb.writer import InfluxWriter
+
+
+def test_append_read_commit(tmp_path):
+    spill = SpillQueue(tmp_path)
+    assert spill.empty
+
+    for i in range(5):
+        spill.append(b'record %d' % i)
+
+    records, position = spill.read(3)
+    assert records == [b'record 0', b'record 1', b'record 2']
+    # Not committed: read again
+    assert spill.read(3)[0] == records
+
+    spill.commit(position)
+    records, position = spill.read(10)
+    assert records == [b'record 3', b'record 4']
+
+    spill.commit(position)
+    assert spill.empty and spill.size == 0
+    spill.close()
+
+
+def test_read_each(tmp_path):
+    spill = SpillQueue(tmp_path)
+    spill.extend([b'a', b'b', b'c'])
+
+    records, end = spill.read_each(10)
+    assert [record for record, _ in records] == [b'a', b'b', b'c']
+    assert records[-1][1] == end
+
+    # One at a time
+    spill.commit(records[0][1])
+    assert spill.read(10)[0] == [b'b', b'c']
+    spill.close()
+
+
+def test_segments(tmp_path):
+    spill = SpillQueue(tmp_path, segment_bytes=32)
+    for i in range(10):
+        spill.append(b'record %d' % i)
+    assert len(list(tmp_path.glob('*.seg'))) > 1
+
+    records, position = spill.read(4)
+    spill.commit(position)
+    assert spill.read(100)[0] == [b'record %d' % i for i in range(4, 10)]
+    spill.close()
+
+
+def test_restart(tmp_path):
+    spill = SpillQueue(tmp_path, segment_bytes=32)
+    for i in range(10):
+        spill.append(b'record %d' % i)
+    spill.commit(spill.read(3)[1])
+    spill.close()
+
+    spill = SpillQueue(tmp_path, segment_bytes=32)
+    assert not spill.empty
+    spill.append(b'after')
+    assert spill.read(100)[0] == [b'record %d' % i for i in range(3, 10)] + [b'after']
+    spill.close()
+
+
+def test_truncated_record(tmp_path):
+    spill = SpillQueue(tmp_path)
+    spill.extend([b'complete', b'partial'])
+    spill.close()
+
+    # Crash while writing the last record
+    segment = next(tmp_path.glob('*.seg'))
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    spill = SpillQueue(tmp_path)
+    spill.append(b'after')
+    assert spill.read(10)[0] == [b'complete', b'after']
+    spill.close()
+
+
+def test_quota_drops_oldest(tmp_path):
+    spill = SpillQueue(tmp_path, max_bytes=64, segment_bytes=24)
+    for i in range(10):
+        spill.append(b'record %d' % i)
+
+    records = spill.read(100)[0]
+    assert spill.size <= 64 and spill.dropped_bytes
+    assert records == [b'record %d' % i for i in range(10 - len(records), 10)]
+
+    spill.append(b'x' * 100)
+    assert spill.read(100)[0] == records
+    spill.close()
+
+
+def test_corrupted_checkpoint(tmp_path):
+    spill = SpillQueue(tmp_path)
+    spill.extend([b'a', b'b'])
+    spill.close()
+    (tmp_path / CHECKPOINT_NAME).write_bytes(b'bad')
+
+    spill = SpillQueue(tmp_path)
+    assert spill.read(10)[0] == [b'a', b'b']
+    spill.close()
+
+
+async def _wait(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+
+
+class FlakyWriter(InfluxWriter):
+    """ Writer to an InfluxDB down until `up` is set (and again after `fail_after` writes) """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+        self.up = False
+        self.fail_after = None
+
+    async def _request(self, bucket, body):
+        await asyncio.sleep(0.001)
+        if not self.up:
+            return None
+
+        if self.fail_after is not None:
+            if not self.fail_after:
+                self.fail_after, self.up = None, False
+                return None
+            self.fail_after -= 1
+
+        self.sent.append(body.decode())
+        return True
+
+
+def test_writer_replay_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(influx_writer, 'MAX_REPLAY_DELAY', 0.01)
+
+    async def main():
+        writer = FlakyWriter('http://influx', batch_size=1, flush_interval=0.01, backoff=0.001, retries=0,
+                             spill=SpillQueue(tmp_path), replay_batch=4)
+
+        # Down: spilled
+        for i in range(10):
+            writer.write('mape', f"line{i}")
+        await _wait(lambda: writer.metrics.spilled == 10)
+        assert not writer.sent
+
+        # Up, down again while replaying (ie. after 2 writes), then up
+        writer.up, writer.fail_after = True, 2
+        for i in range(10, 20):
+            writer.write('mape', f"line{i}")
+            await asyncio.sleep(0.005)
+
+        await _wait(lambda: not writer.up)
+        assert len(writer.sent) == 2
+        writer.up = True
+        await _wait(lambda: len(writer.sent) == 20 and writer._replay is None)
+
+        # Drained: written directly
+        assert writer._replay is None
+        for i in range(20, 25):
+            writer.write('mape', f"line{i}")
+        await writer.flush()
+
+        await writer.close()
+        return writer.sent
+
+    # No line lost or written twice
+    assert asyncio.run(main()) == [f"line{i}" for i in range(25)]
+
+
+def test_writer_replays_previous_run(tmp_path, monkeypatch):
+    spill = SpillQueue(tmp_path)
+    spill.extend([b'mape\nline0', b'mape\nline1'])
+    spill.close()
+
+    async def main():
+        writer = FlakyWriter('http://influx', spill=SpillQueue(tmp_path), backoff=0.001)
+        writer.up = True
+        await _wait(lambda: writer._replay is None)
+
+        assert writer._replay is None and writer.metrics.replayed == 2
+        await writer.close()
+        return writer.sent
+
+    assert asyncio.run(main()) == ['line0', 'line1']
+
+
+def test_writer_skips_malformed_record(tmp_path):
+    spill = SpillQueue(tmp_path)
+    spill.extend([b'mape\nline0', b'no bucket', b'mape\nline1'])
+    spill.close()
+
+    async def main():
+        writer = FlakyWriter('http://influx', spill=SpillQueue(tmp_path), backoff=0.001)
+        writer.up = True
+        await _wait(lambda: writer._replay is None)
+
+        assert writer.metrics.replayed == 2 and writer.metrics.failed == 1
+        assert writer._spill.empty
+        await writer.close()
+        return writer.sent
+
+    assert asyncio.run(main()) == ['line0', 'line1']
+
+
+def test_writer_replay_waits_appends(tmp_path, monkeypatch):
+    async def main():
+        writer = FlakyWriter('http://influx', spill=SpillQueue(tmp_path), backoff=0.001)
+        reads = 0
+        read_each = writer._spill.read_each
+
+        def counting(*args):
+            nonlocal reads
+            reads += 1
+            return read_each(*args)
+        monkeypatch.setattr(writer._spill, 'read_each', counting)
+
+        # An append in progress: the replay waits it (ie. no busy loop)
+        writer._spilling += 1
+        writer._spilled.clear()
+        writer.up = True
+        writer._start_replay()
+        await asyncio.sleep(0.05)
+        assert reads == 1 and writer._replay is not None
+
+        writer._spilling -= 1
+        writer._spilled.set()
+        await _wait(lambda: writer._replay is None)
+        await writer.close()
+
+    asyncio.run(main())
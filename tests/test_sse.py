@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+from rx.subject import Subject
+
+from mape.remote.rest.sse import element_events
+
+
+def _element():
+    return SimpleNamespace(port_out=Subject())
+
+
+async def _collect(events, count):
+    return [await events.__anext__() for _ in range(count)]
+
+
+def test_events_until_completed():
+    async def main():
+        element = _element()
+        events = element_events(element)
+        first = asyncio.create_task(events.__anext__())
+        await asyncio.sleep(0)
+
+        element.port_out.on_next({'speed': 87.5})
+        element.port_out.on_next('slow')
+        element.port_out.on_completed()
+
+        received = [await first] + await _collect(events, 2)
+        assert received == ['id: 1\nevent: next\ndata: {"speed": 87.5}\n\n',
+                            'id: 2\nevent: next\ndata: "slow"\n\n',
+                            'id: 3\nevent: completed\ndata: null\n\n']
+
+        # Stream ended, unsubscribed from the port
+        assert [e async for e in events] == []
+        assert not element.port_out.observers
+
+    asyncio.run(main())
+
+
+def test_error_event():
+    async def main():
+        element = _element()
+        events = element_events(element)
+        first = asyncio.create_task(events.__anext__())
+        await asyncio.sleep(0)
+
+        element.port_out.on_error(ValueError('boom'))
+        assert await first == 'id: 1\nevent: error\ndata: "boom"\n\n'
+
+    asyncio.run(main())
+
+
+def test_slow_client_drops_oldest():
+    async def main():
+        element = _element()
+        events = element_events(element, buffer=2)
+        first = asyncio.create_task(events.__anext__())
+        await asyncio.sleep(0)
+
+        # Arrived before the client reads
+        for i in range(5):
+            element.port_out.on_next(i)
+
+        received = [await first] + await _collect(events, 1)
+        # Gap in the ids: dropped items
+        assert received == ['id: 4\nevent: next\ndata: 3\n\n', 'id: 5\nevent: next\ndata: 4\n\n']
+        await events.aclose()
+        assert not element.port_out.observers
+
+    asyncio.run(main())
+
+
+def test_latest_only():
+    async def main():
+        element = _element()
+        events = element_events(element, latest=True)
+        first = asyncio.create_task(events.__anext__())
+        await asyncio.sleep(0)
+
+        for i in range(5):
+            element.port_out.on_next(i)
+
+        assert await first == 'id: 5\nevent: next\ndata: 4\n\n'
+        await events.aclose()
+
+    asyncio.run(main())
+
+
+def test_heartbeat():
+    async def main():
+        events = element_events(_element(), heartbeat=0.01)
+        assert await events.__anext__() == ': keep-alive\n\n'
+        await events.aclose()
+
+    asyncio.run(main())
+
+
+def test_non_json_value():
+    async def main():
+        element = _element()
+        events = element_events(element)
+        first = asyncio.create_task(events.__anext__())
+        await asyncio.sleep(0)
+
+        element.port_out.on_next({1, 2} ^ {2})
+        element.port_out.on_next(object)
+        received = [await first] + await _collect(events, 1)
+
+        assert received[0] == 'id: 1\nevent: next\ndata: [1]\n\n'
+        assert received[1] == f"id: 2\nevent: next\ndata: \"{object!r}\"\n\n"
+        await events.aclose()
+
+    asyncio.run(main())
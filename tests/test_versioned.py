@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from mape.knowledge import Knowledge
+from mape.remote.redis.versioned import VersionConflict
+
+
+def test_set_and_compare_and_set(make_backend):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+        limit = k.create_versioned('limit', int)
+
+        assert await limit.get() == (None, 0)
+        assert await limit.set(130) == 1
+        assert await limit.compare_and_set(90, 1) == 2
+        # Stale version
+        assert await limit.compare_and_set(50, 1) is None
+        assert await limit.get() == (90, 2)
+
+    asyncio.run(main())
+
+
+def test_update_retries_on_conflict(make_backend):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+        limit = k.create_versioned('limit', int)
+        await limit.set(130)
+        calls = []
+
+        async def lower(value):
+            calls.append(value)
+            if len(calls) == 1:
+                # Changed by someone else in the meanwhile
+                await limit.set(110)
+            return min(value, 90) if value > 100 else value
+
+        assert await limit.update(lower) == (90, 3)
+        assert calls == [130, 110]
+
+        async def always_changed(value):
+            await limit.set(value)
+            return value
+
+        with pytest.raises(VersionConflict):
+            await limit.update(always_changed, retries=3)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('value_type, amount, expected', [(int, 5, 15), (float, 0.5, 10.5)])
+def test_increment(make_backend, value_type, amount, expected):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+        counter = k.create_versioned('counter', value_type)
+        await counter.set(value_type(10))
+
+        value, version = await counter.increment(amount)
+        assert (value, version) == (expected, 2)
+        assert type(value) is value_type
+        assert await counter.get() == (expected, 2)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('value_type, amount', [(int, 0.5), (str, 1)])
+def test_increment_wrong_types(make_backend, value_type, amount):
+    async def main():
+        k = Knowledge(await make_backend(), 'k.test')
+
+        with pytest.raises(TypeError):
+            await k.create_versioned('counter', value_type).increment(amount)
+
+    asyncio.run(main())
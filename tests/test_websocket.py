@@ -0,0 +1,145 @@
+import asyncio
+import socket
+
+import pytest
+import uvicorn
+
+import mape
+from mape.remote.de_serializer import Pickled, decoder, decompress
+from mape.remote.rest.websocket import StreamProtocol, WSObserver, WSObservable, NEXT
+
+
+def _pair(window=4):
+    """ Two protocols connected in memory, `received` by the second (consumed on demand) """
+    received = []
+
+    async def to_second(frame):
+        await second.on_frame(frame)
+
+    async def to_first(frame):
+        await first.on_frame(frame)
+
+    first = StreamProtocol(to_second, lambda *_: None, window=window)
+    second = StreamProtocol(to_first, lambda notification, payload: received.append(bytes(payload)),
+                            window=window, consume_on_item=False)
+    return first, second, received
+
+
+def test_credits_given_back_on_consumption():
+    async def main():
+        sender, receiver, received = _pair()
+        await receiver.grant()
+
+        for i in range(4):
+            await sender.send_item(NEXT, b'%d' % i)
+
+        # Window full until the receiver consumes
+        blocked = asyncio.create_task(sender.send_item(NEXT, b'4'))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        receiver.consumed()
+        receiver.consumed()
+        await asyncio.wait_for(blocked, 1)
+        assert received == [b'0', b'1', b'2', b'3', b'4']
+
+    asyncio.run(main())
+
+
+def test_close_wakes_senders():
+    async def main():
+        sender, _, _ = _pair()
+        blocked = asyncio.create_task(sender.send_item(NEXT, b'0'))
+        await asyncio.sleep(0)
+
+        sender.close()
+        with pytest.raises(ConnectionResetError):
+            await asyncio.wait_for(blocked, 1)
+
+    asyncio.run(main())
+
+
+def test_observer_buffer_drops_oldest():
+    async def main():
+        # Nothing listening: items wait (reconnecting) in the buffer
+        observer = WSObserver(f"http://127.0.0.1:{_free_port()}", 'car.detect', buffer=3)
+        for i in range(5):
+            observer.on_next(i)
+
+        assert [value for _, value in observer._queue] == [2, 3, 4]
+        observer.dispose()
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+
+
+def test_observer_drops_not_serializable():
+    async def main():
+        sender, receiver, received = _pair()
+        await receiver.grant()
+
+        observer = WSObserver(f"http://127.0.0.1:{_free_port()}", 'car.detect')
+        observer._task.cancel()
+        # Connected to the in memory receiver
+        observer._client.protocol = sender
+        observer._client.connected.set()
+        task = asyncio.create_task(observer._send_queue())
+
+        for value in (1, lambda: None, 2):
+            observer.on_next(value)
+        for _ in range(100):
+            if len(received) == 2:
+                break
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+        observer.dispose()
+        return [decoder(Pickled)(decompress(payload)) for payload in received]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_stream_end_to_end(aio_loop, rest_app):
+    port = _free_port()
+    loop = mape.Loop('car')
+
+    @loop.monitor
+    def detect(item, on_next):
+        on_next(item * 10)
+
+    async def main():
+        server = uvicorn.Server(uvicorn.Config(rest_app, host='127.0.0.1', port=port, log_level='error'))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        received = []
+        base_url = f"http://127.0.0.1:{port}"
+        source = WSObservable(base_url, 'car.detect', window=8)
+        disposable = source.subscribe(received.append)
+
+        sink = WSObserver(base_url, 'car.detect', window=8)
+        # Subscribed to the port_out once connected
+        await asyncio.sleep(0.2)
+        for i in range(100):
+            sink.on_next(i)
+
+        for _ in range(100):
+            if len(received) == 100:
+                break
+            await asyncio.sleep(0.02)
+
+        sink.dispose()
+        disposable.dispose()
+        server.should_exit = True
+        await serving
+        return received
+
+    detect.start()
+    assert aio_loop.run_until_complete(main()) == [i * 10 for i in range(100)]
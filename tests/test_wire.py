@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from rx.core.notification import OnNext
+
+from mape.typing import Message, CallMethod
+from mape.remote.de_serializer import Pickled, obj_from_raw
+from mape.remote.wire import WireEncoder, LateJoin, MAGIC
+
+
+class Custom(Message):
+    pass
+
+
+def _decode(raw):
+    # Received as any Pickled payload
+    return obj_from_raw(Pickled, raw)
+
+
+def test_message_round_trip():
+    encoder = WireEncoder()
+    items = [
+        Message(value={'speed': 87.5}, src='car.detect', dst='car.policy', hops=2, timestamp=1670000000.123456),
+        Message(value=None, src='car.detect', dst=None, timestamp=1670000000.1234567),
+        CallMethod(name='set_speed', args=(90,), kwargs={'unit': 'kmh'}, src='car.plan', dst='car.execute'),
+        OnNext(Message(value=[1, 2], src='car.detect'))
+    ]
+
+    for item in items:
+        raw = encoder.encode(item)
+        assert raw[:4] == MAGIC
+        assert _decode(raw) == item
+
+
+def test_paths_interned():
+    encoder = WireEncoder()
+    message = Message(value=1, src='ambulance.detect', dst='ambulance.policy')
+
+    first, second = encoder.encode(message), encoder.encode(message)
+
+    assert len(second) == len(first) - len(b'ambulance.detect' b'ambulance.policy') - 4
+    assert _decode(first) == _decode(second) == message
+
+
+def test_fallback():
+    encoder = WireEncoder()
+    for item in ({'speed': 80}, Custom(value=1), Message(value=1, src=12)):
+        raw = encoder.encode(item)
+        assert raw[:4] != MAGIC
+        assert _decode(raw) == item
+
+
+def test_out_of_band_value():
+    frame = np.arange(4096, dtype=np.float32)
+    item = _decode(WireEncoder().encode(Message(value=frame, src='car.detect')))
+
+    np.testing.assert_array_equal(item.value, frame)
+    assert item.value.ctypes.data % 8 == 0
+
+
+def test_late_join_waits_resync():
+    encoder = WireEncoder(resync=3, resync_interval=60)
+    raws = [encoder.encode(Message(value=i, src='car.detect', dst='car.policy')) for i in range(6)]
+
+    # Joined after the first item (ie. paths already sent)
+    with pytest.raises(LateJoin):
+        _decode(raws[1])
+
+    # New epoch, paths sent again
+    assert [_decode(raw).value for raw in raws[3:]] == [3, 4, 5]